@@ -116,6 +116,7 @@ def insert():
     remove_if_exist(f"{WORKING_DIR}/kv_store_text_chunks.json")
     remove_if_exist(f"{WORKING_DIR}/kv_store_community_reports.json")
     remove_if_exist(f"{WORKING_DIR}/graph_chunk_entity_relation.graphml")
+    remove_if_exist(f"{WORKING_DIR}/graph_chunk_entity_relation.snapshot")
 
     rag = GraphRAG(
         working_dir=WORKING_DIR,
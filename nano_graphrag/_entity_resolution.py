@@ -0,0 +1,212 @@
+"""Group the extracted entity names that refer to the same entity.
+
+Names are normalized, then blocked by the words they share, so only names of
+the same block are compared. Each block is scored with one similarity matrix
+(hashed character n-grams or embeddings). Pairs above the merge threshold are
+merged. Pairs in the ambiguous band can be confirmed by the LLM, all of them
+in parallel. Names with other numbers or Roman numerals are never merged
+outright. The merged pairs are closed with union-find.
+"""
+import asyncio
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+from ._utils import logger
+from .prompt import PROMPTS
+
+_NON_WORD = re.compile(r"[\W_]+")
+_ROMAN_NUMERAL = re.compile(r"^M{0,3}(CM|CD|D?C{0,3})(XC|XL|L?X{0,3})(IX|IV|V?I{0,3})$")
+
+
+def normalize_entity_names(names: list[str]) -> list[str]:
+    """Uppercase and strip the punctuation of the names, so that spelling
+    variants like ``"Hội nghị I-an-ta"`` and ``"HỘI NGHỊ I AN TA"`` are equal"""
+    upper = np.char.upper(
+        np.array([unicodedata.normalize("NFC", n) for n in names], dtype=str)
+    )
+    return [" ".join(_NON_WORD.sub(" ", n).split()) for n in upper.tolist()]
+
+
+def ngram_vectors(names: list[str], n: int = 3, dim: int = 2048) -> np.ndarray:
+    """L2-normalized bag of hashed character n-grams, one row per name"""
+    rows, cols = [], []
+    for i, name in enumerate(names):
+        padded = f" {name} "
+        grams = [padded[j : j + n] for j in range(max(1, len(padded) - n + 1))]
+        rows.extend([i] * len(grams))
+        cols.extend(zlib.crc32(g.encode("utf-8")) % dim for g in grams)
+    vectors = np.zeros((len(names), dim), dtype=np.float32)
+    np.add.at(vectors, (rows, cols), 1.0)
+    return _l2_normalize(vectors)
+
+
+def _l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def numeric_tokens(normalized_name: str) -> frozenset:
+    """The numbers and Roman numerals of a normalized name, which n-gram
+    similarity can't tell apart: "LẦN THỨ II" and "LẦN THỨ III" are one
+    character apart but distinct entities"""
+    return frozenset(
+        w
+        for w in normalized_name.split()
+        if any(c.isdigit() for c in w) or _ROMAN_NUMERAL.match(w)
+    )
+
+
+def block_entity_names(normalized: list[str], max_block_size: int) -> list[list[int]]:
+    """Candidate blocks: the names sharing a word or a pair of adjacent words.
+    Blocks of more than ``max_block_size`` names are dropped, their key is too
+    common to tell anything."""
+    keys = defaultdict(list)
+    for i, name in enumerate(normalized):
+        words = name.split()
+        name_keys = {w for w in words if len(w) > 1}
+        name_keys.update(" ".join(p) for p in zip(words, words[1:]))
+        for key in name_keys:
+            keys[key].append(i)
+    blocks, seen = [], set()
+    for members in keys.values():
+        if 1 < len(members) <= max_block_size and tuple(members) not in seen:
+            seen.add(tuple(members))
+            blocks.append(members)
+    return blocks
+
+
+def score_candidate_pairs(
+    blocks: list[list[int]], vectors: np.ndarray, threshold: float
+) -> dict[tuple[int, int], float]:
+    """Cosine similarity of the pairs of every block that reach ``threshold``"""
+    scores = {}
+    for members in blocks:
+        members = np.asarray(members)
+        sims = vectors[members] @ vectors[members].T
+        for i, j in zip(*np.nonzero(np.triu(sims >= threshold, k=1))):
+            scores[(int(members[i]), int(members[j]))] = float(sims[i, j])
+    return scores
+
+
+class UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a: int, b: int):
+        self.parent[self.find(a)] = self.find(b)
+
+
+async def _confirm_same_entity(
+    pair: tuple[str, str], entity_descriptions: dict[str, str], global_config: dict
+) -> bool:
+    use_llm_func: callable = global_config["cheap_model_func"]
+    entity_a, entity_b = pair
+    prompt = PROMPTS["entity_resolution_confirm"].format(
+        entity_a=entity_a,
+        description_a=entity_descriptions[entity_a],
+        entity_b=entity_b,
+        description_b=entity_descriptions[entity_b],
+    )
+    result = await use_llm_func(prompt)
+    if isinstance(result, list):
+        result = result[0]["text"]
+    return result.strip().strip('"').strip("'").lower().startswith("yes")
+
+
+async def resolve_entities(
+    entity_descriptions: dict[str, str], global_config: dict
+) -> dict[str, list[str]]:
+    """Group the entity names that refer to the same entity.
+
+    Returns the canonical name of every group of two or more names, mapped to
+    the other names of the group. The canonical name is the longest one.
+    """
+    names = list(entity_descriptions.keys())
+    if len(names) < 2:
+        return {}
+    merge_threshold = global_config["entity_resolution_merge_threshold"]
+    ambiguous_threshold = global_config["entity_resolution_ambiguous_threshold"]
+    if not global_config["entity_resolution_llm_confirm"]:
+        ambiguous_threshold = merge_threshold
+
+    normalized = normalize_entity_names(names)
+    if global_config["entity_resolution_similarity"] == "embedding":
+        embedding_func = global_config["embedding_func"]
+        batch_size = global_config["embedding_batch_num"]
+        embeddings = await asyncio.gather(
+            *[
+                embedding_func(normalized[i : i + batch_size])
+                for i in range(0, len(normalized), batch_size)
+            ]
+        )
+        vectors = _l2_normalize(np.concatenate(embeddings).astype(np.float32))
+    elif global_config["entity_resolution_similarity"] == "ngram":
+        vectors = ngram_vectors(normalized)
+    else:
+        raise ValueError(
+            f"Entity resolution similarity {global_config['entity_resolution_similarity']} not supported"
+        )
+
+    blocks = block_entity_names(
+        normalized, global_config["entity_resolution_max_block_size"]
+    )
+    scores = score_candidate_pairs(blocks, vectors, ambiguous_threshold)
+    # names equal once normalized and with spaces removed are the same entity
+    first_of_compact = {}
+    for i, name in enumerate(normalized):
+        first = first_of_compact.setdefault(name.replace(" ", ""), i)
+        if first != i:
+            scores[(first, i)] = 1.0
+    # names with other numbers are distinct (another congress, year, ...);
+    # a number on one side only is left to the LLM, never merged outright
+    numbers = [numeric_tokens(name) for name in normalized]
+    merged, ambiguous = [], []
+    for (a, b), score in scores.items():
+        if numbers[a] != numbers[b]:
+            if numbers[a] and numbers[b]:
+                continue
+            if not global_config["entity_resolution_llm_confirm"]:
+                continue
+            ambiguous.append((a, b))
+        elif score >= merge_threshold:
+            merged.append((a, b))
+        else:
+            ambiguous.append((a, b))
+    if ambiguous:
+        confirmed = await asyncio.gather(
+            *[
+                _confirm_same_entity(
+                    (names[a], names[b]), entity_descriptions, global_config
+                )
+                for a, b in ambiguous
+            ]
+        )
+        merged.extend(pair for pair, same in zip(ambiguous, confirmed) if same)
+    logger.info(
+        f"Entity resolution: {len(blocks)} blocks, {len(scores)} candidate pairs, "
+        f"{len(ambiguous)} sent to the LLM, {len(merged)} merged"
+    )
+
+    union_find = UnionFind(len(names))
+    for a, b in merged:
+        union_find.union(a, b)
+    groups = defaultdict(list)
+    for i, name in enumerate(names):
+        groups[union_find.find(i)].append(name)
+    entity_groups = {}
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+        canonical = max(group, key=lambda n: (len(n), n))
+        entity_groups[canonical] = [n for n in group if n != canonical]
+    return entity_groups
@@ -71,7 +71,6 @@ async def openai_complete_if_cache(
         await hashing_kv.upsert(
             {args_hash: {"return": response.choices[0].message.content, "model": model}}
         )
-        await hashing_kv.index_done_callback()
     return response.choices[0].message.content
 
 
@@ -117,7 +116,6 @@ async def amazon_bedrock_complete_if_cache(
         await hashing_kv.upsert(
             {args_hash: {"return": response["output"]["message"]["content"][0]["text"], "model": model}}
         )
-        await hashing_kv.index_done_callback()
     return response["output"]["message"]["content"][0]["text"]
 
 
@@ -263,7 +261,6 @@ async def azure_openai_complete_if_cache(
                 }
             }
         )
-        await hashing_kv.index_done_callback()
     return response.choices[0].message.content
 
 
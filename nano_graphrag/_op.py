@@ -2,17 +2,22 @@ import re
 import json
 import asyncio
 import tiktoken
+import numpy as np
 from typing import Union
 from collections import Counter, defaultdict
+from functools import partial
+from ._entity_resolution import resolve_entities
 from ._splitter import SeparatorSplitter
 from ._utils import (
     logger,
     clean_str,
+    compute_args_hash,
     compute_mdhash_id,
     decode_tokens_by_tiktoken,
     encode_string_by_tiktoken,
     is_float_regex,
     list_of_list_to_csv,
+    llm_priority_scope,
     pack_user_ass_to_openai_messages,
     split_string_by_multi_markers,
     truncate_list_by_token_size,
@@ -20,6 +25,7 @@ from ._utils import (
 from .base import (
     BaseGraphStorage,
     BaseKVStorage,
+    BaseTemporalStorage,
     BaseVectorStorage,
     SingleCommunitySchema,
     CommunitySchema,
@@ -27,7 +33,6 @@ from .base import (
     QueryParam,
 )
 from .prompt import GRAPH_FIELD_SEP, PROMPTS
-import psycopg2
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
@@ -296,18 +301,60 @@ async def _merge_edges_then_upsert(
     )
 
 
-async def extract_entities(
-    chunks: dict[str, TextChunkSchema],
-    knwoledge_graph_inst: BaseGraphStorage,
-    entity_vdb: BaseVectorStorage,
+def _extraction_to_checkpoint(result: tuple[dict, dict]) -> dict:
+    maybe_nodes, maybe_edges = result
+    return {
+        "nodes": maybe_nodes,
+        "edges": [[src, tgt, v] for (src, tgt), v in maybe_edges.items()],
+    }
+
+
+def _checkpoint_to_extraction(checkpoint: dict) -> tuple[dict, dict]:
+    return checkpoint["nodes"], {
+        (src, tgt): v for src, tgt, v in checkpoint["edges"]
+    }
+
+
+async def _extract_chunks_with_checkpoint(
+    ordered_chunks: list[tuple[str, TextChunkSchema]],
+    process_func: callable,
+    checkpoint_kv: Union[BaseKVStorage, None],
+) -> list[tuple[dict, dict]]:
+    """Run ``process_func`` over the chunks, skipping the ones already in
+    ``checkpoint_kv`` and saving each new result there as soon as it's done"""
+    if checkpoint_kv is None:
+        return await asyncio.gather(*[process_func(c) for c in ordered_chunks])
+
+    checkpoints = await checkpoint_kv.get_by_ids([k for k, _ in ordered_chunks])
+    results = [_checkpoint_to_extraction(c) for c in checkpoints if c is not None]
+    if results:
+        logger.info(f"Reusing the checkpointed extraction of {len(results)} chunks")
+
+    async def _process_and_save(chunk_key_dp: tuple[str, TextChunkSchema]):
+        result = await process_func(chunk_key_dp)
+        await checkpoint_kv.upsert({chunk_key_dp[0]: _extraction_to_checkpoint(result)})
+        return result
+
+    results.extend(
+        await asyncio.gather(
+            *[
+                _process_and_save(c)
+                for c, checkpoint in zip(ordered_chunks, checkpoints)
+                if checkpoint is None
+            ]
+        )
+    )
+    return results
+
+
+async def _extract_single_chunk(
+    chunk_key_dp: tuple[str, TextChunkSchema],
     global_config: dict,
-    using_amazon_bedrock: bool=False,
-) -> Union[BaseGraphStorage, None]:
+    using_amazon_bedrock: bool = False,
+) -> tuple[dict, dict]:
     use_llm_func: callable = global_config["best_model_func"]
     entity_extract_max_gleaning = global_config["entity_extract_max_gleaning"]
 
-    ordered_chunks = list(chunks.items())
-
     entity_extract_prompt = PROMPTS["entity_extraction"]
     context_base = dict(
         tuple_delimiter=PROMPTS["DEFAULT_TUPLE_DELIMITER"],
@@ -318,65 +365,81 @@ async def extract_entities(
     continue_prompt = PROMPTS["entiti_continue_extraction"]
     if_loop_prompt = PROMPTS["entiti_if_loop_extraction"]
 
+    chunk_key = chunk_key_dp[0]
+    chunk_dp = chunk_key_dp[1]
+    content = chunk_dp["content"]
+    hint_prompt = entity_extract_prompt.format(**context_base, input_text=content)
+    final_result = await use_llm_func(hint_prompt)
+    if isinstance(final_result, list):
+        final_result = final_result[0]["text"]
+
+    history = pack_user_ass_to_openai_messages(hint_prompt, final_result, using_amazon_bedrock)
+    for now_glean_index in range(entity_extract_max_gleaning):
+        glean_result = await use_llm_func(continue_prompt, history_messages=history)
+
+        history += pack_user_ass_to_openai_messages(continue_prompt, glean_result, using_amazon_bedrock)
+        final_result += glean_result
+        if now_glean_index == entity_extract_max_gleaning - 1:
+            break
+
+        if_loop_result: str = await use_llm_func(
+            if_loop_prompt, history_messages=history
+        )
+        if_loop_result = if_loop_result.strip().strip('"').strip("'").lower()
+        if if_loop_result != "yes":
+            break
+
+    records = split_string_by_multi_markers(
+        final_result,
+        [context_base["record_delimiter"], context_base["completion_delimiter"]],
+    )
+
+    maybe_nodes = defaultdict(list)
+    maybe_edges = defaultdict(list)
+    for record in records:
+        record = re.search(r"\((.*)\)", record)
+        if record is None:
+            continue
+        record = record.group(1)
+        record_attributes = split_string_by_multi_markers(
+            record, [context_base["tuple_delimiter"]]
+        )
+        if_entities = await _handle_single_entity_extraction(
+            record_attributes, chunk_key
+        )
+        if if_entities is not None:
+            maybe_nodes[if_entities["entity_name"]].append(if_entities)
+            continue
+
+        if_relation = await _handle_single_relationship_extraction(
+            record_attributes, chunk_key
+        )
+        if if_relation is not None:
+            maybe_edges[(if_relation["src_id"], if_relation["tgt_id"])].append(
+                if_relation
+            )
+    return dict(maybe_nodes), dict(maybe_edges)
+
+
+async def _extract_all_chunks(
+    chunks: dict[str, TextChunkSchema],
+    global_config: dict,
+    using_amazon_bedrock: bool = False,
+    checkpoint_kv: Union[BaseKVStorage, None] = None,
+) -> tuple[defaultdict, defaultdict]:
+    """Extract the entities and relationships of every chunk, grouped by
+    entity name and by (sorted) relationship endpoints"""
+    ordered_chunks = list(chunks.items())
+
     already_processed = 0
     already_entities = 0
     already_relations = 0
 
     async def _process_single_content(chunk_key_dp: tuple[str, TextChunkSchema]):
         nonlocal already_processed, already_entities, already_relations
-        chunk_key = chunk_key_dp[0]
-        chunk_dp = chunk_key_dp[1]
-        content = chunk_dp["content"]
-        hint_prompt = entity_extract_prompt.format(**context_base, input_text=content)
-        final_result = await use_llm_func(hint_prompt)
-        if isinstance(final_result, list):
-            final_result = final_result[0]["text"]
-
-        history = pack_user_ass_to_openai_messages(hint_prompt, final_result, using_amazon_bedrock)
-        for now_glean_index in range(entity_extract_max_gleaning):
-            glean_result = await use_llm_func(continue_prompt, history_messages=history)
-
-            history += pack_user_ass_to_openai_messages(continue_prompt, glean_result, using_amazon_bedrock)
-            final_result += glean_result
-            if now_glean_index == entity_extract_max_gleaning - 1:
-                break
-
-            if_loop_result: str = await use_llm_func(
-                if_loop_prompt, history_messages=history
-            )
-            if_loop_result = if_loop_result.strip().strip('"').strip("'").lower()
-            if if_loop_result != "yes":
-                break
-
-        records = split_string_by_multi_markers(
-            final_result,
-            [context_base["record_delimiter"], context_base["completion_delimiter"]],
+        maybe_nodes, maybe_edges = await _extract_single_chunk(
+            chunk_key_dp, global_config, using_amazon_bedrock
         )
-
-        maybe_nodes = defaultdict(list)
-        maybe_edges = defaultdict(list)
-        for record in records:
-            record = re.search(r"\((.*)\)", record)
-            if record is None:
-                continue
-            record = record.group(1)
-            record_attributes = split_string_by_multi_markers(
-                record, [context_base["tuple_delimiter"]]
-            )
-            if_entities = await _handle_single_entity_extraction(
-                record_attributes, chunk_key
-            )
-            if if_entities is not None:
-                maybe_nodes[if_entities["entity_name"]].append(if_entities)
-                continue
-
-            if_relation = await _handle_single_relationship_extraction(
-                record_attributes, chunk_key
-            )
-            if if_relation is not None:
-                maybe_edges[(if_relation["src_id"], if_relation["tgt_id"])].append(
-                    if_relation
-                )
         already_processed += 1
         already_entities += len(maybe_nodes)
         already_relations += len(maybe_edges)
@@ -388,11 +451,11 @@ async def extract_entities(
             end="",
             flush=True,
         )
-        return dict(maybe_nodes), dict(maybe_edges)
+        return maybe_nodes, maybe_edges
 
     # use_llm_func is wrapped in ascynio.Semaphore, limiting max_async callings
-    results = await asyncio.gather(
-        *[_process_single_content(c) for c in ordered_chunks]
+    results = await _extract_chunks_with_checkpoint(
+        ordered_chunks, _process_single_content, checkpoint_kv
     )
     # print()  # clear the progress bar
     maybe_nodes = defaultdict(list)
@@ -403,6 +466,40 @@ async def extract_entities(
         for k, v in m_edges.items():
             # it's undirected graph
             maybe_edges[tuple(sorted(k))].extend(v)
+    return maybe_nodes, maybe_edges
+
+
+async def prefetch_extraction(
+    chunks: dict[str, TextChunkSchema],
+    checkpoint_kv: BaseKVStorage,
+    global_config: dict,
+    using_amazon_bedrock: bool = False,
+):
+    """Extract the chunks into ``checkpoint_kv`` ahead of ``extract_entities`` or
+    ``custom_extract_entities``, which then only merge the saved results"""
+    await _extract_chunks_with_checkpoint(
+        list(chunks.items()),
+        partial(
+            _extract_single_chunk,
+            global_config=global_config,
+            using_amazon_bedrock=using_amazon_bedrock,
+        ),
+        checkpoint_kv,
+    )
+
+
+async def extract_entities(
+    chunks: dict[str, TextChunkSchema],
+    knwoledge_graph_inst: BaseGraphStorage,
+    entity_vdb: BaseVectorStorage,
+    global_config: dict,
+    using_amazon_bedrock: bool=False,
+    checkpoint_kv: Union[BaseKVStorage, None] = None,
+    entity_time_db: Union[BaseTemporalStorage, None] = None,
+) -> Union[BaseGraphStorage, None]:
+    maybe_nodes, maybe_edges = await _extract_all_chunks(
+        chunks, global_config, using_amazon_bedrock, checkpoint_kv
+    )
     all_entities_data = await asyncio.gather(
         *[
             _merge_nodes_then_upsert(k, v, knwoledge_graph_inst, global_config)
@@ -428,6 +525,8 @@ async def extract_entities(
             for dp in all_entities_data
         }
         await entity_vdb.upsert(data_for_vdb)
+    if entity_time_db is not None:
+        await _upsert_entity_times(entity_time_db, all_entities_data)
     return knwoledge_graph_inst
 
 
@@ -450,48 +549,12 @@ def remove_quotes(d):
     return new_dict
 
 
-def get_connection():
-    host = "localhost"
-    port = "5432"
-    database = "history"
-    user = "postgres"
-    password = "postgres"
-    return psycopg2.connect(
-        host=host,
-        port=port,
-        dbname=database,
-        user=user,
-        password=password
-    )
-
-# Function to create the events table if it does not exist
-def create_postgres_table():
-    connection = None
-    cursor = None
-    try:
-        connection = get_connection()
-        cursor = connection.cursor()
-
-        create_table_query = '''
-        CREATE TABLE IF NOT EXISTS lichsu12 (
-            entity_hash_id TEXT PRIMARY KEY,
-            entity_name VARCHAR(255) NOT NULL,
-            entity_time TIMESTAMP,
-            entity_description TEXT
-        );
-        '''
-        cursor.execute(create_table_query)
-        connection.commit()
-        print("Table 'lichsu12' is ready (created if not exists).")
-
-    except Exception as e:
-        print(f"Error creating table: {e}")
-
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+DATE_FORMATS = [
+    "%Y",  # Year only (e.g., 1945)
+    "%d/%m/%Y",  # Day/Month/Year (e.g., 2/9/1945)
+    "%m/%Y",  # Month/Year (e.g., 9/1945)
+    "%Y-%m-%d",  # Standard ISO format (e.g., 1945-09-02)
+]
 
 
 def parse_date(date):
@@ -499,13 +562,7 @@ def parse_date(date):
     if date_str is None or date_str.lower() == 'na':  # Handle None and 'None'
         return None
     # Try different date formats
-    date_formats = [
-        "%Y",  # Year only (e.g., 1945)
-        "%d/%m/%Y",  # Day/Month/Year (e.g., 2/9/1945)
-        "%m/%Y",  # Month/Year (e.g., 9/1945)
-        "%Y-%m-%d",  # Standard ISO format (e.g., 1945-09-02)
-    ]
-    for date_format in date_formats:
+    for date_format in DATE_FORMATS:
         try:
             processed_date = datetime.strptime(date_str, date_format)
             return processed_date
@@ -514,47 +571,58 @@ def parse_date(date):
 
     # If none of the formats match, return None
     return None
-# Function to insert rows with hash as primary key
-def insert_rows(all_entities_data):
-    connection = None
-    cursor = None
-    try:
-        connection = get_connection()
-        cursor = connection.cursor()
-
-        # Prepare the data for insertion with hash as the primary key
-        data_for_postgres = [
-            (
-                key,
-                all_entities_data[key]["entity_name"],
-                parse_date(all_entities_data[key]["entity_time"]),  # Handle various date formats
-                all_entities_data[key]["content"][len(all_entities_data[key]["entity_name"]):]
-            )
-            for key in all_entities_data.keys()
-        ]
-        print(data_for_postgres)
-        insert_query = '''
-        INSERT INTO lichsu12 (entity_hash_id, entity_name, entity_time, entity_description)
-        VALUES (%s, %s, %s, %s)
-        ON CONFLICT (entity_hash_id)
-        DO UPDATE SET 
-            entity_name = EXCLUDED.entity_name,
-            entity_time = EXCLUDED.entity_time,
-            entity_description = EXCLUDED.entity_description;
-        '''
-
-        cursor.executemany(insert_query, data_for_postgres)
-        connection.commit()
-        print(f"Inserted/Updated {len(all_entities_data)} rows.")
-
-    except Exception as e:
-        print(f"Error inserting/updating rows: {e}")
-
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+
+
+async def _upsert_entity_times(
+    entity_time_db: BaseTemporalStorage, all_entities_data: list[dict]
+):
+    await entity_time_db.upsert(
+        {
+            compute_mdhash_id(dp["entity_name"], prefix="ent-"): {
+                "entity_name": dp["entity_name"],
+                "entity_time": parse_date(dp["entity_time"]),
+                "entity_description": dp["description"],
+            }
+            for dp in all_entities_data
+        }
+    )
+
+
+def _merge_entity_aliases(
+    maybe_nodes: dict[str, list[dict]],
+    maybe_edges: dict[tuple[str, str], list[dict]],
+    entity_groups: dict[str, list[str]],
+):
+    """Rename the aliases of ``entity_groups`` to their canonical name, in place.
+
+    The edges touching an alias are found with an entity -> edges index and
+    moved in one pass. Edges that end up on the same pair are concatenated, so
+    ``_merge_edges_then_upsert`` merges them like any repeated relationship.
+    Edges between two aliases of the same entity are dropped.
+    """
+    canonical_of = {
+        alias: target for target, aliases in entity_groups.items() for alias in aliases
+    }
+    for alias, target in canonical_of.items():
+        nodes = maybe_nodes.pop(alias, [])
+        for node in nodes:
+            node["entity_name"] = target
+        maybe_nodes.setdefault(target, []).extend(nodes)
+
+    entity_edges = defaultdict(set)
+    for edge in maybe_edges:
+        entity_edges[edge[0]].add(edge)
+        entity_edges[edge[1]].add(edge)
+    touched = set().union(*[entity_edges.get(alias, ()) for alias in canonical_of])
+    for edge in touched:
+        edge_dps = maybe_edges.pop(edge)
+        src, tgt = (canonical_of.get(e, e) for e in edge)
+        if src == tgt:
+            continue
+        for dp in edge_dps:
+            dp["src_id"] = canonical_of.get(dp["src_id"], dp["src_id"])
+            dp["tgt_id"] = canonical_of.get(dp["tgt_id"], dp["tgt_id"])
+        maybe_edges.setdefault(tuple(sorted((src, tgt))), []).extend(edge_dps)
 
 
 async def custom_extract_entities(
@@ -563,107 +631,12 @@ async def custom_extract_entities(
     entity_vdb: BaseVectorStorage,
     global_config: dict,
     using_amazon_bedrock: bool=False,
+    checkpoint_kv: Union[BaseKVStorage, None] = None,
+    entity_time_db: Union[BaseTemporalStorage, None] = None,
 ) -> Union[BaseGraphStorage, None]:
-    use_llm_func: callable = global_config["best_model_func"]
-    entity_extract_max_gleaning = global_config["entity_extract_max_gleaning"]
-
-    ordered_chunks = list(chunks.items())
-
-    entity_extract_prompt = PROMPTS["entity_extraction"]
-    context_base = dict(
-        tuple_delimiter=PROMPTS["DEFAULT_TUPLE_DELIMITER"],
-        record_delimiter=PROMPTS["DEFAULT_RECORD_DELIMITER"],
-        completion_delimiter=PROMPTS["DEFAULT_COMPLETION_DELIMITER"],
-        entity_types=",".join(PROMPTS["DEFAULT_ENTITY_TYPES"]),
-    )
-    continue_prompt = PROMPTS["entiti_continue_extraction"]
-    if_loop_prompt = PROMPTS["entiti_if_loop_extraction"]
-
-    already_processed = 0
-    already_entities = 0
-    already_relations = 0
-
-    async def _process_single_content(chunk_key_dp: tuple[str, TextChunkSchema]):
-        nonlocal already_processed, already_entities, already_relations
-        chunk_key = chunk_key_dp[0]
-        chunk_dp = chunk_key_dp[1]
-        content = chunk_dp["content"]
-        hint_prompt = entity_extract_prompt.format(**context_base, input_text=content)
-        final_result = await use_llm_func(hint_prompt)
-        if isinstance(final_result, list):
-            final_result = final_result[0]["text"]
-
-        history = pack_user_ass_to_openai_messages(hint_prompt, final_result, using_amazon_bedrock)
-        for now_glean_index in range(entity_extract_max_gleaning):
-            glean_result = await use_llm_func(continue_prompt, history_messages=history)
-
-            history += pack_user_ass_to_openai_messages(continue_prompt, glean_result, using_amazon_bedrock)
-            final_result += glean_result
-            if now_glean_index == entity_extract_max_gleaning - 1:
-                break
-
-            if_loop_result: str = await use_llm_func(
-                if_loop_prompt, history_messages=history
-            )
-            if_loop_result = if_loop_result.strip().strip('"').strip("'").lower()
-            if if_loop_result != "yes":
-                break
-
-        records = split_string_by_multi_markers(
-            final_result,
-            [context_base["record_delimiter"], context_base["completion_delimiter"]],
-        )
-
-        maybe_nodes = defaultdict(list)
-        maybe_edges = defaultdict(list)
-        for record in records:
-            record = re.search(r"\((.*)\)", record)
-            if record is None:
-                continue
-            record = record.group(1)
-            record_attributes = split_string_by_multi_markers(
-                record, [context_base["tuple_delimiter"]]
-            )
-            if_entities = await _handle_single_entity_extraction(
-                record_attributes, chunk_key
-            )
-            if if_entities is not None:
-                maybe_nodes[if_entities["entity_name"]].append(if_entities)
-                continue
-
-            if_relation = await _handle_single_relationship_extraction(
-                record_attributes, chunk_key
-            )
-            if if_relation is not None:
-                maybe_edges[(if_relation["src_id"], if_relation["tgt_id"])].append(
-                    if_relation
-                )
-        already_processed += 1
-        already_entities += len(maybe_nodes)
-        already_relations += len(maybe_edges)
-        now_ticks = PROMPTS["process_tickers"][
-            already_processed % len(PROMPTS["process_tickers"])
-        ]
-        print(
-            f"{now_ticks} Processed {already_processed}({already_processed*100//len(ordered_chunks)}%) chunks,  {already_entities} entities(duplicated), {already_relations} relations(duplicated)\r",
-            end="",
-            flush=True,
-        )
-        return dict(maybe_nodes), dict(maybe_edges)
-
-    # use_llm_func is wrapped in ascynio.Semaphore, limiting max_async callings
-    results = await asyncio.gather(
-        *[_process_single_content(c) for c in ordered_chunks]
+    maybe_nodes, maybe_edges = await _extract_all_chunks(
+        chunks, global_config, using_amazon_bedrock, checkpoint_kv
     )
-    # print()  # clear the progress bar
-    maybe_nodes = defaultdict(list)
-    maybe_edges = defaultdict(list)
-    for m_nodes, m_edges in results:
-        for k, v in m_nodes.items():
-            maybe_nodes[k].extend(v)
-        for k, v in m_edges.items():
-            # it's undirected graph
-            maybe_edges[tuple(sorted(k))].extend(v)
     ### Entity alignment
     maybe_nodes = defaultdict(list,remove_quotes(maybe_nodes))
     maybe_edges = defaultdict(list,remove_quotes(maybe_edges))
@@ -674,41 +647,11 @@ async def custom_extract_entities(
         file.write(str(maybe_nodes))
     with open(f"{global_config['working_dir']}/maybe_edges.json", 'w') as file:
         file.write(str(maybe_edges))
-    entity_list=""
-    for entity_name in maybe_nodes.keys():
-        entity_list += entity_name
-    merge_entity_prompt=PROMPTS['merge_entity'].format(entity_list=entity_list)
-    merge_entity_result=await use_llm_func(merge_entity_prompt)
-    merge_entity_result = merge_entity_result.replace("```","")
-    print(f"Duplicated entity info: \n {merge_entity_result}")
-    merge_entity_result = merge_entity_result.split("<SEP>")
-    for entity_group in merge_entity_result:
-        entity_group = entity_group.replace("\n", "")
-        entity_atom = entity_group.split('-->')
-        if len(entity_atom) != 2:
-            continue
-        entities = [item.strip() for item in entity_atom[0].strip('[]').split(',')]
-        entities = list(set(entities))
-        target_entity = entity_atom[1]
-        if not target_entity:
-            continue
-        # Merge node
-        if target_entity in entities:
-            entities.remove(target_entity)
-        for entity in entities:
-            maybe_nodes[target_entity].extend(maybe_nodes[entity])
-            del maybe_nodes[entity]
-        for i in range(len(maybe_nodes[target_entity])):
-            maybe_nodes[target_entity][i]['entity_name'] = target_entity
-        # Merge edge
-        for edge, description in maybe_edges:
-            for entity in entities:
-                if edge[0]==entity and entity != target_entity:
-                    maybe_edges[(target_entity,edge[1])] = description
-                    del maybe_edges[edge]
-                elif edge[1]==entity and entity != target_entity:
-                    maybe_edges[(edge[0], target_entity)] = description
-                    del maybe_edges[edge]
+    entity_groups = await resolve_entities(
+        {name: nodes[0]["description"] for name, nodes in maybe_nodes.items()},
+        global_config,
+    )
+    _merge_entity_aliases(maybe_nodes, maybe_edges, entity_groups)
     all_entities_data = await asyncio.gather(
         *[
             _merge_nodes_then_upsert(k, v, knwoledge_graph_inst, global_config)
@@ -735,9 +678,9 @@ async def custom_extract_entities(
             }
             for dp in all_entities_data
         }
-        create_postgres_table()
-        insert_rows(data_for_vdb)
         await entity_vdb.upsert(data_for_vdb)
+    if entity_time_db is not None:
+        await _upsert_entity_times(entity_time_db, all_entities_data)
 
     return knwoledge_graph_inst
 
@@ -795,12 +738,10 @@ async def _pack_single_community_describe(
     nodes_in_order = sorted(community["nodes"])
     edges_in_order = sorted(community["edges"], key=lambda x: x[0] + x[1])
 
-    nodes_data = await asyncio.gather(
-        *[knwoledge_graph_inst.get_node(n) for n in nodes_in_order]
-    )
-    edges_data = await asyncio.gather(
-        *[knwoledge_graph_inst.get_edge(src, tgt) for src, tgt in edges_in_order]
-    )
+    nodes_data = await knwoledge_graph_inst.get_nodes(nodes_in_order)
+    edges_data = await knwoledge_graph_inst.get_edges(edges_in_order)
+    nodes_degree = await knwoledge_graph_inst.node_degrees(nodes_in_order)
+    edges_degree = await knwoledge_graph_inst.edge_degrees(edges_in_order)
     node_fields = ["id", "entity", "type", "description", "degree"]
     edge_fields = ["id", "source", "target", "description", "rank"]
     nodes_list_data = [
@@ -809,9 +750,11 @@ async def _pack_single_community_describe(
             node_name,
             node_data.get("entity_type", "UNKNOWN"),
             node_data.get("description", "UNKNOWN"),
-            await knwoledge_graph_inst.node_degree(node_name),
+            node_degree,
         ]
-        for i, (node_name, node_data) in enumerate(zip(nodes_in_order, nodes_data))
+        for i, (node_name, node_data, node_degree) in enumerate(
+            zip(nodes_in_order, nodes_data, nodes_degree)
+        )
     ]
     nodes_list_data = sorted(nodes_list_data, key=lambda x: x[-1], reverse=True)
     nodes_may_truncate_list_data = truncate_list_by_token_size(
@@ -823,9 +766,11 @@ async def _pack_single_community_describe(
             edge_name[0],
             edge_name[1],
             edge_data.get("description", "UNKNOWN"),
-            await knwoledge_graph_inst.edge_degree(*edge_name),
+            edge_degree,
         ]
-        for i, (edge_name, edge_data) in enumerate(zip(edges_in_order, edges_data))
+        for i, (edge_name, edge_data, edge_degree) in enumerate(
+            zip(edges_in_order, edges_data, edges_degree)
+        )
     ]
     edges_list_data = sorted(edges_list_data, key=lambda x: x[-1], reverse=True)
     edges_may_truncate_list_data = truncate_list_by_token_size(
@@ -914,6 +859,7 @@ def _community_report_json_to_str(parsed_output: dict) -> str:
     return f"# {title}\n\n{summary}\n\n{report_sections}"
 
 
+@llm_priority_scope("report")
 async def generate_community_report(
     community_report_kv: BaseKVStorage[CommunitySchema],
     knwoledge_graph_inst: BaseGraphStorage,
@@ -931,12 +877,20 @@ async def generate_community_report(
     community_keys, community_values = list(communities_schema.keys()), list(
         communities_schema.values()
     )
+    # a stored report is reused when its community is described the same way
+    previous_keys = await community_report_kv.all_keys()
+    previous_reports = {
+        r["describe_hash"]: r["report_json"]
+        for r in await community_report_kv.get_by_ids(previous_keys)
+        if r is not None and "describe_hash" in r
+    }
     already_processed = 0
+    already_reused = 0
 
     async def _form_single_community_report(
         community: SingleCommunitySchema, already_reports: dict[str, CommunitySchema]
     ):
-        nonlocal already_processed
+        nonlocal already_processed, already_reused
         describe = await _pack_single_community_describe(
             knwoledge_graph_inst,
             community,
@@ -944,6 +898,10 @@ async def generate_community_report(
             already_reports=already_reports,
             global_config=global_config,
         )
+        describe_hash = compute_mdhash_id(describe, prefix="describe-")
+        if describe_hash in previous_reports:
+            already_reused += 1
+            return previous_reports[describe_hash], describe_hash
         prompt = community_report_prompt.format(input_text=describe)
         response = await use_llm_func(prompt, **llm_extra_kwargs)
 
@@ -957,7 +915,7 @@ async def generate_community_report(
             end="",
             flush=True,
         )
-        return data
+        return data, describe_hash
 
     levels = sorted(set([c["level"] for c in community_values]), reverse=True)
     logger.info(f"Generating by levels: {levels}")
@@ -981,9 +939,10 @@ async def generate_community_report(
                 k: {
                     "report_string": _community_report_json_to_str(r),
                     "report_json": r,
+                    "describe_hash": h,
                     **v,
                 }
-                for k, r, v in zip(
+                for k, (r, h), v in zip(
                     this_level_community_keys,
                     this_level_communities_reports,
                     this_level_community_values,
@@ -991,6 +950,10 @@ async def generate_community_report(
             }
         )
     print()  # clear the progress bar
+    logger.info(
+        f"Reused {already_reused} of {len(community_datas)} community reports"
+    )
+    await community_report_kv.drop()
     await community_report_kv.upsert(community_datas)
 
 
@@ -1050,8 +1013,8 @@ async def _find_most_related_text_unit_from_entities(
         split_string_by_multi_markers(dp["source_id"], [GRAPH_FIELD_SEP])
         for dp in node_datas
     ]
-    edges = await asyncio.gather(
-        *[knowledge_graph_inst.get_node_edges(dp["entity_name"]) for dp in node_datas]
+    edges = await knowledge_graph_inst.get_nodes_edges(
+        [dp["entity_name"] for dp in node_datas]
     )
     all_one_hop_nodes = set()
     for this_edges in edges:
@@ -1059,39 +1022,52 @@ async def _find_most_related_text_unit_from_entities(
             continue
         all_one_hop_nodes.update([e[1] for e in this_edges])
     all_one_hop_nodes = list(all_one_hop_nodes)
-    all_one_hop_nodes_data = await asyncio.gather(
-        *[knowledge_graph_inst.get_node(e) for e in all_one_hop_nodes]
-    )
+    all_one_hop_nodes_data = await knowledge_graph_inst.get_nodes(all_one_hop_nodes)
     all_one_hop_text_units_lookup = {
         k: set(split_string_by_multi_markers(v["source_id"], [GRAPH_FIELD_SEP]))
         for k, v in zip(all_one_hop_nodes, all_one_hop_nodes_data)
         if v is not None
     }
-    all_text_units_lookup = {}
-    for index, (this_text_units, this_edges) in enumerate(zip(text_units, edges)):
-        for c_id in this_text_units:
-            if c_id in all_text_units_lookup:
-                continue
-            relation_counts = 0
-            for e in this_edges:
-                if (
-                    e[1] in all_one_hop_text_units_lookup
-                    and c_id in all_one_hop_text_units_lookup[e[1]]
-                ):
-                    relation_counts += 1
-            all_text_units_lookup[c_id] = {
-                "data": await text_chunks_db.get_by_id(c_id),
-                "order": index,
-                "relation_counts": relation_counts,
-            }
-    if any([v is None for v in all_text_units_lookup.values()]):
+    # the chunks in the order of the first entity they come from
+    chunk_ids = list(dict.fromkeys(c_id for units in text_units for c_id in units))
+    if not chunk_ids:
+        return []
+    chunk_index = {c_id: i for i, c_id in enumerate(chunk_ids)}
+    neighbor_index = {k: i for i, k in enumerate(all_one_hop_text_units_lookup)}
+    entity_chunks = np.zeros((len(node_datas), len(chunk_ids)), dtype=np.int32)
+    for i, units in enumerate(text_units):
+        entity_chunks[i, [chunk_index[c_id] for c_id in units]] = 1
+    neighbor_chunks = np.zeros((len(neighbor_index), len(chunk_ids)), dtype=np.int32)
+    for k, units in all_one_hop_text_units_lookup.items():
+        neighbor_chunks[
+            neighbor_index[k], [chunk_index[c_id] for c_id in units if c_id in chunk_index]
+        ] = 1
+    entity_neighbors = np.zeros((len(node_datas), len(neighbor_index)), dtype=np.int32)
+    for i, this_edges in enumerate(edges):
+        for e in this_edges or []:
+            if e[1] in neighbor_index:
+                entity_neighbors[i, neighbor_index[e[1]]] += 1
+    # the relations of an entity whose other end also comes from the chunk,
+    # counted for the first entity of each chunk
+    order = entity_chunks.argmax(axis=0)
+    relation_counts = (entity_neighbors @ neighbor_chunks)[
+        order, np.arange(len(chunk_ids))
+    ]
+    ranked = np.lexsort((-relation_counts, order))
+
+    chunks_data = await text_chunks_db.get_by_ids(chunk_ids)
+    if any([v is None for v in chunks_data]):
         logger.warning("Text chunks are missing, maybe the storage is damaged")
     all_text_units = [
-        {"id": k, **v} for k, v in all_text_units_lookup.items() if v is not None
+        {
+            "id": chunk_ids[i],
+            "data": chunks_data[i],
+            "order": int(order[i]),
+            "relation_counts": int(relation_counts[i]),
+        }
+        for i in ranked
+        if chunks_data[i] is not None
     ]
-    all_text_units = sorted(
-        all_text_units, key=lambda x: (x["order"], -x["relation_counts"])
-    )
     all_text_units = truncate_list_by_token_size(
         all_text_units,
         key=lambda x: x["data"]["content"],
@@ -1106,8 +1082,8 @@ async def _find_most_related_edges_from_entities(
     query_param: QueryParam,
     knowledge_graph_inst: BaseGraphStorage,
 ):
-    all_related_edges = await asyncio.gather(
-        *[knowledge_graph_inst.get_node_edges(dp["entity_name"]) for dp in node_datas]
+    all_related_edges = await knowledge_graph_inst.get_nodes_edges(
+        [dp["entity_name"] for dp in node_datas]
     )
     
     all_edges = []
@@ -1120,12 +1096,8 @@ async def _find_most_related_edges_from_entities(
                 seen.add(sorted_edge)
                 all_edges.append(sorted_edge) 
                 
-    all_edges_pack = await asyncio.gather(
-        *[knowledge_graph_inst.get_edge(e[0], e[1]) for e in all_edges]
-    )
-    all_edges_degree = await asyncio.gather(
-        *[knowledge_graph_inst.edge_degree(e[0], e[1]) for e in all_edges]
-    )
+    all_edges_pack = await knowledge_graph_inst.get_edges(all_edges)
+    all_edges_degree = await knowledge_graph_inst.edge_degrees(all_edges)
     all_edges_data = [
         {"src_tgt": k, "rank": d, **v}
         for k, v, d in zip(all_edges, all_edges_pack, all_edges_degree)
@@ -1142,122 +1114,290 @@ async def _find_most_related_edges_from_entities(
     return all_edges_data
 
 
-def postgres_query_date(start_time: datetime, end_time: datetime, top_k: int = 20):
-    connection = None
-    cursor = None
-    if start_time == None or end_time == None:
-        return
-    if start_time==end_time:
-        start_time,end_time=start_time+relativedelta(months=-6), start_time+relativedelta(months=+6)
-    try:
-        # Establish connection
-        connection = get_connection()
-        cursor = connection.cursor()
-
-        # Query to select entities in the given time period
-        query = '''
-        SELECT entity_hash_id, entity_name, entity_time, entity_description
-        FROM lichsu12
-        WHERE entity_time BETWEEN %s AND %s
-        LIMIT %s;
-        '''
-        # Execute the query with the provided start_time, end_time, and top_k limit
-        cursor.execute(query, (start_time, end_time, top_k))
-
-        # Fetch all results
-        results = cursor.fetchall()
-        return [
-            {
-                "id": result[0],  # entity_hash_id
-                "entity_name": result[1],
-                "entity_time": result[2],
-                "entity_description": result[3],
-                "distance": 0.5
-            }
-            for result in results
-        ]
+def _fuse_ranked_entities(*ranked_lists: list[dict], k: int = 60) -> list[dict]:
+    """Reciprocal rank fusion of entity lists: an entity scores
+    ``sum(1 / (k + rank))`` over the lists it's in, so the ones found by both
+    the vector and the time-range search come first"""
+    scores = defaultdict(float)
+    entities = {}
+    for ranked in ranked_lists:
+        for rank, entity in enumerate(ranked):
+            name = entity["entity_name"]
+            scores[name] += 1 / (k + rank + 1)
+            entities[name] = {**entity, **entities.get(name, {})}
+    return [entities[name] for name in sorted(scores, key=scores.get, reverse=True)]
 
-    except Exception as e:
-        print(f"Error querying PostgreSQL: {e}")
-        return []
 
-    finally:
-        # Ensure resources are released
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+LOCAL_QUERY_STAGES = ("answer_filter", "time_extraction", "rerank")
 
-def postgres_query_entity_name(entity_name: str):
-    connection = None
-    cursor = None
-    try:
-        # Establish connection
-        connection = get_connection()
-        cursor = connection.cursor()
-
-        # Query to select entities in the given time period
-        query = '''
-        SELECT entity_hash_id, entity_name, entity_time, entity_description
-        FROM lichsu12
-        WHERE entity_name = %s;
-        '''
-        # Execute the query with the provided start_time, end_time, and top_k limit
-        cursor.execute(query, (entity_name,))
-
-        # Fetch all results
-        results = cursor.fetchall()
-        return [
-            {
-                "id": result[0],  # entity_hash_id
-                "entity_name": result[1],
-                "entity_time": result[2],
-                "entity_description": result[3],
-            }
-            for result in results
-        ]
 
-    except Exception as e:
-        print(f"Error querying PostgreSQL: {e}")
-        return []
+async def _cached_query_stage(
+    stage: str, stage_caches: Union[dict[str, BaseKVStorage], None], compute, *args
+):
+    """Run ``compute(*args)``, or return its result cached for ``args`` in the
+    stage's cache. Results must be JSON-serializable."""
+    stage_cache = (stage_caches or {}).get(stage)
+    if stage_cache is None:
+        return await compute(*args)
+    args_hash = compute_args_hash(stage, *args)
+    cached = await stage_cache.get_by_id(args_hash)
+    if cached is not None:
+        return cached["return"]
+    result = await compute(*args)
+    await stage_cache.upsert({args_hash: {"return": result}})
+    return result
+
+
+async def _filter_answer_options(query: str, global_config: dict) -> str:
+    use_model_func = global_config["cheap_model_func"]
+    filter_query = f"""
+Dưới đây là 1 câu hỏi trắc nghiệm về chủ đề lịch sử, bạn có thể giúp tôi lọc bỏ những đáp án chắc chắn sai và giữ lại những đáp án có khả năng là đáp án chính xác.
+Các đáp án có khả năng trên sẽ được tìm kiếm trên bộ dữ liệu để xác định kết quả chính xác nhất.
+Đầu ra chỉ cần là câu hỏi cũ và các đáp án có thể có. Không cần giải thích gì thêm
+###################### Ví dụ ######################
+Input:
+Cách mạng tháng Tám năm 1945 và cuộc Tổng tiến công và nổi dậy Xuân 1975 ở Việt Nam có điểm chung là  
+A. xóa bỏ được tình trạng đất nước bị chia cắt.  
+B. hoàn thành cuộc cách mạng dân chủ nhân dân.  
+C. hoàn thành thống nhất đất nước về mặt nhà nước.  
+D. được sự ủng hộ mạnh mẽ của nhân dân thế giới.
+Output:
+Cách mạng tháng Tám năm 1945 và cuộc Tổng tiến công và nổi dậy Xuân 1975 ở Việt Nam có điểm chung là  
+A. xóa bỏ được tình trạng đất nước bị chia cắt.  
+C. hoàn thành thống nhất đất nước về mặt nhà nước.  
+###################### Dữ liệu thực tế ######################
+Input: {query}
+    """
+    return await use_model_func(filter_query)
+
+
+_ROMAN_NUMERALS = {"I": 1, "V": 5, "X": 10, "L": 50, "C": 100}
+_PERIOD_PATTERN = re.compile(
+    r"(?:ngày\s+)?(?P<day>\d{1,2})\s*(?:/|-|\s+tháng\s+)\s*(?P<day_month>\d{1,2})"
+    r"\s*(?:/|-|,?\s*năm\s+)\s*(?P<day_year>\d{4})\b"
+    r"|tháng\s+(?P<month>\d{1,2})\s*(?:[/\-–—]|,?\s*năm)\s*(?P<month_year>\d{4})\b"
+    r"|\b(?P<slash_month>\d{1,2})/(?P<slash_year>\d{4})\b"
+    r"|(?:từ\s+(?:năm\s+)?)?\b(?P<range_start>\d{4})\s*(?:[\-–—]|đến(?:\s+năm)?)\s*(?P<range_end>\d{4})\b"
+    r"|thế\s+k[ỷỉ]\s+(?P<century>[IVXLC]+)\b"
+    r"|(?:năm|xuân|hạ|hè|thu|đông)\s+(?P<keyword_year>\d{4})\b"
+    r"|\b(?P<year>\d{4})\b",
+    re.IGNORECASE,
+)
+# where the answer options of a multiple-choice question start, inline or not
+_FIRST_ANSWER_OPTION = re.compile(r"(?:^|\s)[Aa]\s*[.)]\s", re.MULTILINE)
+# a 4-digit number without a date keyword is only taken for a year in this range,
+# "3000 người" is a count
+_PLAUSIBLE_YEARS = range(1000, datetime.now().year + 1)
 
-    finally:
-        # Ensure resources are released
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
-async def _build_local_query_context(
-    query,
-    knowledge_graph_inst: BaseGraphStorage,
-    entities_vdb: BaseVectorStorage,
-    community_reports: BaseKVStorage[CommunitySchema],
-    text_chunks_db: BaseKVStorage[TextChunkSchema],
-    query_param: QueryParam,
-):
-    from ._llm import gpt_4o_mini_complete, gpt_4o_complete
+def _roman_to_int(numeral: str) -> int:
+    values = [_ROMAN_NUMERALS[c] for c in numeral.upper()]
+    return sum(
+        -v if i + 1 < len(values) and v < values[i + 1] else v
+        for i, v in enumerate(values)
+    )
+
+
+def _date_span(date_str: str) -> Union[tuple[datetime, datetime], None]:
+    """The first and last second of a date in one of the ``DATE_FORMATS``: a
+    year, a month or a day. None if ``parse_date`` can't parse it."""
+    start = parse_date(date_str)
+    if start is None:
+        return None
+    parts = len(re.split(r"[/-]", date_str.strip()))
+    step = (
+        relativedelta(years=1)
+        if parts == 1
+        else relativedelta(months=1) if parts == 2 else relativedelta(days=1)
+    )
+    return start, start + step - relativedelta(seconds=1)
+
+
+def extract_period_by_rules(query: str) -> Union[tuple[datetime, datetime], None]:
+    """The period spanned by the dates written in the question stem, like
+    "năm 1936", "1930-1931", "Xuân 1975", "tháng 8 năm 1945", "2/9/1945" or
+    "thế kỷ XIX", up to the end of the last year, month or day. Each date is
+    rewritten to one of the ``DATE_FORMATS`` and parsed by ``parse_date``. The
+    answer options are left out, they'd span all the years they offer. None if
+    the stem has no date."""
+    first_option = _FIRST_ANSWER_OPTION.search(query)
+    stem = query[: first_option.start()] if first_option is not None else query
+    dates = []
+    for match in _PERIOD_PATTERN.finditer(stem):
+        groups = match.groupdict()
+        if groups["day"] is not None:
+            dates.append(f"{groups['day']}/{groups['day_month']}/{groups['day_year']}")
+        elif groups["month"] is not None:
+            dates.append(f"{groups['month']}/{groups['month_year']}")
+        elif groups["slash_month"] is not None:
+            dates.append(f"{groups['slash_month']}/{groups['slash_year']}")
+        elif groups["range_start"] is not None:
+            years = [groups["range_start"], groups["range_end"]]
+            if all(int(y) in _PLAUSIBLE_YEARS for y in years):
+                dates.extend(years)
+        elif groups["century"] is not None:
+            century = _roman_to_int(groups["century"])
+            dates.extend([f"{(century - 1) * 100:04d}", f"{century * 100 - 1:04d}"])
+        elif groups["keyword_year"] is not None:
+            dates.append(groups["keyword_year"])
+        elif int(groups["year"]) in _PLAUSIBLE_YEARS:
+            dates.append(groups["year"])
+    spans = [span for span in map(_date_span, dates) if span is not None]
+    if not spans:
+        return None
+    return min(start for start, _ in spans), max(end for _, end in spans)
+
 
-    results = await entities_vdb.query(query, top_k=query_param.top_k)
-    for i in range(len(results)):
-        entity_name = results[i]['entity_name']
-        entity_info = postgres_query_entity_name(entity_name)
+async def _extract_query_period(
+    query: str,
+    global_config: dict,
+    stage_caches: Union[dict[str, BaseKVStorage], None] = None,
+) -> Union[list[str], None]:
+    """The ``[start, end]`` period of the query as ISO strings, a period of less
+    than a year widened to the year around it. The dates written in the query
+    are found by rules, the ``cheap_model_func`` is only asked, through the
+    time_extraction stage cache, when there are none. None if it can't be
+    parsed."""
+    use_model_func = global_config["cheap_model_func"]
+    period = extract_period_by_rules(query)
+    if period is None:
+        query_period_query = PROMPTS["time_extraction"].format(query=query)
+        time_period = await _cached_query_stage(
+            "time_extraction", stage_caches, use_model_func, query_period_query
+        )
         try:
-            results[i]['entity_description'] = entity_info[0]['entity_description']
-        except Exception as e:
-            print(f"#### Cannot extract entity description for {entity_name} with error {e}")
-            results[i]['entity_description'] = "None"
+            start_time, end_time = time_period.split("-")
+        except ValueError:
+            return None
+        start_span, end_span = _date_span(start_time), _date_span(end_time)
+        if start_span is None or end_span is None:
+            return None
+        period = start_span[0], end_span[1]
+    start_time, end_time = period
+    if end_time < start_time + relativedelta(years=1, seconds=-1):
+        # the spans end one second before the next month or day
+        center = start_time + (end_time + relativedelta(seconds=1) - start_time) / 2
+        start_time, end_time = (
+            center + relativedelta(months=-6),
+            center + relativedelta(months=+6),
+        )
+    return [start_time.isoformat(), end_time.isoformat()]
+
+
+_ANSWER_OPTION = re.compile(r"^\s*[A-Da-d]\s*[.)]\s*(.+)$", re.MULTILINE)
+_WORD = re.compile(r"\w+")
+
+
+def _entity_time_of(value) -> Union[datetime, None]:
+    """The first time of an entity, from the temporal storage (a datetime) or
+    from its graph node (the space-separated times of its descriptions)"""
+    if value is None or isinstance(value, datetime):
+        return value
+    for token in str(value).split():
+        time = parse_date(token)
+        if time is not None:
+            return time
+    return None
+
+
+def _lexical_overlap(query: str, entity_texts: list[str]) -> np.ndarray:
+    """For each entity, the best idf-weighted share of an answer option's words
+    found in its name and description. The whole query is one option if it
+    has none."""
+    options = _ANSWER_OPTION.findall(query) or [query]
+    option_words = [set(_WORD.findall(o.lower())) for o in options]
+    vocab = {w: i for i, w in enumerate(set().union(*option_words))}
+    if not vocab or not entity_texts:
+        return np.zeros(len(entity_texts), dtype=np.float32)
+    option_matrix = np.zeros((len(options), len(vocab)), dtype=np.float32)
+    for i, words in enumerate(option_words):
+        option_matrix[i, [vocab[w] for w in words]] = 1.0
+    entity_matrix = np.zeros((len(entity_texts), len(vocab)), dtype=np.float32)
+    for i, text in enumerate(entity_texts):
+        found = [vocab[w] for w in set(_WORD.findall(text.lower())) if w in vocab]
+        entity_matrix[i, found] = 1.0
+    # words shared by most candidates ("của", "và", ...) tell little
+    idf = np.log1p(len(entity_texts) / (1.0 + entity_matrix.sum(axis=0)))
+    weighted_options = option_matrix * idf
+    overlap = (entity_matrix @ weighted_options.T) / np.maximum(
+        weighted_options.sum(axis=1), 1e-12
+    )
+    return overlap.max(axis=1)
+
+
+async def score_rerank_entities(
+    query: str,
+    entities: list[dict],
+    query_period: Union[list[str], None],
+    query_param: QueryParam,
+    global_config: dict,
+    **kwargs,
+) -> list[dict]:
+    """Rerank the candidate entities in-process and keep the ``top_k`` best.
+
+    The score is a weighted sum (``entity_rerank_weights``) of the vector
+    similarity, the log degree of the node, the overlap of the entity time
+    with the query period and the lexical overlap with the answer options,
+    each scaled to [0, 1] over the candidates.
+    """
+    if not entities:
+        return entities
+    weights = global_config["entity_rerank_weights"]
+    # NanoVectorDB's "distance" is a similarity, hnswlib's a cosine distance
+    # next to its "similarity"
+    similarity = np.array(
+        [e.get("similarity", e.get("distance", 0.0)) for e in entities],
+        dtype=np.float32,
+    )
+    degree = np.log1p(np.array([e.get("rank", 0) for e in entities], dtype=np.float32))
+
+    temporal = np.zeros(len(entities), dtype=np.float32)
+    if query_period is not None:
+        start, end = (np.datetime64(t, "s").astype(np.int64) for t in query_period)
+        times = [_entity_time_of(e.get("entity_time")) for e in entities]
+        known = np.array([t is not None for t in times])
+        seconds = np.array(
+            [np.datetime64(t, "s").astype(np.int64) if t is not None else 0 for t in times],
+            dtype=np.float64,
+        )
+        # 1 inside the period, decaying with the distance to it outside
+        gap = np.maximum(start - seconds, 0) + np.maximum(seconds - end, 0)
+        scale = max(end - start, 365 * 24 * 3600)
+        temporal = np.where(known, np.exp(-gap / scale), 0.0).astype(np.float32)
+
+    lexical = _lexical_overlap(
+        query,
+        [f"{e['entity_name']} {e.get('entity_description', '')}" for e in entities],
+    )
+
+    def scaled(values: np.ndarray) -> np.ndarray:
+        span = values.max() - values.min()
+        return (values - values.min()) / span if span > 0 else np.zeros_like(values)
+
+    scores = (
+        weights.get("similarity", 0.0) * scaled(similarity)
+        + weights.get("degree", 0.0) * scaled(degree)
+        + weights.get("temporal", 0.0) * temporal
+        + weights.get("lexical", 0.0) * lexical
+    )
+    order = np.argsort(-scores, kind="stable")[: query_param.top_k]
+    return [entities[i] for i in order]
+
+
+async def llm_rerank_entities(
+    query: str,
+    entities: list[dict],
+    query_period: Union[list[str], None],
+    query_param: QueryParam,
+    global_config: dict,
+    stage_caches: Union[dict[str, BaseKVStorage], None] = None,
+    **kwargs,
+) -> list[dict]:
+    """Keep the entities that the LLM finds useful to answer the query"""
+    from ._llm import gpt_4o_complete
+
+    results = entities
 
-    query_period_query = PROMPTS['time_extraction'].format(query=query)
-    time_period= await gpt_4o_mini_complete(query_period_query)
-    try:
-        start_time, end_time = time_period.split("-")
-        time_results = postgres_query_date(start_time=parse_date(start_time), end_time=parse_date(end_time))
-        if time_results != None:
-            results.extend(time_results)
-    except:
-        pass
-    ### rerank using LLM
     try:
         rerank_entity_query=f"""
     Tôi đang có danh sách các thực thể và các mô tả của các thực thể về 1 chủ đề lịch sử. Bạn hãy giúp tôi lọc ra những thực thể hữu ích để trả lời câu hỏi được đưa ra.
@@ -1281,7 +1421,9 @@ Danh sách các thực thể:
 ######################
 Output:
     """
-        rerank_entities = await gpt_4o_complete(rerank_entity_query)
+        rerank_entities = await _cached_query_stage(
+            "rerank", stage_caches, gpt_4o_complete, rerank_entity_query
+        )
         rerank_entities_list = rerank_entities.split("|")
         # rerank_entities_list=[entity.replace('"','') for entity in rerank_entities_list]
         # temp_results = []
@@ -1290,23 +1432,67 @@ Output:
         #     if entity['entity_name'][1:-2] in rerank_entities_list:
         #         temp_results.append(entity)
         # results = temp_results
-        results = [entity for entity in results if entity['entity_name'] in rerank_entities_list]
+        return [entity for entity in results if entity['entity_name'] in rerank_entities_list]
     except:
         print("Can't do rerank for query output")
+        return results
+
+
+async def _build_local_query_context(
+    query,
+    results: list[dict],
+    query_period: Union[list[str], None],
+    knowledge_graph_inst: BaseGraphStorage,
+    community_reports: BaseKVStorage[CommunitySchema],
+    text_chunks_db: BaseKVStorage[TextChunkSchema],
+    query_param: QueryParam,
+    global_config: dict,
+    entity_time_db: Union[BaseTemporalStorage, None] = None,
+    stage_caches: Union[dict[str, BaseKVStorage], None] = None,
+):
+    if entity_time_db is not None and query_period is not None:
+        time_results = await entity_time_db.query_time_range(
+            *map(datetime.fromisoformat, query_period), top_k=query_param.top_k
+        )
+        results = _fuse_ranked_entities(results, time_results)
+    # one batched lookup of the candidates on the graph, their descriptions
+    # feed the rerank and the nodes are reused for the context
+    candidate_nodes = await knowledge_graph_inst.get_nodes(
+        [r["entity_name"] for r in results]
+    )
+    node_of_name = {}
+    for result, node in zip(results, candidate_nodes):
+        if node is None:
+            logger.warning(f"Cannot find the node of entity {result['entity_name']}")
+            result["entity_description"] = "None"
+            continue
+        node_of_name[result["entity_name"]] = node
+        result["entity_description"] = node.get("description", "None")
+        result.setdefault("entity_time", node.get("entity_time"))
+    candidate_degrees = await knowledge_graph_inst.node_degrees(
+        [r["entity_name"] for r in results]
+    )
+    for result, degree in zip(results, candidate_degrees):
+        result["rank"] = degree
+    if query_param.local_rerank:
+        rerank_func = global_config["entity_rerank_func"]
+        results = await rerank_func(
+            query,
+            results,
+            query_period,
+            query_param,
+            global_config,
+            stage_caches=stage_caches,
+        )
 
     if not len(results):
         return None
-    node_datas = await asyncio.gather(
-        *[knowledge_graph_inst.get_node(r["entity_name"]) for r in results]
-    )
+    node_datas = [node_of_name.get(r["entity_name"]) for r in results]
     if not all([n is not None for n in node_datas]):
         logger.warning("Some nodes are missing, maybe the storage is damaged")
-    node_degrees = await asyncio.gather(
-        *[knowledge_graph_inst.node_degree(r["entity_name"]) for r in results]
-    )
     node_datas = [
-        {**n, "entity_name": k["entity_name"], "rank": d}
-        for k, n, d in zip(results, node_datas, node_degrees)
+        {**n, "entity_name": k["entity_name"], "rank": k["rank"]}
+        for k, n in zip(results, node_datas)
         if n is not None
     ]
     # use_communities = await _find_most_related_community_from_entities(
@@ -1379,39 +1565,52 @@ async def local_query(
     text_chunks_db: BaseKVStorage[TextChunkSchema],
     query_param: QueryParam,
     global_config: dict,
+    entity_time_db: Union[BaseTemporalStorage, None] = None,
+    stage_caches: Union[dict[str, BaseKVStorage], None] = None,
+    query_context: Union[dict, None] = None,
 ) -> str:
-    from ._llm import gpt_4o_mini_complete
     use_model_func = global_config["cheap_model_func"]
 
-    filter_query = f"""
-Dưới đây là 1 câu hỏi trắc nghiệm về chủ đề lịch sử, bạn có thể giúp tôi lọc bỏ những đáp án chắc chắn sai và giữ lại những đáp án có khả năng là đáp án chính xác.
-Các đáp án có khả năng trên sẽ được tìm kiếm trên bộ dữ liệu để xác định kết quả chính xác nhất.
-Đầu ra chỉ cần là câu hỏi cũ và các đáp án có thể có. Không cần giải thích gì thêm
-###################### Ví dụ ######################
-Input:
-Cách mạng tháng Tám năm 1945 và cuộc Tổng tiến công và nổi dậy Xuân 1975 ở Việt Nam có điểm chung là  
-A. xóa bỏ được tình trạng đất nước bị chia cắt.  
-B. hoàn thành cuộc cách mạng dân chủ nhân dân.  
-C. hoàn thành thống nhất đất nước về mặt nhà nước.  
-D. được sự ủng hộ mạnh mẽ của nhân dân thế giới.
-Output:
-Cách mạng tháng Tám năm 1945 và cuộc Tổng tiến công và nổi dậy Xuân 1975 ở Việt Nam có điểm chung là  
-A. xóa bỏ được tình trạng đất nước bị chia cắt.  
-C. hoàn thành thống nhất đất nước về mặt nhà nước.  
-###################### Dữ liệu thực tế ######################
-Input: {query}
-    """
-    query = await use_model_func(filter_query)
+    async def answer_filter_stage():
+        if not query_param.local_answer_filter:
+            return query
+        return await _cached_query_stage(
+            "answer_filter",
+            stage_caches,
+            partial(_filter_answer_options, global_config=global_config),
+            query,
+        )
+
+    async def time_extraction_stage():
+        if entity_time_db is None or not query_param.local_time_extraction:
+            return None
+        # the rules run on every query, only the LLM fallback is cached
+        return await _extract_query_period(query, global_config, stage_caches)
+
+    # the entity search and the time extraction only need the question, so they
+    # run while the LLM filters out the wrong answer options
+    filtered_query, query_period, results = await asyncio.gather(
+        answer_filter_stage(),
+        time_extraction_stage(),
+        entities_vdb.query(query, top_k=query_param.top_k),
+    )
+    query = filtered_query
     print(query)
 
     context = await _build_local_query_context(
         query,
+        results,
+        query_period,
         knowledge_graph_inst,
-        entities_vdb,
         community_reports,
         text_chunks_db,
         query_param,
+        global_config,
+        entity_time_db,
+        stage_caches,
     )
+    if query_context is not None:
+        query_context["context"] = context
     if query_param.only_need_context:
         print(f"@@@@@@@@@@@@@@@@@@@\nContext below:\n{context}")
     if context is None:
@@ -1487,6 +1686,7 @@ async def global_query(
     text_chunks_db: BaseKVStorage[TextChunkSchema],
     query_param: QueryParam,
     global_config: dict,
+    query_context: Union[dict, None] = None,
 ) -> str:
     community_schema = await knowledge_graph_inst.community_schema()
     community_schema = {
@@ -1555,6 +1755,8 @@ Importance Score: {dp['score']}
 """
         )
     points_context = "\n".join(points_context)
+    if query_context is not None:
+        query_context["context"] = points_context
     if query_param.only_need_context:
         return points_context
     sys_prompt_temp = PROMPTS["global_reduce_rag_response"]
@@ -1573,6 +1775,7 @@ async def naive_query(
     text_chunks_db: BaseKVStorage[TextChunkSchema],
     query_param: QueryParam,
     global_config: dict,
+    query_context: Union[dict, None] = None,
 ):
     use_model_func = global_config["best_model_func"]
     results = await chunks_vdb.query(query, top_k=query_param.top_k)
@@ -1588,6 +1791,8 @@ async def naive_query(
     )
     logger.info(f"Truncate {len(chunks)} to {len(maybe_trun_chunks)} chunks")
     section = "--New Chunk--\n".join([c["content"] for c in maybe_trun_chunks])
+    if query_context is not None:
+        query_context["context"] = section
     if query_param.only_need_context:
         return section
     sys_prompt_temp = PROMPTS["naive_rag_response"]
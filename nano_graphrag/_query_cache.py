@@ -0,0 +1,131 @@
+"""Cache the context and response of queries, for the same query or, optionally,
+a near-identical one.
+
+Each entry is keyed by the query and its ``QueryParam``. A lookup first tries
+the exact key, then, if a similarity threshold is set, compares the query
+embedding with the embeddings of the cached queries of the same
+``QueryParam``, all of them in one matrix product.
+Entries are evicted least recently used first or once older than the TTL, and
+all of them are dropped when the index changes.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Optional, Union
+
+import numpy as np
+
+from ._utils import EmbeddingFunc, compute_args_hash, logger
+from .base import QueryParam
+
+
+def _param_key(param: QueryParam) -> str:
+    return compute_args_hash(sorted(asdict(param).items()))
+
+
+@dataclass
+class SemanticQueryCache:
+    embedding_func: EmbeddingFunc
+    # None only reuses the responses of the exact same query. The answers of
+    # multiple-choice questions differing by a year or an option are one letter
+    # apart, so near-identical queries are only reused when asked.
+    similarity_threshold: Optional[float] = None
+    max_size: int = 1024
+    # seconds, None to keep the entries until they are evicted
+    ttl: Optional[float] = 3600.0
+
+    _entries: OrderedDict = field(default_factory=OrderedDict, init=False)
+    _matrix: Union[np.ndarray, None] = field(default=None, init=False)
+    _matrix_keys: list = field(default_factory=list, init=False)
+    _matrix_params: Union[np.ndarray, None] = field(default=None, init=False)
+    generation: int = field(default=0, init=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, entry: dict) -> bool:
+        return self.ttl is not None and time.monotonic() - entry["created"] > self.ttl
+
+    def _drop(self, key: str):
+        del self._entries[key]
+        self._matrix = None
+
+    def _build_matrix(self):
+        keys = [k for k, v in self._entries.items() if v["embedding"] is not None]
+        self._matrix_keys = keys
+        if keys:
+            self._matrix = np.stack([self._entries[k]["embedding"] for k in keys])
+        else:
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._matrix_params = np.array(
+            [self._entries[k]["param_key"] for k in keys], dtype=object
+        )
+
+    async def _embed(self, query: str) -> np.ndarray:
+        embedding = np.asarray((await self.embedding_func([query]))[0], dtype=np.float32)
+        return embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+
+    def _hit(self, key: str) -> dict:
+        self._entries.move_to_end(key)
+        entry = self._entries[key]
+        return {"context": entry["context"], "response": entry["response"]}
+
+    async def get(self, query: str, param: QueryParam) -> tuple[Optional[dict], dict]:
+        """The cached ``{"context", "response"}`` of the query, or None. The
+        second value is the lookup state to give back to ``put`` on a miss."""
+        param_key = _param_key(param)
+        key = compute_args_hash(param_key, query)
+        state = {"key": key, "param_key": param_key, "generation": self.generation}
+        entry = self._entries.get(key)
+        if entry is not None and not self._expired(entry):
+            return self._hit(key), state
+        if entry is not None:
+            self._drop(key)
+        if self.similarity_threshold is None:
+            return None, state
+
+        state["embedding"] = embedding = await self._embed(query)
+        if state["generation"] != self.generation:
+            return None, state
+        if self._matrix is None:
+            self._build_matrix()
+        if not self._matrix_keys:
+            return None, state
+        similarities = self._matrix @ embedding
+        similarities[self._matrix_params != param_key] = -np.inf
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None, state
+        best_key = self._matrix_keys[best]
+        if self._expired(self._entries[best_key]):
+            self._drop(best_key)
+            return None, state
+        logger.debug(
+            f"Query cache hit with similarity {similarities[best]:.3f}: "
+            f"{self._entries[best_key]['query']!r}"
+        )
+        return self._hit(best_key), state
+
+    def put(
+        self, query: str, response: str, state: dict, context: Optional[str] = None
+    ):
+        # the index changed while the query ran, its response may be stale
+        if state["generation"] != self.generation:
+            return
+        self._entries[state["key"]] = {
+            "query": query,
+            "param_key": state["param_key"],
+            "embedding": state.get("embedding"),
+            "context": context,
+            "response": response,
+            "created": time.monotonic(),
+        }
+        self._entries.move_to_end(state["key"])
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def invalidate(self):
+        self._entries.clear()
+        self._matrix = None
+        self.generation += 1
@@ -1,5 +1,12 @@
 from .gdb_networkx import NetworkXStorage
+from .gdb_csr import CSRGraphStorage
 from .gdb_neo4j import Neo4jStorage
 from .vdb_hnswlib import HNSWVectorStorage
 from .vdb_nanovectordb import NanoVectorDBStorage
 from .kv_json import JsonKVStorage
+from .kv_log import LogKVStorage
+from .kv_sqlite import SQLiteKVStorage
+from .kv_write_behind import WriteBehindKVStorage
+from .tdb_interval import IntervalTemporalStorage
+from .tdb_sqlite import SQLiteTemporalStorage
+from .tdb_postgres import PostgresTemporalStorage
@@ -0,0 +1,457 @@
+import json
+import os
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Union
+
+import networkx as nx
+import numpy as np
+
+from .._utils import logger
+from ..base import (
+    BaseGraphStorage,
+    SingleCommunitySchema,
+)
+from ..prompt import GRAPH_FIELD_SEP
+from .gdb_networkx import NetworkXStorage
+from .graph_snapshot import (
+    MISSING,
+    GraphSnapshot,
+    load_community_schema,
+    read_graph_snapshot,
+    write_community_schema,
+    write_graph_snapshot,
+)
+
+
+def _is_float(value) -> bool:
+    return isinstance(value, (float, np.floating)) and not np.isnan(value)
+
+
+def _pack_column(column: Union[list, np.ndarray]) -> Union[list, np.ndarray]:
+    """A column of floats as a float64 array with NaN for missing rows, any
+    other column as a list"""
+    if isinstance(column, np.ndarray):
+        return column
+    values = [v for v in column if v is not MISSING]
+    if not values or not all(_is_float(v) for v in values):
+        return column
+    return np.array([np.nan if v is MISSING else v for v in column], dtype=np.float64)
+
+
+def _unpack_column(column: Union[list, np.ndarray]) -> list:
+    if not isinstance(column, np.ndarray):
+        return column
+    return [MISSING if v != v else v for v in column.tolist()]
+
+
+def _resize_column(
+    column: Union[list, np.ndarray], num_rows: int
+) -> Union[list, np.ndarray]:
+    if isinstance(column, np.ndarray):
+        return np.concatenate([column, np.full(num_rows - len(column), np.nan)])
+    column.extend([MISSING] * (num_rows - len(column)))
+    return column
+
+
+def _set_cell(columns: dict, key: str, row: int, value, num_rows: int):
+    column = columns.get(key)
+    if column is None:
+        column = columns[key] = [MISSING] * num_rows
+    elif isinstance(column, np.ndarray):
+        if _is_float(value):
+            column[row] = value
+            return
+        column = columns[key] = _unpack_column(column)
+    column[row] = value
+
+
+@dataclass
+class CSRGraphStorage(BaseGraphStorage):
+    """Undirected graph in NumPy CSR arrays with columnar attributes.
+
+    Neighbors of node ``i`` are ``indices[indptr[i]:indptr[i + 1]]`` sorted by
+    node id, and ``slot_edge`` maps each of those slots to its edge row, so
+    degrees are O(1) and an edge lookup is a binary search in one row. Node
+    and edge attributes are kept as one column per attribute key: a float64
+    array with NaN for missing rows when all its values are floats (like
+    ``weight``), a list otherwise.
+
+    Upserts go to a delta buffer that reads already see; it is merged into the
+    arrays on ``index_done_callback``. Persists to the same
+    ``graph_{namespace}.snapshot`` file as ``NetworkXStorage``.
+    """
+
+    def __post_init__(self):
+        self._snapshot_file = os.path.join(
+            self.global_config["working_dir"], f"graph_{self.namespace}.snapshot"
+        )
+        self._names: list[str] = []
+        self._name_to_id: dict[str, int] = {}
+        self._node_columns: dict[str, Union[list, np.ndarray]] = {}
+        self._edge_src = np.zeros(0, dtype=np.int32)
+        self._edge_tgt = np.zeros(0, dtype=np.int32)
+        self._edge_columns: dict[str, Union[list, np.ndarray]] = {}
+        if os.path.exists(self._snapshot_file):
+            self._load_snapshot(read_graph_snapshot(self._snapshot_file))
+            logger.info(
+                f"Loaded graph from {self._snapshot_file} with {len(self._names)} nodes, {len(self._edge_src)} edges"
+            )
+        self._build_csr()
+        self._reset_delta()
+        self._community_schema_file = os.path.join(
+            self.global_config["working_dir"],
+            f"graph_{self.namespace}.community_schema.json",
+        )
+        # None whenever the graph changed since the schema was built
+        self._community_schema = load_community_schema(
+            self._community_schema_file, self._snapshot_file
+        )
+        # the schema in the schema file, if it's the one of the snapshot file
+        self._saved_community_schema = self._community_schema
+        # nodes with new edges since the last clustering
+        self._changed_nodes: set[str] = set()
+        self._clustering_algorithms = {
+            "leiden": self._leiden_clustering,
+        }
+        self._node_embed_algorithms = {
+            "node2vec": self._node2vec_embed,
+        }
+
+    def _load_snapshot(self, snapshot: GraphSnapshot):
+        if snapshot.directed:
+            raise ValueError("CSRGraphStorage only supports undirected graphs")
+        self._names = list(snapshot.nodes)
+        self._name_to_id = {name: i for i, name in enumerate(self._names)}
+        self._node_columns = {
+            k: _pack_column(c) for k, c in snapshot.node_columns.items()
+        }
+        self._edge_src = np.array(
+            [self._name_to_id[s] for s in snapshot.sources], dtype=np.int32
+        )
+        self._edge_tgt = np.array(
+            [self._name_to_id[t] for t in snapshot.targets], dtype=np.int32
+        )
+        self._edge_columns = {
+            k: _pack_column(c) for k, c in snapshot.edge_columns.items()
+        }
+
+    def _build_csr(self):
+        num_nodes = len(self._names)
+        not_loop = self._edge_src != self._edge_tgt
+        edge_ids = np.arange(len(self._edge_src), dtype=np.int32)
+        rows = np.concatenate([self._edge_src, self._edge_tgt[not_loop]])
+        cols = np.concatenate([self._edge_tgt, self._edge_src[not_loop]])
+        slot_edge = np.concatenate([edge_ids, edge_ids[not_loop]])
+        order = np.lexsort((cols, rows))
+        self._indices = cols[order]
+        self._slot_edge = slot_edge[order]
+        counts = np.bincount(rows, minlength=num_nodes)
+        self._indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        # a self-loop adds 2 to the degree, same as networkx
+        self._degree = counts + np.bincount(
+            self._edge_src[~not_loop], minlength=num_nodes
+        )
+
+    def _reset_delta(self):
+        self._delta_nodes: dict[str, dict] = {}
+        self._delta_edges: dict[tuple[str, str], dict] = {}
+        self._delta_adj: dict[str, list[str]] = defaultdict(list)
+        self._delta_degree: Counter = Counter()
+
+    def _base_edge(self, src_id: str, tgt_id: str) -> Union[int, None]:
+        src, tgt = self._name_to_id.get(src_id), self._name_to_id.get(tgt_id)
+        # ids past the CSR arrays are nodes added by a merge in progress
+        if src is None or tgt is None or src >= len(self._degree):
+            return None
+        start, end = self._indptr[src], self._indptr[src + 1]
+        pos = start + np.searchsorted(self._indices[start:end], tgt)
+        if pos < end and self._indices[pos] == tgt:
+            return int(self._slot_edge[pos])
+        return None
+
+    @staticmethod
+    def _edge_key(src_id: str, tgt_id: str) -> tuple[str, str]:
+        return (src_id, tgt_id) if src_id <= tgt_id else (tgt_id, src_id)
+
+    @staticmethod
+    def _row(columns: dict[str, Union[list, np.ndarray]], row: int) -> dict:
+        row_data = {}
+        for k, c in columns.items():
+            value = c[row]
+            if isinstance(c, np.ndarray):
+                if value != value:
+                    continue
+                value = float(value)
+            elif value is MISSING:
+                continue
+            row_data[k] = value
+        return row_data
+
+    async def index_done_callback(self):
+        if (
+            self._community_schema is not None
+            and self._community_schema is self._saved_community_schema
+        ):
+            # every change drops the schema, so nothing changed since the last write
+            return
+        self._merge_delta()
+        logger.info(
+            f"Writing graph snapshot with {len(self._names)} nodes, {len(self._edge_src)} edges"
+        )
+        write_graph_snapshot(
+            GraphSnapshot(
+                directed=False,
+                nodes=self._names,
+                node_columns={
+                    k: _unpack_column(c) for k, c in self._node_columns.items()
+                },
+                sources=[self._names[i] for i in self._edge_src.tolist()],
+                targets=[self._names[i] for i in self._edge_tgt.tolist()],
+                edge_columns={
+                    k: _unpack_column(c) for k, c in self._edge_columns.items()
+                },
+            ),
+            self._snapshot_file,
+        )
+        # the schema isn't built here, only saved once a query or the reports built it
+        if self._community_schema is not None:
+            write_community_schema(
+                self._community_schema, self._community_schema_file, self._snapshot_file
+            )
+        self._saved_community_schema = self._community_schema
+
+    def _merge_delta(self):
+        if not self._delta_nodes and not self._delta_edges:
+            return
+        for name in self._delta_nodes:
+            if name not in self._name_to_id:
+                self._name_to_id[name] = len(self._names)
+                self._names.append(name)
+        num_nodes = len(self._names)
+        self._node_columns = {
+            k: _resize_column(c, num_nodes) for k, c in self._node_columns.items()
+        }
+        for name, node_data in self._delta_nodes.items():
+            for k, v in node_data.items():
+                _set_cell(self._node_columns, k, self._name_to_id[name], v, num_nodes)
+
+        new_src, new_tgt = [], []
+        num_edges = len(self._edge_src)
+        edge_rows = []
+        for src_id, tgt_id in self._delta_edges:
+            edge = self._base_edge(src_id, tgt_id)
+            if edge is None:
+                edge = num_edges + len(new_src)
+                new_src.append(self._name_to_id[src_id])
+                new_tgt.append(self._name_to_id[tgt_id])
+            edge_rows.append(edge)
+        num_edges += len(new_src)
+        self._edge_columns = {
+            k: _resize_column(c, num_edges) for k, c in self._edge_columns.items()
+        }
+        for edge, edge_data in zip(edge_rows, self._delta_edges.values()):
+            for k, v in edge_data.items():
+                _set_cell(self._edge_columns, k, edge, v, num_edges)
+        self._node_columns = {k: _pack_column(c) for k, c in self._node_columns.items()}
+        self._edge_columns = {k: _pack_column(c) for k, c in self._edge_columns.items()}
+        self._edge_src = np.concatenate(
+            [self._edge_src, np.array(new_src, dtype=np.int32)]
+        )
+        self._edge_tgt = np.concatenate(
+            [self._edge_tgt, np.array(new_tgt, dtype=np.int32)]
+        )
+        self._build_csr()
+        self._reset_delta()
+
+    async def has_node(self, node_id: str) -> bool:
+        return node_id in self._name_to_id or node_id in self._delta_nodes
+
+    async def has_edge(self, source_node_id: str, target_node_id: str) -> bool:
+        return (
+            self._edge_key(source_node_id, target_node_id) in self._delta_edges
+            or self._base_edge(source_node_id, target_node_id) is not None
+        )
+
+    async def get_node(self, node_id: str) -> Union[dict, None]:
+        node = self._name_to_id.get(node_id)
+        if node is None:
+            return dict(self._delta_nodes[node_id]) if node_id in self._delta_nodes else None
+        return {**self._row(self._node_columns, node), **self._delta_nodes.get(node_id, {})}
+
+    async def node_degree(self, node_id: str) -> int:
+        node = self._name_to_id.get(node_id)
+        base_degree = int(self._degree[node]) if node is not None else 0
+        return base_degree + self._delta_degree.get(node_id, 0)
+
+    async def edge_degree(self, src_id: str, tgt_id: str) -> int:
+        return await self.node_degree(src_id) + await self.node_degree(tgt_id)
+
+    async def get_edge(
+        self, source_node_id: str, target_node_id: str
+    ) -> Union[dict, None]:
+        edge = self._base_edge(source_node_id, target_node_id)
+        delta = self._delta_edges.get(self._edge_key(source_node_id, target_node_id))
+        if edge is None:
+            return dict(delta) if delta is not None else None
+        return {**self._row(self._edge_columns, edge), **(delta or {})}
+
+    async def get_node_edges(self, source_node_id: str):
+        if not await self.has_node(source_node_id):
+            return None
+        node = self._name_to_id.get(source_node_id)
+        neighbors = []
+        if node is not None:
+            start, end = self._indptr[node], self._indptr[node + 1]
+            neighbors = [self._names[i] for i in self._indices[start:end].tolist()]
+        neighbors += self._delta_adj.get(source_node_id, [])
+        return [(source_node_id, n) for n in neighbors]
+
+    async def node_degrees(self, node_ids: list[str]) -> list[int]:
+        ids = np.array([self._name_to_id.get(n, -1) for n in node_ids], dtype=np.int64)
+        degrees = np.where(ids >= 0, self._degree[ids] if len(self._degree) else 0, 0)
+        return [
+            int(d) + self._delta_degree.get(n, 0) for n, d in zip(node_ids, degrees)
+        ]
+
+    async def edge_degrees(self, edge_pairs: list[tuple[str, str]]) -> list[int]:
+        degrees = await self.node_degrees([n for pair in edge_pairs for n in pair])
+        return [s + t for s, t in zip(degrees[0::2], degrees[1::2])]
+
+    async def get_nodes(self, node_ids: list[str]) -> list[Union[dict, None]]:
+        return [await self.get_node(n) for n in node_ids]
+
+    async def get_edges(
+        self, edge_pairs: list[tuple[str, str]]
+    ) -> list[Union[dict, None]]:
+        return [await self.get_edge(s, t) for s, t in edge_pairs]
+
+    async def get_nodes_edges(
+        self, node_ids: list[str]
+    ) -> list[Union[list[tuple[str, str]], None]]:
+        return [await self.get_node_edges(n) for n in node_ids]
+
+    async def upsert_node(self, node_id: str, node_data: dict[str, str]):
+        self._delta_nodes.setdefault(node_id, {}).update(node_data)
+        self._community_schema = None
+
+    async def upsert_edge(
+        self, source_node_id: str, target_node_id: str, edge_data: dict[str, str]
+    ):
+        for node_id in (source_node_id, target_node_id):
+            if not await self.has_node(node_id):
+                self._delta_nodes[node_id] = {}
+        key = self._edge_key(source_node_id, target_node_id)
+        if key not in self._delta_edges and self._base_edge(*key) is None:
+            self._delta_degree[source_node_id] += 1
+            self._delta_degree[target_node_id] += 1
+            self._delta_adj[source_node_id].append(target_node_id)
+            if source_node_id != target_node_id:
+                self._delta_adj[target_node_id].append(source_node_id)
+        self._delta_edges.setdefault(key, {}).update(edge_data)
+        self._changed_nodes.update(key)
+        self._community_schema = None
+
+    def to_nx_graph(self) -> nx.Graph:
+        self._merge_delta()
+        graph = nx.Graph()
+        graph.add_nodes_from(
+            (name, self._row(self._node_columns, i)) for i, name in enumerate(self._names)
+        )
+        graph.add_edges_from(
+            (self._names[s], self._names[t], self._row(self._edge_columns, i))
+            for i, (s, t) in enumerate(
+                zip(self._edge_src.tolist(), self._edge_tgt.tolist())
+            )
+        )
+        return graph
+
+    async def clustering(self, algorithm: str):
+        if algorithm not in self._clustering_algorithms:
+            raise ValueError(f"Clustering algorithm {algorithm} not supported")
+        await self._clustering_algorithms[algorithm]()
+        self._community_schema = None
+
+    async def community_schema(self) -> dict[str, SingleCommunitySchema]:
+        if self._community_schema is None:
+            self._community_schema = self._build_community_schema()
+        return dict(self._community_schema)
+
+    def _build_community_schema(self) -> dict[str, SingleCommunitySchema]:
+        self._merge_delta()
+        results = defaultdict(
+            lambda: dict(
+                level=None,
+                title=None,
+                edges=set(),
+                nodes=set(),
+                chunk_ids=set(),
+                occurrence=0.0,
+                sub_communities=[],
+            )
+        )
+        max_num_ids = 0
+        levels = defaultdict(set)
+        clusters_column = self._node_columns.get("clusters", [])
+        source_id_column = self._node_columns.get("source_id", [])
+        for node, clusters in enumerate(clusters_column):
+            if clusters is MISSING:
+                continue
+            node_id = self._names[node]
+            source_id = source_id_column[node] if source_id_column else MISSING
+            start, end = self._indptr[node], self._indptr[node + 1]
+            this_node_edges = [
+                tuple(sorted((node_id, self._names[n])))
+                for n in self._indices[start:end].tolist()
+            ]
+            for cluster in json.loads(clusters):
+                level = cluster["level"]
+                cluster_key = str(cluster["cluster"])
+                levels[level].add(cluster_key)
+                results[cluster_key]["level"] = level
+                results[cluster_key]["title"] = f"Cluster {cluster_key}"
+                results[cluster_key]["nodes"].add(node_id)
+                results[cluster_key]["edges"].update(this_node_edges)
+                if source_id is not MISSING:
+                    results[cluster_key]["chunk_ids"].update(
+                        source_id.split(GRAPH_FIELD_SEP)
+                    )
+                max_num_ids = max(max_num_ids, len(results[cluster_key]["chunk_ids"]))
+
+        NetworkXStorage.link_sub_communities(results, levels)
+
+        for k, v in results.items():
+            v["edges"] = [list(e) for e in v["edges"]]
+            v["nodes"] = list(v["nodes"])
+            v["chunk_ids"] = list(v["chunk_ids"])
+            v["occurrence"] = len(v["chunk_ids"]) / max(max_num_ids, 1)
+        return dict(results)
+
+    async def _leiden_clustering(self):
+        node_communities, reclustered = NetworkXStorage.hierarchical_leiden_communities(
+            self.to_nx_graph(), self._changed_nodes, self.global_config
+        )
+        clusters_column = self._node_columns.get("clusters", [])
+        for node, name in enumerate(self._names[: len(clusters_column)]):
+            if reclustered is None or name in reclustered:
+                clusters_column[node] = MISSING
+        for node_id, clusters in node_communities.items():
+            await self.upsert_node(node_id, {"clusters": json.dumps(clusters)})
+        self._changed_nodes.clear()
+
+    async def embed_nodes(self, algorithm: str) -> tuple[np.ndarray, list[str]]:
+        if algorithm not in self._node_embed_algorithms:
+            raise ValueError(f"Node embedding algorithm {algorithm} not supported")
+        return await self._node_embed_algorithms[algorithm]()
+
+    async def _node2vec_embed(self):
+        from graspologic import embed
+
+        graph = self.to_nx_graph()
+        embeddings, nodes = embed.node2vec_embed(
+            graph,
+            **self.global_config["node2vec_params"],
+        )
+
+        nodes_ids = [graph.nodes[node_id]["id"] for node_id in nodes]
+        return embeddings, nodes_ids
@@ -7,6 +7,7 @@ from typing import Union
 from ..base import BaseGraphStorage, SingleCommunitySchema
 from .._utils import logger
 from ..prompt import GRAPH_FIELD_SEP
+from .gdb_networkx import NetworkXStorage
 
 neo4j_lock = asyncio.Lock()
 
@@ -17,9 +18,19 @@ def make_path_idable(path):
 
 @dataclass
 class Neo4jStorage(BaseGraphStorage):
+    """Graph storage on a Neo4j server.
+
+    ``upsert_node``/``upsert_edge`` are buffered and written as ``UNWIND``
+    batches of ``neo4j_upsert_batch_size`` rows, once a buffer is full, before
+    any read and on ``index_done_callback``. The driver, and with it the
+    connection pool, lives as long as the storage; call ``close`` to release it.
+    """
+
     def __post_init__(self):
-        self.neo4j_url = self.global_config["addon_params"].get("neo4j_url", None)
-        self.neo4j_auth = self.global_config["addon_params"].get("neo4j_auth", None)
+        addon_params = self.global_config["addon_params"]
+        self.neo4j_url = addon_params.get("neo4j_url", None)
+        self.neo4j_auth = addon_params.get("neo4j_auth", None)
+        self.upsert_batch_size = addon_params.get("neo4j_upsert_batch_size", 1000)
         self.namespace = (
             f"{make_path_idable(self.global_config['working_dir'])}__{self.namespace}"
         )
@@ -27,8 +38,17 @@ class Neo4jStorage(BaseGraphStorage):
         if self.neo4j_url is None or self.neo4j_auth is None:
             raise ValueError("Missing neo4j_url or neo4j_auth in addon_params")
         self.async_driver = AsyncGraphDatabase.driver(
-            self.neo4j_url, auth=self.neo4j_auth
+            self.neo4j_url,
+            auth=self.neo4j_auth,
+            max_connection_pool_size=addon_params.get(
+                "neo4j_max_connection_pool_size", 100
+            ),
         )
+        self._pending_nodes: dict[str, dict] = {}
+        self._pending_edges: dict[tuple[str, str], dict] = {}
+        self._flush_lock = asyncio.Lock()
+        # kept until this instance writes to the graph or re-clusters it
+        self._community_schema: Union[dict, None] = None
 
     # async def create_database(self):
     #     async with self.async_driver.session() as session:
@@ -67,6 +87,7 @@ class Neo4jStorage(BaseGraphStorage):
         await self._init_workspace()
 
     async def has_node(self, node_id: str) -> bool:
+        await self._flush()
         async with self.async_driver.session() as session:
             result = await session.run(
                 f"MATCH (n:`{self.namespace}`) WHERE n.id = $node_id RETURN COUNT(n) > 0 AS exists",
@@ -76,6 +97,7 @@ class Neo4jStorage(BaseGraphStorage):
             return record["exists"] if record else False
 
     async def has_edge(self, source_node_id: str, target_node_id: str) -> bool:
+        await self._flush()
         async with self.async_driver.session() as session:
             result = await session.run(
                 f"MATCH (s:`{self.namespace}`)-[r]->(t:`{self.namespace}`) "
@@ -88,6 +110,7 @@ class Neo4jStorage(BaseGraphStorage):
             return record["exists"] if record else False
 
     async def node_degree(self, node_id: str) -> int:
+        await self._flush()
         async with self.async_driver.session() as session:
             result = await session.run(
                 f"MATCH (n:`{self.namespace}`) WHERE n.id = $node_id "
@@ -98,6 +121,7 @@ class Neo4jStorage(BaseGraphStorage):
             return record["degree"] if record else 0
 
     async def edge_degree(self, src_id: str, tgt_id: str) -> int:
+        await self._flush()
         async with self.async_driver.session() as session:
             result = await session.run(
                 f"MATCH (s:`{self.namespace}`), (t:`{self.namespace}`) "
@@ -110,6 +134,7 @@ class Neo4jStorage(BaseGraphStorage):
             return record["degree"] if record else 0
 
     async def get_node(self, node_id: str) -> Union[dict, None]:
+        await self._flush()
         async with self.async_driver.session() as session:
             result = await session.run(
                 f"MATCH (n:`{self.namespace}`) WHERE n.id = $node_id RETURN properties(n) AS node_data",
@@ -119,22 +144,12 @@ class Neo4jStorage(BaseGraphStorage):
             raw_node_data = record["node_data"] if record else None
         if raw_node_data is None:
             return None
-        raw_node_data["clusters"] = json.dumps(
-            [
-                {
-                    "level": index,
-                    "cluster": cluster_id,
-                }
-                for index, cluster_id in enumerate(
-                    raw_node_data.get("communityIds", [])
-                )
-            ]
-        )
-        return raw_node_data
+        return self._clusters_from_community_ids(raw_node_data)
 
     async def get_edge(
         self, source_node_id: str, target_node_id: str
     ) -> Union[dict, None]:
+        await self._flush()
         async with self.async_driver.session() as session:
             result = await session.run(
                 f"MATCH (s:`{self.namespace}`)-[r]->(t:`{self.namespace}`) "
@@ -149,6 +164,7 @@ class Neo4jStorage(BaseGraphStorage):
     async def get_node_edges(
         self, source_node_id: str
     ) -> Union[list[tuple[str, str]], None]:
+        await self._flush()
         async with self.async_driver.session() as session:
             result = await session.run(
                 f"MATCH (s:`{self.namespace}`)-[r]->(t:`{self.namespace}`) WHERE s.id = $source_id "
@@ -160,30 +176,161 @@ class Neo4jStorage(BaseGraphStorage):
                 edges.append((record["source"], record["target"]))
             return edges
 
-    async def upsert_node(self, node_id: str, node_data: dict[str, str]):
-        node_type = node_data.get("entity_type", "UNKNOWN").strip('"')
+    @staticmethod
+    def _clusters_from_community_ids(node_data: dict) -> dict:
+        node_data["clusters"] = json.dumps(
+            [
+                {
+                    "level": index,
+                    "cluster": cluster_id,
+                }
+                for index, cluster_id in enumerate(node_data.get("communityIds", []))
+            ]
+        )
+        return node_data
+
+    async def get_nodes(self, node_ids: list[str]) -> list[Union[dict, None]]:
+        await self._flush()
         async with self.async_driver.session() as session:
-            await session.run(
-                f"MERGE (n:`{self.namespace}`:`{node_type}` {{id: $node_id}}) "
-                "SET n += $node_data",
-                node_id=node_id,
-                node_data=node_data,
+            result = await session.run(
+                "UNWIND range(0, size($node_ids) - 1) AS i "
+                f"OPTIONAL MATCH (n:`{self.namespace}`) WHERE n.id = $node_ids[i] "
+                "RETURN i, properties(n) AS node_data",
+                node_ids=node_ids,
+            )
+            nodes = [None] * len(node_ids)
+            async for record in result:
+                if record["node_data"] is not None:
+                    nodes[record["i"]] = self._clusters_from_community_ids(
+                        record["node_data"]
+                    )
+            return nodes
+
+    async def node_degrees(self, node_ids: list[str]) -> list[int]:
+        await self._flush()
+        async with self.async_driver.session() as session:
+            result = await session.run(
+                "UNWIND range(0, size($node_ids) - 1) AS i "
+                f"OPTIONAL MATCH (n:`{self.namespace}`) WHERE n.id = $node_ids[i] "
+                f"RETURN i, COUNT {{(n)-[]-(:`{self.namespace}`)}} AS degree",
+                node_ids=node_ids,
+            )
+            degrees = [0] * len(node_ids)
+            async for record in result:
+                degrees[record["i"]] = record["degree"] or 0
+            return degrees
+
+    async def get_edges(
+        self, edge_pairs: list[tuple[str, str]]
+    ) -> list[Union[dict, None]]:
+        await self._flush()
+        async with self.async_driver.session() as session:
+            result = await session.run(
+                "UNWIND range(0, size($pairs) - 1) AS i "
+                f"OPTIONAL MATCH (s:`{self.namespace}`)-[r]->(t:`{self.namespace}`) "
+                "WHERE s.id = $pairs[i][0] AND t.id = $pairs[i][1] "
+                "RETURN i, properties(r) AS edge_data",
+                pairs=[list(pair) for pair in edge_pairs],
             )
+            edges = [None] * len(edge_pairs)
+            async for record in result:
+                if record["edge_data"] is not None:
+                    edges[record["i"]] = record["edge_data"]
+            return edges
+
+    async def edge_degrees(self, edge_pairs: list[tuple[str, str]]) -> list[int]:
+        degrees = await self.node_degrees([n for pair in edge_pairs for n in pair])
+        return [s + t for s, t in zip(degrees[0::2], degrees[1::2])]
+
+    async def get_nodes_edges(
+        self, node_ids: list[str]
+    ) -> list[Union[list[tuple[str, str]], None]]:
+        await self._flush()
+        async with self.async_driver.session() as session:
+            result = await session.run(
+                "UNWIND range(0, size($node_ids) - 1) AS i "
+                f"OPTIONAL MATCH (s:`{self.namespace}`)-[r]->(t:`{self.namespace}`) "
+                "WHERE s.id = $node_ids[i] "
+                "RETURN i, collect(t.id) AS targets",
+                node_ids=node_ids,
+            )
+            edges = [[] for _ in node_ids]
+            async for record in result:
+                edges[record["i"]] = [
+                    (node_ids[record["i"]], target) for target in record["targets"]
+                ]
+            return edges
+
+    async def upsert_node(self, node_id: str, node_data: dict[str, str]):
+        self._pending_nodes.setdefault(node_id, {}).update(node_data)
+        self._community_schema = None
+        if len(self._pending_nodes) >= self.upsert_batch_size:
+            await self._flush()
 
     async def upsert_edge(
         self, source_node_id: str, target_node_id: str, edge_data: dict[str, str]
     ):
         edge_data.setdefault("weight", 0.0)
-        async with self.async_driver.session() as session:
-            await session.run(
-                f"MATCH (s:`{self.namespace}`), (t:`{self.namespace}`) "
-                "WHERE s.id = $source_id AND t.id = $target_id "
-                "MERGE (s)-[r:RELATED]->(t) "  # Added relationship type 'RELATED'
-                "SET r += $edge_data",
-                source_id=source_node_id,
-                target_id=target_node_id,
-                edge_data=edge_data,
-            )
+        self._pending_edges.setdefault((source_node_id, target_node_id), {}).update(
+            edge_data
+        )
+        self._community_schema = None
+        if len(self._pending_edges) >= self.upsert_batch_size:
+            await self._flush()
+
+    async def _flush(self):
+        async with self._flush_lock:
+            if not self._pending_nodes and not self._pending_edges:
+                return
+            nodes, self._pending_nodes = self._pending_nodes, {}
+            edges, self._pending_edges = self._pending_edges, {}
+            # labels can't be parameters, so nodes are merged per entity type
+            nodes_by_type = defaultdict(list)
+            for node_id, node_data in nodes.items():
+                node_type = node_data.get("entity_type", "UNKNOWN").strip('"')
+                nodes_by_type[node_type].append({"id": node_id, "data": node_data})
+            edge_rows = [
+                {"source": s, "target": t, "data": edge_data}
+                for (s, t), edge_data in edges.items()
+            ]
+            try:
+                async with self.async_driver.session() as session:
+                    for node_type, rows in nodes_by_type.items():
+                        for batch in self._batches(rows):
+                            await session.run(
+                                "UNWIND $rows AS row "
+                                f"MERGE (n:`{self.namespace}`:`{node_type}` {{id: row.id}}) "
+                                "SET n += row.data",
+                                rows=batch,
+                            )
+                    # after the nodes, so the MATCH finds endpoints from this flush
+                    for batch in self._batches(edge_rows):
+                        await session.run(
+                            "UNWIND $rows AS row "
+                            f"MATCH (s:`{self.namespace}`), (t:`{self.namespace}`) "
+                            "WHERE s.id = row.source AND t.id = row.target "
+                            "MERGE (s)-[r:RELATED]->(t) "
+                            "SET r += row.data",
+                            rows=batch,
+                        )
+            except BaseException:
+                # put the rows back for the next flush, behind newer upserts
+                for node_id, node_data in nodes.items():
+                    self._pending_nodes[node_id] = {
+                        **node_data,
+                        **self._pending_nodes.get(node_id, {}),
+                    }
+                for edge, edge_data in edges.items():
+                    self._pending_edges[edge] = {
+                        **edge_data,
+                        **self._pending_edges.get(edge, {}),
+                    }
+                raise
+            logger.debug(f"Flushed {len(nodes)} nodes and {len(edges)} edges to Neo4j")
+
+    def _batches(self, rows: list[dict]):
+        for i in range(0, len(rows), self.upsert_batch_size):
+            yield rows[i : i + self.upsert_batch_size]
 
     async def clustering(self, algorithm: str):
         if algorithm != "leiden":
@@ -191,8 +338,10 @@ class Neo4jStorage(BaseGraphStorage):
                 f"Clustering algorithm {algorithm} not supported in Neo4j implementation"
             )
 
+        self._community_schema = None
         random_seed = self.global_config["graph_cluster_seed"]
         max_level = self.global_config["max_graph_cluster_size"]
+        await self._flush()
         async with self.async_driver.session() as session:
             try:
                 # Project the graph with undirected relationships
@@ -241,6 +390,11 @@ class Neo4jStorage(BaseGraphStorage):
                 await session.run(f"CALL gds.graph.drop('graph_{self.namespace}')")
 
     async def community_schema(self) -> dict[str, SingleCommunitySchema]:
+        if self._community_schema is None:
+            self._community_schema = await self._build_community_schema()
+        return dict(self._community_schema)
+
+    async def _build_community_schema(self) -> dict[str, SingleCommunitySchema]:
         results = defaultdict(
             lambda: dict(
                 level=None,
@@ -253,6 +407,7 @@ class Neo4jStorage(BaseGraphStorage):
             )
         )
 
+        await self._flush()
         async with self.async_driver.session() as session:
             # Fetch community data
             result = await session.run(
@@ -268,6 +423,7 @@ class Neo4jStorage(BaseGraphStorage):
             # records = await result.fetch()
 
             max_num_ids = 0
+            levels = defaultdict(set)
             async for record in result:
                 for index, c_id in enumerate(record["cluster_key"]):
                     node_id = str(record["node_id"])
@@ -276,6 +432,7 @@ class Neo4jStorage(BaseGraphStorage):
                     cluster_key = str(c_id)
                     connected_nodes = record["connected_nodes"]
 
+                    levels[level].add(cluster_key)
                     results[cluster_key]["level"] = level
                     results[cluster_key]["title"] = f"Cluster {cluster_key}"
                     results[cluster_key]["nodes"].add(node_id)
@@ -292,6 +449,8 @@ class Neo4jStorage(BaseGraphStorage):
                         max_num_ids, len(results[cluster_key]["chunk_ids"])
                     )
 
+            NetworkXStorage.link_sub_communities(results, levels)
+
             # Process results
             for k, v in results.items():
                 v["edges"] = [list(e) for e in v["edges"]]
@@ -299,21 +458,18 @@ class Neo4jStorage(BaseGraphStorage):
                 v["chunk_ids"] = list(v["chunk_ids"])
                 v["occurrence"] = len(v["chunk_ids"]) / max_num_ids
 
-            # Compute sub-communities (this is a simplified approach)
-            for cluster in results.values():
-                cluster["sub_communities"] = [
-                    sub_key
-                    for sub_key, sub_cluster in results.items()
-                    if sub_cluster["level"] > cluster["level"]
-                    and set(sub_cluster["nodes"]).issubset(set(cluster["nodes"]))
-                ]
-
         return dict(results)
 
     async def index_done_callback(self):
+        await self._flush()
+
+    async def close(self):
+        await self._flush()
         await self.async_driver.close()
 
     async def _debug_delete_all_node_edges(self):
+        self._community_schema = None
+        await self._flush()
         async with self.async_driver.session() as session:
             try:
                 # Delete all relationships in the namespace
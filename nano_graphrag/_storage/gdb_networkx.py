@@ -13,6 +13,18 @@ from ..base import (
     SingleCommunitySchema,
 )
 from ..prompt import GRAPH_FIELD_SEP
+from .graph_snapshot import (
+    GraphSnapshot,
+    columns_to_rows,
+    load_community_schema,
+    read_graph_snapshot,
+    rows_to_columns,
+    write_community_schema,
+    write_graph_snapshot,
+)
+
+# above this share of re-clustered nodes, clustering runs on the whole graph
+INCREMENTAL_CLUSTERING_MAX_FRACTION = 0.5
 
 
 @dataclass
@@ -30,6 +42,44 @@ class NetworkXStorage(BaseGraphStorage):
         )
         nx.write_graphml(graph, file_name)
 
+    @staticmethod
+    def load_nx_snapshot(file_name) -> nx.Graph:
+        if not os.path.exists(file_name):
+            return None
+        snapshot = read_graph_snapshot(file_name)
+        graph = nx.DiGraph() if snapshot.directed else nx.Graph()
+        graph.add_nodes_from(
+            zip(
+                snapshot.nodes,
+                columns_to_rows(snapshot.node_columns, len(snapshot.nodes)),
+            )
+        )
+        graph.add_edges_from(
+            zip(
+                snapshot.sources,
+                snapshot.targets,
+                columns_to_rows(snapshot.edge_columns, len(snapshot.sources)),
+            )
+        )
+        return graph
+
+    @staticmethod
+    def write_nx_snapshot(graph: nx.Graph, file_name):
+        logger.info(
+            f"Writing graph snapshot with {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges"
+        )
+        nodes = list(graph.nodes(data=True))
+        edges = list(graph.edges(data=True))
+        snapshot = GraphSnapshot(
+            directed=graph.is_directed(),
+            nodes=[n for n, _ in nodes],
+            node_columns=rows_to_columns([d for _, d in nodes]),
+            sources=[s for s, _, _ in edges],
+            targets=[t for _, t, _ in edges],
+            edge_columns=rows_to_columns([d for _, _, d in edges]),
+        )
+        write_graph_snapshot(snapshot, file_name)
+
     @staticmethod
     def stable_largest_connected_component(graph: nx.Graph) -> nx.Graph:
         """Refer to https://github.com/microsoft/graphrag/index/graph/utils/stable_lcc.py
@@ -76,16 +126,146 @@ class NetworkXStorage(BaseGraphStorage):
         fixed_graph.add_edges_from(edges)
         return fixed_graph
 
+    @staticmethod
+    def link_sub_communities(results: dict[str, dict], levels: dict[int, set[str]]):
+        """Fill ``sub_communities``: the communities of the next level whose nodes
+        all belong to the community."""
+        ordered_levels = sorted(levels.keys())
+        for curr_level, next_level in zip(ordered_levels, ordered_levels[1:]):
+            node_to_comm = {
+                node_id: comm
+                for comm in levels[curr_level]
+                for node_id in results[comm]["nodes"]
+            }
+            for comm in levels[next_level]:
+                parents = {node_to_comm.get(n) for n in results[comm]["nodes"]}
+                if len(parents) == 1 and None not in parents:
+                    results[parents.pop()]["sub_communities"].append(comm)
+
+    @staticmethod
+    def nodes_to_recluster(
+        graph: nx.Graph, changed_nodes: set[str]
+    ) -> Union[set[str], None]:
+        """Nodes whose communities have to be recomputed after ``changed_nodes``
+        got new edges, or ``None`` when the whole graph should be re-clustered.
+
+        Level-0 communities are clustered independently of each other, so it's
+        enough to re-run Leiden on every level-0 community touched by a change,
+        plus the unclustered nodes and the communities they attach to.
+        """
+        top_cluster, members = {}, defaultdict(set)
+        for node_id, node_data in graph.nodes(data=True):
+            if "clusters" not in node_data:
+                continue
+            clusters = json.loads(node_data["clusters"])
+            if not clusters:
+                continue
+            top = min(clusters, key=lambda c: c["level"])["cluster"]
+            top_cluster[node_id] = top
+            members[top].add(node_id)
+        if not top_cluster:
+            return None
+
+        def _community_of(node_id):
+            if node_id in top_cluster:
+                return members[top_cluster[node_id]]
+            return {node_id}
+
+        affected = set()
+        for node_id in changed_nodes:
+            if node_id in graph:
+                affected |= _community_of(node_id)
+        for node_id in graph.nodes:
+            if node_id not in top_cluster:
+                affected.add(node_id)
+                for neighbor in graph.neighbors(node_id):
+                    affected |= _community_of(neighbor)
+        if len(affected) > graph.number_of_nodes() * INCREMENTAL_CLUSTERING_MAX_FRACTION:
+            return None
+        return affected
+
+    @staticmethod
+    def hierarchical_leiden_communities(
+        graph: nx.Graph, changed_nodes: set[str], global_config: dict
+    ) -> tuple[dict[str, list[dict]], Union[set[str], None]]:
+        """Cluster the largest connected component of ``graph``, incrementally
+        when it already carries ``clusters`` attributes.
+
+        Returns the new clusters of every re-clustered node, and the set of
+        nodes whose old clusters are replaced (``None`` for all of them).
+        """
+        from graspologic.partition import hierarchical_leiden
+
+        graph = NetworkXStorage.stable_largest_connected_component(graph)
+        reclustered = NetworkXStorage.nodes_to_recluster(graph, changed_nodes)
+        first_cluster_id = 0
+        if reclustered is not None:
+            logger.info(
+                f"Incremental clustering of {len(reclustered)}/{graph.number_of_nodes()} nodes"
+            )
+            if not reclustered:
+                return {}, reclustered
+            # new ids never collide with the communities that are kept
+            first_cluster_id = 1 + max(
+                int(c["cluster"])
+                for _, d in graph.nodes(data=True)
+                if "clusters" in d
+                for c in json.loads(d["clusters"])
+            )
+            graph = NetworkXStorage._stabilize_graph(graph.subgraph(reclustered))
+        community_mapping = hierarchical_leiden(
+            graph,
+            max_cluster_size=global_config["max_graph_cluster_size"],
+            random_seed=global_config["graph_cluster_seed"],
+        )
+
+        node_communities: dict[str, list[dict[str, str]]] = defaultdict(list)
+        __levels = defaultdict(set)
+        for partition in community_mapping:
+            level_key = partition.level
+            cluster_id = partition.cluster + first_cluster_id
+            node_communities[partition.node].append(
+                {"level": level_key, "cluster": cluster_id}
+            )
+            __levels[level_key].add(cluster_id)
+        __levels = {k: len(v) for k, v in __levels.items()}
+        logger.info(f"Each level has communities: {dict(__levels)}")
+        return dict(node_communities), reclustered
+
     def __post_init__(self):
         self._graphml_xml_file = os.path.join(
             self.global_config["working_dir"], f"graph_{self.namespace}.graphml"
         )
-        preloaded_graph = NetworkXStorage.load_nx_graph(self._graphml_xml_file)
+        self._snapshot_file = os.path.join(
+            self.global_config["working_dir"], f"graph_{self.namespace}.snapshot"
+        )
+        self._community_schema_file = os.path.join(
+            self.global_config["working_dir"],
+            f"graph_{self.namespace}.community_schema.json",
+        )
+        self._export_graphml = self.global_config["addon_params"].get(
+            "export_graphml", False
+        )
+        if os.path.exists(self._snapshot_file):
+            loaded_file = self._snapshot_file
+            preloaded_graph = NetworkXStorage.load_nx_snapshot(self._snapshot_file)
+        else:
+            # working dirs from before snapshots only have the GraphML file
+            loaded_file = self._graphml_xml_file
+            preloaded_graph = NetworkXStorage.load_nx_graph(self._graphml_xml_file)
         if preloaded_graph is not None:
             logger.info(
-                f"Loaded graph from {self._graphml_xml_file} with {preloaded_graph.number_of_nodes()} nodes, {preloaded_graph.number_of_edges()} edges"
+                f"Loaded graph from {loaded_file} with {preloaded_graph.number_of_nodes()} nodes, {preloaded_graph.number_of_edges()} edges"
             )
         self._graph = preloaded_graph or nx.Graph()
+        # None whenever the graph changed since the schema was built
+        self._community_schema = load_community_schema(
+            self._community_schema_file, self._snapshot_file
+        )
+        # the schema in the schema file, if it's the one of the snapshot file
+        self._saved_community_schema = self._community_schema
+        # nodes with new edges since the last clustering
+        self._changed_nodes: set[str] = set()
         self._clustering_algorithms = {
             "leiden": self._leiden_clustering,
         }
@@ -94,7 +274,28 @@ class NetworkXStorage(BaseGraphStorage):
         }
 
     async def index_done_callback(self):
-        NetworkXStorage.write_nx_graph(self._graph, self._graphml_xml_file)
+        if (
+            self._community_schema is not None
+            and self._community_schema is self._saved_community_schema
+        ):
+            # every change drops the schema, so nothing changed since the last write
+            return
+        NetworkXStorage.write_nx_snapshot(self._graph, self._snapshot_file)
+        # the schema isn't built here, only saved once a query or the reports built it
+        if self._community_schema is not None:
+            write_community_schema(
+                self._community_schema, self._community_schema_file, self._snapshot_file
+            )
+        self._saved_community_schema = self._community_schema
+        if self._export_graphml:
+            self.export_graphml()
+
+    def export_graphml(self, file_name: str = None):
+        NetworkXStorage.write_nx_graph(self._graph, file_name or self._graphml_xml_file)
+
+    def import_graphml(self, file_name: str = None):
+        self._graph = nx.read_graphml(file_name or self._graphml_xml_file)
+        self._community_schema = None
 
     async def has_node(self, node_id: str) -> bool:
         return self._graph.has_node(node_id)
@@ -124,20 +325,59 @@ class NetworkXStorage(BaseGraphStorage):
             return list(self._graph.edges(source_node_id))
         return None
 
+    async def get_nodes(self, node_ids: list[str]) -> list[Union[dict, None]]:
+        nodes = self._graph.nodes
+        return [nodes.get(n) for n in node_ids]
+
+    async def node_degrees(self, node_ids: list[str]) -> list[int]:
+        degree = self._graph.degree
+        return [degree(n) if n in self._graph else 0 for n in node_ids]
+
+    async def get_edges(
+        self, edge_pairs: list[tuple[str, str]]
+    ) -> list[Union[dict, None]]:
+        edges = self._graph.edges
+        return [edges.get(pair) for pair in edge_pairs]
+
+    async def edge_degrees(self, edge_pairs: list[tuple[str, str]]) -> list[int]:
+        degree = self._graph.degree
+        return [
+            (degree(s) if s in self._graph else 0)
+            + (degree(t) if t in self._graph else 0)
+            for s, t in edge_pairs
+        ]
+
+    async def get_nodes_edges(
+        self, node_ids: list[str]
+    ) -> list[Union[list[tuple[str, str]], None]]:
+        return [
+            list(self._graph.edges(n)) if n in self._graph else None
+            for n in node_ids
+        ]
+
     async def upsert_node(self, node_id: str, node_data: dict[str, str]):
         self._graph.add_node(node_id, **node_data)
+        self._community_schema = None
 
     async def upsert_edge(
         self, source_node_id: str, target_node_id: str, edge_data: dict[str, str]
     ):
         self._graph.add_edge(source_node_id, target_node_id, **edge_data)
+        self._changed_nodes.update((source_node_id, target_node_id))
+        self._community_schema = None
 
     async def clustering(self, algorithm: str):
         if algorithm not in self._clustering_algorithms:
             raise ValueError(f"Clustering algorithm {algorithm} not supported")
         await self._clustering_algorithms[algorithm]()
+        self._community_schema = None
 
     async def community_schema(self) -> dict[str, SingleCommunitySchema]:
+        if self._community_schema is None:
+            self._community_schema = self._build_community_schema()
+        return dict(self._community_schema)
+
+    def _build_community_schema(self) -> dict[str, SingleCommunitySchema]:
         results = defaultdict(
             lambda: dict(
                 level=None,
@@ -172,18 +412,7 @@ class NetworkXStorage(BaseGraphStorage):
                 )
                 max_num_ids = max(max_num_ids, len(results[cluster_key]["chunk_ids"]))
 
-        ordered_levels = sorted(levels.keys())
-        for i, curr_level in enumerate(ordered_levels[:-1]):
-            next_level = ordered_levels[i + 1]
-            this_level_comms = levels[curr_level]
-            next_level_comms = levels[next_level]
-            # compute the sub-communities by nodes intersection
-            for comm in this_level_comms:
-                results[comm]["sub_communities"] = [
-                    c
-                    for c in next_level_comms
-                    if results[c]["nodes"].issubset(results[comm]["nodes"])
-                ]
+        NetworkXStorage.link_sub_communities(results, levels)
 
         for k, v in results.items():
             v["edges"] = list(v["edges"])
@@ -198,28 +427,14 @@ class NetworkXStorage(BaseGraphStorage):
             self._graph.nodes[node_id]["clusters"] = json.dumps(clusters)
 
     async def _leiden_clustering(self):
-        from graspologic.partition import hierarchical_leiden
-
-        graph = NetworkXStorage.stable_largest_connected_component(self._graph)
-        community_mapping = hierarchical_leiden(
-            graph,
-            max_cluster_size=self.global_config["max_graph_cluster_size"],
-            random_seed=self.global_config["graph_cluster_seed"],
+        node_communities, reclustered = NetworkXStorage.hierarchical_leiden_communities(
+            self._graph, self._changed_nodes, self.global_config
         )
-
-        node_communities: dict[str, list[dict[str, str]]] = defaultdict(list)
-        __levels = defaultdict(set)
-        for partition in community_mapping:
-            level_key = partition.level
-            cluster_id = partition.cluster
-            node_communities[partition.node].append(
-                {"level": level_key, "cluster": cluster_id}
-            )
-            __levels[level_key].add(cluster_id)
-        node_communities = dict(node_communities)
-        __levels = {k: len(v) for k, v in __levels.items()}
-        logger.info(f"Each level has communities: {dict(__levels)}")
+        for node_id, node_data in self._graph.nodes(data=True):
+            if reclustered is None or node_id in reclustered:
+                node_data.pop("clusters", None)
         self._cluster_data_to_subgraphs(node_communities)
+        self._changed_nodes.clear()
 
     async def embed_nodes(self, algorithm: str) -> tuple[np.ndarray, list[str]]:
         if algorithm not in self._node_embed_algorithms:
@@ -0,0 +1,226 @@
+"""Binary graph snapshot shared by the in-process graph storages.
+
+Layout, little-endian:
+  header      magic, version, is_directed
+  string pool count, char length of each string, utf-8 of all strings joined
+  nodes       count, pool id of each node, attribute table
+  edges       count, pool ids of sources, pool ids of targets, attribute table
+An attribute table is a column per attribute key: the pool id of the key, a
+uint8 type tag per row and an int64 value per row (strings as pool ids,
+floats bit-cast).
+
+The community schema of a snapshot is cached in a JSON file stamped with the
+snapshot's size and mtime, so it is only used for the graph it was built from.
+"""
+import json
+import os
+import struct
+from dataclasses import dataclass
+from typing import Union
+
+import numpy as np
+
+SNAPSHOT_MAGIC = b"NGRS"
+SNAPSHOT_VERSION = 1
+_HEADER = "<4sIB"
+_MISSING, _STR, _INT, _FLOAT, _BOOL = range(5)
+
+
+class _Missing:
+    def __repr__(self):
+        return "MISSING"
+
+
+# marks a row without the attribute in a column
+MISSING = _Missing()
+
+
+@dataclass
+class GraphSnapshot:
+    directed: bool
+    nodes: list[str]
+    node_columns: dict[str, list]
+    sources: list[str]
+    targets: list[str]
+    edge_columns: dict[str, list]
+
+
+def rows_to_columns(rows: list[dict]) -> dict[str, list]:
+    keys = sorted(set(k for row in rows for k in row))
+    return {k: [row.get(k, MISSING) for row in rows] for k in keys}
+
+
+def columns_to_rows(columns: dict[str, list], num_rows: int) -> list[dict]:
+    rows = [{} for _ in range(num_rows)]
+    for key, column in columns.items():
+        for row, value in zip(rows, column):
+            if value is not MISSING:
+                row[key] = value
+    return rows
+
+
+def _encode_column(key: str, column: list, intern) -> list[bytes]:
+    tags, values, float_rows, float_values = [], [], [], []
+    for i, value in enumerate(column):
+        if value is MISSING:
+            tags.append(_MISSING)
+            values.append(0)
+        elif isinstance(value, (bool, np.bool_)):
+            tags.append(_BOOL)
+            values.append(int(value))
+        elif isinstance(value, str):
+            tags.append(_STR)
+            values.append(intern(value))
+        elif isinstance(value, (int, np.integer)):
+            tags.append(_INT)
+            values.append(int(value))
+        elif isinstance(value, (float, np.floating)):
+            tags.append(_FLOAT)
+            values.append(0)
+            float_rows.append(i)
+            float_values.append(value)
+        else:
+            raise TypeError(
+                f"Attribute {key}={value!r} of type {type(value)} can't be snapshotted"
+            )
+    values = np.array(values, dtype="<i8")
+    values[float_rows] = np.array(float_values, dtype="<f8").view("<i8")
+    return [
+        struct.pack("<I", intern(key)),
+        np.array(tags, dtype=np.uint8).tobytes(),
+        values.tobytes(),
+    ]
+
+
+def _decode_columns(buffer, offset: int, num_rows: int, pool: list[str]):
+    (num_keys,) = struct.unpack_from("<I", buffer, offset)
+    offset += 4
+    columns = {}
+    for _ in range(num_keys):
+        (key_id,) = struct.unpack_from("<I", buffer, offset)
+        offset += 4
+        tags = np.frombuffer(buffer, dtype=np.uint8, count=num_rows, offset=offset)
+        offset += num_rows
+        values = np.frombuffer(buffer, dtype="<i8", count=num_rows, offset=offset)
+        offset += num_rows * 8
+        tag_list = tags.tolist()
+        int_list = values.tolist()
+        float_list = values.view("<f8").tolist()
+        column = [MISSING] * num_rows
+        for i in np.flatnonzero(tags).tolist():
+            tag = tag_list[i]
+            if tag == _STR:
+                column[i] = pool[int_list[i]]
+            elif tag == _INT:
+                column[i] = int_list[i]
+            elif tag == _FLOAT:
+                column[i] = float_list[i]
+            else:
+                column[i] = bool(int_list[i])
+        columns[pool[key_id]] = column
+    return columns, offset
+
+
+def read_graph_snapshot(file_name) -> GraphSnapshot:
+    with open(file_name, "rb") as f:
+        buffer = f.read()
+    magic, version, directed = struct.unpack_from(_HEADER, buffer, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError(f"{file_name} is not a version {SNAPSHOT_VERSION} graph snapshot")
+    offset = struct.calcsize(_HEADER)
+
+    (num_strings,) = struct.unpack_from("<I", buffer, offset)
+    offset += 4
+    lengths = np.frombuffer(buffer, dtype="<u4", count=num_strings, offset=offset)
+    offset += num_strings * 4
+    (blob_size,) = struct.unpack_from("<Q", buffer, offset)
+    offset += 8
+    blob = buffer[offset : offset + blob_size].decode("utf-8")
+    offset += blob_size
+    ends = np.cumsum(lengths, dtype=np.int64).tolist()
+    pool = [blob[end - length : end] for end, length in zip(ends, lengths.tolist())]
+
+    (num_nodes,) = struct.unpack_from("<I", buffer, offset)
+    offset += 4
+    node_ids = np.frombuffer(buffer, dtype="<u4", count=num_nodes, offset=offset)
+    offset += num_nodes * 4
+    node_columns, offset = _decode_columns(buffer, offset, num_nodes, pool)
+
+    (num_edges,) = struct.unpack_from("<I", buffer, offset)
+    offset += 4
+    sources = np.frombuffer(buffer, dtype="<u4", count=num_edges, offset=offset)
+    offset += num_edges * 4
+    targets = np.frombuffer(buffer, dtype="<u4", count=num_edges, offset=offset)
+    offset += num_edges * 4
+    edge_columns, offset = _decode_columns(buffer, offset, num_edges, pool)
+
+    return GraphSnapshot(
+        directed=bool(directed),
+        nodes=[pool[i] for i in node_ids.tolist()],
+        node_columns=node_columns,
+        sources=[pool[i] for i in sources.tolist()],
+        targets=[pool[i] for i in targets.tolist()],
+        edge_columns=edge_columns,
+    )
+
+
+def write_graph_snapshot(snapshot: GraphSnapshot, file_name):
+    pool: dict[str, int] = {}
+
+    def intern(string: str) -> int:
+        return pool.setdefault(string, len(pool))
+
+    node_ids = [intern(n) for n in snapshot.nodes]
+    sources = [intern(s) for s in snapshot.sources]
+    targets = [intern(t) for t in snapshot.targets]
+    node_table = [struct.pack("<I", len(snapshot.node_columns))]
+    for key, column in snapshot.node_columns.items():
+        node_table += _encode_column(key, column, intern)
+    edge_table = [struct.pack("<I", len(snapshot.edge_columns))]
+    for key, column in snapshot.edge_columns.items():
+        edge_table += _encode_column(key, column, intern)
+
+    blob = "".join(pool).encode("utf-8")
+    chunks = [
+        struct.pack(_HEADER, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, snapshot.directed),
+        struct.pack("<I", len(pool)),
+        np.array([len(s) for s in pool], dtype="<u4").tobytes(),
+        struct.pack("<Q", len(blob)),
+        blob,
+        struct.pack("<I", len(node_ids)),
+        np.array(node_ids, dtype="<u4").tobytes(),
+        *node_table,
+        struct.pack("<I", len(sources)),
+        np.array(sources, dtype="<u4").tobytes(),
+        np.array(targets, dtype="<u4").tobytes(),
+        *edge_table,
+    ]
+    with open(file_name + ".tmp", "wb") as f:
+        f.write(b"".join(chunks))
+    os.replace(file_name + ".tmp", file_name)
+
+
+def _file_stamp(file_name) -> list[int]:
+    stat = os.stat(file_name)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_community_schema(schema_file, snapshot_file) -> Union[dict, None]:
+    """The community schema saved for the current version of ``snapshot_file``."""
+    if not os.path.exists(schema_file) or not os.path.exists(snapshot_file):
+        return None
+    with open(schema_file, encoding="utf-8") as f:
+        data = json.load(f)
+    if data["stamp"] != _file_stamp(snapshot_file):
+        return None
+    return data["schema"]
+
+
+def write_community_schema(schema: dict, schema_file, snapshot_file):
+    with open(schema_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(
+            {"stamp": _file_stamp(snapshot_file), "schema": schema},
+            f,
+            ensure_ascii=False,
+        )
+    os.replace(schema_file + ".tmp", schema_file)
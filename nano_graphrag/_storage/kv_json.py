@@ -1,4 +1,6 @@
+import json
 import os
+import re
 from dataclasses import dataclass
 
 from .._utils import load_json, logger, write_json
@@ -7,24 +9,150 @@ from ..base import (
 )
 
 
+def write_json_with_offsets(items, file_name) -> dict[str, list[int]]:
+    """Write ``(key, value_bytes)`` pairs as the same document ``write_json`` produces.
+
+    Returns the ``key -> [offset, length]`` byte span of every value in the file.
+    """
+    index = {}
+    with open(file_name, "wb") as f:
+        f.write(b"{")
+        offset = 1
+        for i, (key, value_bytes) in enumerate(items):
+            head = (
+                ("\n  " if i == 0 else ",\n  ")
+                + json.dumps(key, ensure_ascii=False)
+                + ": "
+            ).encode("utf-8")
+            f.write(head)
+            f.write(value_bytes)
+            index[key] = [offset + len(head), len(value_bytes)]
+            offset += len(head) + len(value_bytes)
+        f.write(b"\n}" if index else b"}")
+    return index
+
+
+def _dump_value(value) -> bytes:
+    # nested one level deep, exactly like json.dump(indent=2) renders it
+    return (
+        json.dumps(value, indent=2, ensure_ascii=False)
+        .replace("\n", "\n  ")
+        .encode("utf-8")
+    )
+
+
+def scan_json_offsets(file_name) -> dict[str, list[int]]:
+    """Locate the byte span of every top-level value of a JSON object file."""
+    with open(file_name, encoding="utf-8") as f:
+        text = f.read()
+    decoder = json.JSONDecoder()
+    separators = re.compile(r"[ \t\n\r,:]*")
+    index = {}
+    pos = text.index("{") + 1
+    byte_pos = len(text[:pos].encode("utf-8"))
+
+    def _advance(new_pos):
+        nonlocal pos, byte_pos
+        byte_pos += len(text[pos:new_pos].encode("utf-8"))
+        pos = new_pos
+
+    while True:
+        _advance(separators.match(text, pos).end())
+        if text[pos] == "}":
+            break
+        key, key_end = decoder.raw_decode(text, pos)
+        _advance(separators.match(text, key_end).end())
+        _, value_end = decoder.raw_decode(text, pos)
+        start = byte_pos
+        _advance(value_end)
+        index[key] = [start, byte_pos - start]
+    return index
+
+
 @dataclass
 class JsonKVStorage(BaseKVStorage):
+    lazy: bool = False
+
     def __post_init__(self):
         working_dir = self.global_config["working_dir"]
+        kv_params = self.global_config.get("key_string_value_json_storage_cls_kwargs", {})
+        self.lazy = kv_params.get("lazy", self.lazy)
         self._file_name = os.path.join(working_dir, f"kv_store_{self.namespace}.json")
-        self._data = load_json(self._file_name) or {}
-        logger.info(f"Load KV {self.namespace} with {len(self._data)} data")
+        self._index_file_name = os.path.join(
+            working_dir, f"kv_store_{self.namespace}.index.json"
+        )
+        # in lazy mode _data only caches values that were read or upserted
+        self._index: dict[str, list[int]] = {}
+        if self.lazy:
+            self._data = {}
+            self._index = self._load_index()
+            logger.info(f"Load KV {self.namespace} index with {len(self._index)} data")
+        else:
+            self._data = load_json(self._file_name) or {}
+            logger.info(f"Load KV {self.namespace} with {len(self._data)} data")
+
+    def _file_stamp(self) -> list[int]:
+        stat = os.stat(self._file_name)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _load_index(self) -> dict[str, list[int]]:
+        if not os.path.exists(self._file_name):
+            return {}
+        index_data = load_json(self._index_file_name)
+        if index_data is not None and index_data["stamp"] == self._file_stamp():
+            return index_data["index"]
+        logger.info(f"Rebuilding stale offset index of {self._file_name}")
+        index = scan_json_offsets(self._file_name)
+        write_json({"stamp": self._file_stamp(), "index": index}, self._index_file_name)
+        return index
+
+    def _read_lazy(self, ids) -> None:
+        missing = [id for id in ids if id not in self._data and id in self._index]
+        if not missing:
+            return
+        with open(self._file_name, "rb") as f:
+            for id in sorted(missing, key=lambda x: self._index[x][0]):
+                offset, length = self._index[id]
+                f.seek(offset)
+                self._data[id] = json.loads(f.read(length))
 
     async def all_keys(self) -> list[str]:
+        if self.lazy:
+            return list(self._index.keys() | self._data.keys())
         return list(self._data.keys())
 
     async def index_done_callback(self):
-        write_json(self._data, self._file_name)
+        keys = list(self._index.keys()) + [k for k in self._data if k not in self._index]
+        tmp_file_name = self._file_name + ".tmp"
+        old_file = open(self._file_name, "rb") if self._index else None
+        try:
+
+            def _items():
+                for key in keys:
+                    if key in self._data:
+                        yield key, _dump_value(self._data[key])
+                    else:
+                        # untouched in lazy mode, copy the raw bytes over
+                        old_file.seek(self._index[key][0])
+                        yield key, old_file.read(self._index[key][1])
+
+            index = write_json_with_offsets(_items(), tmp_file_name)
+        finally:
+            if old_file is not None:
+                old_file.close()
+        os.replace(tmp_file_name, self._file_name)
+        write_json({"stamp": self._file_stamp(), "index": index}, self._index_file_name)
+        if self.lazy:
+            self._index = index
 
     async def get_by_id(self, id):
+        if self.lazy:
+            self._read_lazy([id])
         return self._data.get(id, None)
 
     async def get_by_ids(self, ids, fields=None):
+        if self.lazy:
+            self._read_lazy(ids)
         if fields is None:
             return [self._data.get(id, None) for id in ids]
         return [
@@ -37,10 +165,16 @@ class JsonKVStorage(BaseKVStorage):
         ]
 
     async def filter_keys(self, data: list[str]) -> set[str]:
-        return set([s for s in data if s not in self._data])
+        return set([s for s in data if s not in self._data and s not in self._index])
 
     async def upsert(self, data: dict[str, dict]):
         self._data.update(data)
 
+    async def delete(self, ids: list[str]):
+        for id in ids:
+            self._data.pop(id, None)
+            self._index.pop(id, None)
+
     async def drop(self):
         self._data = {}
+        self._index = {}
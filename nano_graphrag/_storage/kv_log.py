@@ -0,0 +1,228 @@
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+
+from .._utils import logger
+from ..base import (
+    BaseKVStorage,
+)
+
+
+def _encode_record(key: str, value) -> bytes:
+    # json.dumps escapes control characters, so the first tab splits key and value
+    return (
+        json.dumps(key, ensure_ascii=False)
+        + "\t"
+        + json.dumps(value, ensure_ascii=False)
+        + "\n"
+    ).encode("utf-8")
+
+
+def _decode_value(line: bytes):
+    return json.loads(line[line.index(b"\t") + 1 :])
+
+
+# the record of a deleted key, values are never null
+_TOMBSTONE_SUFFIX = b"\tnull\n"
+
+
+def scan_log_index(file_name) -> tuple[dict[str, tuple[int, int]], int, int]:
+    """Build the key -> (offset, length) index of a log file.
+
+    Only the keys are parsed. A torn record at the tail (crash during append)
+    is cut off. Returns the index, the size of the valid log and the number of
+    bytes held by overwritten or deleted records.
+    """
+    index = {}
+    dead_bytes = 0
+    offset = 0
+    if not os.path.exists(file_name):
+        return index, offset, dead_bytes
+    with open(file_name, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            key = json.loads(line[: line.index(b"\t")])
+            if key in index:
+                dead_bytes += index.pop(key)[1]
+            if line.endswith(_TOMBSTONE_SUFFIX):
+                dead_bytes += len(line)
+            else:
+                index[key] = (offset, len(line))
+            offset += len(line)
+    if offset != os.path.getsize(file_name):
+        logger.warning(f"Truncating torn tail of {file_name} at {offset} bytes")
+        with open(file_name, "r+b") as f:
+            f.truncate(offset)
+    return index, offset, dead_bytes
+
+
+@dataclass
+class LogKVStorage(BaseKVStorage):
+    """Append-only KV storage.
+
+    Upserts are buffered in memory and appended to ``kv_log_{namespace}.log``
+    on ``index_done_callback``, so a flush costs O(delta). Deletes append a
+    tombstone record. An in-memory index maps each key to the offset of its
+    latest record; values are read from disk on demand. Once overwritten or
+    deleted records take more than
+    ``compaction_ratio`` of the log, live records are rewritten to a fresh log
+    in the background.
+    """
+
+    compaction_ratio: float = 0.5
+    compaction_min_bytes: int = 1 << 20
+
+    def __post_init__(self):
+        working_dir = self.global_config["working_dir"]
+        kv_params = self.global_config.get("key_string_value_json_storage_cls_kwargs", {})
+        self.compaction_ratio = kv_params.get("compaction_ratio", self.compaction_ratio)
+        self.compaction_min_bytes = kv_params.get(
+            "compaction_min_bytes", self.compaction_min_bytes
+        )
+        self._file_name = os.path.join(working_dir, f"kv_log_{self.namespace}.log")
+        self._index, self._size, self._dead_bytes = scan_log_index(self._file_name)
+        self._pending: dict[str, dict] = {}
+        # keys of the log to write a tombstone for on the next flush
+        self._deleted: set[str] = set()
+        self._reader = None
+        self._lock = None
+        self._compaction_task = None
+        logger.info(f"Load KV {self.namespace} with {len(self._index)} data")
+
+    def _get_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _read(self, id):
+        if id in self._pending:
+            return self._pending[id]
+        if id in self._deleted:
+            return None
+        position = self._index.get(id, None)
+        if position is None:
+            return None
+        if self._reader is None:
+            self._reader = open(self._file_name, "rb")
+        self._reader.seek(position[0])
+        return _decode_value(self._reader.read(position[1]))
+
+    async def all_keys(self) -> list[str]:
+        return list((self._index.keys() - self._deleted) | self._pending.keys())
+
+    async def get_by_id(self, id):
+        return self._read(id)
+
+    async def get_by_ids(self, ids, fields=None):
+        values = [self._read(id) for id in ids]
+        if fields is None:
+            return values
+        return [
+            {k: v for k, v in value.items() if k in fields} if value else None
+            for value in values
+        ]
+
+    async def filter_keys(self, data: list[str]) -> set[str]:
+        return set(
+            [
+                s
+                for s in data
+                if (s not in self._index or s in self._deleted)
+                and s not in self._pending
+            ]
+        )
+
+    async def upsert(self, data: dict[str, dict]):
+        self._pending.update(data)
+        self._deleted.difference_update(data)
+
+    async def delete(self, ids: list[str]):
+        for id in ids:
+            self._pending.pop(id, None)
+            if id in self._index:
+                self._deleted.add(id)
+
+    async def drop(self):
+        async with self._get_lock():
+            self._close_reader()
+            with open(self._file_name, "wb"):
+                pass
+            self._index, self._size, self._dead_bytes = {}, 0, 0
+            self._pending = {}
+            self._deleted = set()
+
+    async def index_done_callback(self):
+        async with self._get_lock():
+            if self._pending or self._deleted:
+                self._append(self._pending, self._deleted)
+                self._pending, self._deleted = {}, set()
+        if self._needs_compaction() and self._compaction_task is None:
+            self._compaction_task = asyncio.create_task(self._compact())
+
+    def _append(self, data: dict[str, dict], deleted: set[str]):
+        offset = self._size
+        records = []
+        for key in deleted:
+            record = _encode_record(key, None)
+            self._dead_bytes += self._index.pop(key)[1] + len(record)
+            offset += len(record)
+            records.append(record)
+        for key, value in data.items():
+            record = _encode_record(key, value)
+            if key in self._index:
+                self._dead_bytes += self._index[key][1]
+            self._index[key] = (offset, len(record))
+            offset += len(record)
+            records.append(record)
+        with open(self._file_name, "ab") as f:
+            f.write(b"".join(records))
+            f.flush()
+            os.fsync(f.fileno())
+        self._size = offset
+
+    def _needs_compaction(self) -> bool:
+        return (
+            self._size >= self.compaction_min_bytes
+            and self._dead_bytes > self._size * self.compaction_ratio
+        )
+
+    def _close_reader(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    @staticmethod
+    def _rewrite_live_records(
+        file_name: str, index: dict[str, tuple[int, int]]
+    ) -> tuple[dict[str, tuple[int, int]], int]:
+        new_index = {}
+        offset = 0
+        with open(file_name, "rb") as src, open(file_name + ".compact", "wb") as dst:
+            for key, (position, length) in sorted(index.items(), key=lambda x: x[1]):
+                src.seek(position)
+                dst.write(src.read(length))
+                new_index[key] = (offset, length)
+                offset += length
+            dst.flush()
+            os.fsync(dst.fileno())
+        return new_index, offset
+
+    async def _compact(self):
+        try:
+            async with self._get_lock():
+                logger.info(
+                    f"Compacting {self._file_name}: {self._dead_bytes}/{self._size} bytes are stale"
+                )
+                new_index, new_size = await asyncio.to_thread(
+                    LogKVStorage._rewrite_live_records,
+                    self._file_name,
+                    dict(self._index),
+                )
+                # swap on the event loop so no read sees the new file with the old index
+                self._close_reader()
+                os.replace(self._file_name + ".compact", self._file_name)
+                self._index, self._size, self._dead_bytes = new_index, new_size, 0
+        finally:
+            self._compaction_task = None
@@ -0,0 +1,87 @@
+import json
+import os
+import sqlite3
+from dataclasses import dataclass
+
+from .._utils import logger
+from ..base import (
+    BaseKVStorage,
+)
+
+
+@dataclass
+class SQLiteKVStorage(BaseKVStorage):
+    """KV storage on a WAL-mode SQLite file per namespace.
+
+    Nothing is loaded into memory at startup. Id lists are bound as a single
+    JSON array parameter, so lookups over many ids are one query without
+    hitting SQLite's host parameter limit, and field projection runs inside
+    SQLite. Upserts are committed on ``index_done_callback``.
+    """
+
+    def __post_init__(self):
+        working_dir = self.global_config["working_dir"]
+        self._file_name = os.path.join(working_dir, f"kv_store_{self.namespace}.sqlite")
+        self._conn = sqlite3.connect(self._file_name)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM kv").fetchone()
+        logger.info(f"Load KV {self.namespace} with {count} data")
+
+    async def all_keys(self) -> list[str]:
+        return [row[0] for row in self._conn.execute("SELECT key FROM kv")]
+
+    async def index_done_callback(self):
+        self._conn.commit()
+
+    async def get_by_id(self, id):
+        row = self._conn.execute("SELECT value FROM kv WHERE key = ?", (id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    async def get_by_ids(self, ids, fields=None):
+        if fields is None:
+            rows = self._conn.execute(
+                "SELECT kv.value FROM json_each(?) AS ids "
+                "LEFT JOIN kv ON kv.key = ids.value ORDER BY ids.key",
+                (json.dumps(list(ids)),),
+            )
+        else:
+            rows = self._conn.execute(
+                # json_each gives true/false/null as SQL 1/0/NULL, turn them back to JSON
+                "SELECT CASE WHEN kv.key IS NULL THEN NULL ELSE ("
+                "  SELECT json_group_object(f.key, CASE WHEN f.type IN ('true', 'false', 'null')"
+                "    THEN json(f.type) ELSE f.value END) FROM json_each(kv.value) AS f"
+                "  WHERE f.key IN (SELECT value FROM json_each(?))"
+                ") END FROM json_each(?) AS ids "
+                "LEFT JOIN kv ON kv.key = ids.value ORDER BY ids.key",
+                (json.dumps(list(fields)), json.dumps(list(ids))),
+            )
+        return [json.loads(row[0]) if row[0] is not None else None for row in rows]
+
+    async def filter_keys(self, data: list[str]) -> set[str]:
+        rows = self._conn.execute(
+            "SELECT ids.value FROM json_each(?) AS ids "
+            "WHERE NOT EXISTS (SELECT 1 FROM kv WHERE kv.key = ids.value)",
+            (json.dumps(list(data)),),
+        )
+        return set([row[0] for row in rows])
+
+    async def upsert(self, data: dict[str, dict]):
+        self._conn.executemany(
+            "INSERT INTO kv (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            [(k, json.dumps(v, ensure_ascii=False)) for k, v in data.items()],
+        )
+
+    async def delete(self, ids: list[str]):
+        self._conn.execute(
+            "DELETE FROM kv WHERE key IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(ids)),),
+        )
+
+    async def drop(self):
+        self._conn.execute("DELETE FROM kv")
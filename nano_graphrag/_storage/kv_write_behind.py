@@ -0,0 +1,119 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Union
+
+from .._utils import logger
+from ..base import BaseKVStorage
+
+
+@dataclass
+class WriteBehindKVStorage(BaseKVStorage):
+    """Buffer upserts in memory and flush the wrapped storage in batches.
+
+    Reads are served by the wrapped storage, which already holds the upserted
+    values in memory. A flush (``index_done_callback`` of the wrapped storage)
+    is triggered once ``flush_batch_size`` writes are pending or
+    ``flush_interval`` seconds after the first pending write, so at most that
+    much work is lost on a crash. ``index_done_callback`` always flushes.
+    """
+
+    storage: BaseKVStorage = None
+    flush_interval: float = 5.0
+    flush_batch_size: int = 32
+    _pending: int = field(default=0, init=False)
+    # monotonic time of the oldest write not flushed yet
+    _pending_since: Union[float, None] = field(default=None, init=False)
+    _flush_handle: Union[asyncio.TimerHandle, None] = field(default=None, init=False)
+    # flushes started by the timer, referenced so they aren't garbage collected
+    _flush_tasks: set = field(default_factory=set, init=False)
+    _flush_lock: Union[asyncio.Lock, None] = field(default=None, init=False)
+
+    def __post_init__(self):
+        if self.storage is None:
+            raise ValueError("WriteBehindKVStorage needs a storage to wrap")
+        self.flush_interval = self.global_config.get(
+            "llm_cache_flush_interval", self.flush_interval
+        )
+        self.flush_batch_size = self.global_config.get(
+            "llm_cache_flush_batch_size", self.flush_batch_size
+        )
+
+    async def all_keys(self) -> list[str]:
+        return await self.storage.all_keys()
+
+    async def get_by_id(self, id):
+        return await self.storage.get_by_id(id)
+
+    async def get_by_ids(self, ids, fields=None):
+        return await self.storage.get_by_ids(ids, fields)
+
+    async def filter_keys(self, data: list[str]) -> set[str]:
+        return await self.storage.filter_keys(data)
+
+    async def upsert(self, data: dict):
+        await self.storage.upsert(data)
+        await self._written(len(data))
+
+    async def delete(self, ids: list[str]):
+        await self.storage.delete(ids)
+        await self._written(len(ids))
+
+    async def _written(self, count: int):
+        self._pending += count
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        if self._pending >= self.flush_batch_size or (
+            time.monotonic() - self._pending_since >= self.flush_interval
+        ):
+            await self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.flush_interval, self._start_flush
+            )
+
+    def _start_flush(self):
+        self._flush_handle = None
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task: asyncio.Task):
+        self._flush_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                f"Background flush of {self.namespace} failed: {task.exception()!r}"
+            )
+
+    async def drop(self):
+        await self.storage.drop()
+        await self._written(1)
+
+    async def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            logger.debug(f"Flushing {self._pending} writes of {self.namespace}")
+            pending, pending_since = self._pending, self._pending_since
+            self._pending, self._pending_since = 0, None
+            try:
+                await self.storage.index_done_callback()
+            except BaseException:
+                # the writes are still in the wrapped storage, retry them next time
+                self._pending += pending
+                self._pending_since = pending_since
+                raise
+
+    async def index_start_callback(self):
+        await self.storage.index_start_callback()
+
+    async def index_done_callback(self):
+        await self.flush()
+
+    async def query_done_callback(self):
+        await self.flush()
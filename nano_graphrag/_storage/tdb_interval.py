@@ -0,0 +1,89 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Union
+
+import numpy as np
+
+from .._utils import load_json, logger, write_json
+from ..base import BaseTemporalStorage
+
+
+@dataclass
+class IntervalTemporalStorage(BaseTemporalStorage):
+    """In-process interval index over the entity times.
+
+    Entities are persisted in ``temporal_{namespace}.json`` next to the vector
+    storages. Their times are kept in a sorted ``datetime64`` array, rebuilt
+    after upserts on the next query, so a range is found with two binary
+    searches and only the entities inside it are ranked.
+    """
+
+    def __post_init__(self):
+        self._file_name = os.path.join(
+            self.global_config["working_dir"], f"temporal_{self.namespace}.json"
+        )
+        # entity_time is kept as an ISO string, None if the time is unknown
+        self._data: dict[str, dict] = load_json(self._file_name) or {}
+        self._id_of_name = {v["entity_name"]: k for k, v in self._data.items()}
+        self._times: Union[np.ndarray, None] = None
+        self._ids: Union[np.ndarray, None] = None
+        logger.info(f"Load temporal {self.namespace} with {len(self._data)} entities")
+
+    def _build_index(self):
+        timed = [
+            (k, v["entity_time"])
+            for k, v in self._data.items()
+            if v["entity_time"] is not None
+        ]
+        times = np.array([t for _, t in timed], dtype="datetime64[s]")
+        order = np.argsort(times, kind="stable")
+        self._times = times[order]
+        self._ids = np.array([k for k, _ in timed], dtype=object)[order]
+
+    def _entity(self, entity_id: str) -> dict:
+        entity = self._data[entity_id]
+        return {
+            "id": entity_id,
+            "entity_name": entity["entity_name"],
+            "entity_time": datetime.fromisoformat(entity["entity_time"])
+            if entity["entity_time"] is not None
+            else None,
+            "entity_description": entity["entity_description"],
+        }
+
+    async def upsert(self, data: dict[str, dict]):
+        for k, v in data.items():
+            self._data[k] = {
+                "entity_name": v["entity_name"],
+                "entity_time": v["entity_time"].isoformat() if v["entity_time"] else None,
+                "entity_description": v["entity_description"],
+            }
+            self._id_of_name[v["entity_name"]] = k
+        self._times = None
+
+    async def query_time_range(
+        self, start_time: datetime, end_time: datetime, top_k: int
+    ) -> list[dict]:
+        if self._times is None:
+            self._build_index()
+        lo = np.searchsorted(self._times, np.datetime64(start_time, "s"), side="left")
+        hi = np.searchsorted(self._times, np.datetime64(end_time, "s"), side="right")
+        center = np.datetime64(start_time + (end_time - start_time) / 2, "s")
+        distances = np.abs((self._times[lo:hi] - center).astype(np.int64))
+        closest = np.argsort(distances, kind="stable")[:top_k]
+        return [self._entity(self._ids[lo + i]) for i in closest]
+
+    async def get_by_entity_names(self, entity_names: list[str]) -> list[dict]:
+        return [
+            self._entity(self._id_of_name[name]) if name in self._id_of_name else None
+            for name in entity_names
+        ]
+
+    async def index_done_callback(self):
+        write_json(self._data, self._file_name)
+
+    async def drop(self):
+        self._data = {}
+        self._id_of_name = {}
+        self._times = None
@@ -0,0 +1,149 @@
+import asyncio
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+
+from .._utils import logger
+from ..base import BaseTemporalStorage
+
+DEFAULT_CONN_KWARGS = {
+    "host": "localhost",
+    "port": "5432",
+    "dbname": "history",
+    "user": "postgres",
+    "password": "postgres",
+}
+_COLUMNS = "entity_hash_id, entity_name, entity_time, entity_description"
+
+
+def _row_to_entity(row) -> dict:
+    return {
+        "id": row[0],
+        "entity_name": row[1],
+        "entity_time": row[2],
+        "entity_description": row[3],
+    }
+
+
+@dataclass
+class PostgresTemporalStorage(BaseTemporalStorage):
+    """Temporal entities in a Postgres table, ``lichsu12`` by default.
+
+    Set ``temporal_storage_cls_kwargs`` with ``conn_kwargs`` (passed to
+    ``psycopg2.connect``), ``table`` and ``pool_max_size``. Connections come
+    from a pool shared by all calls, and each one prepares the range and name
+    queries once. Queries run in a worker thread so they don't block the event
+    loop. Upserts are sent as one multi-row ``INSERT``.
+    """
+
+    def __post_init__(self):
+        # psycopg2 is only needed by this backend
+        from psycopg2.pool import ThreadedConnectionPool
+
+        params = self.global_config.get("temporal_storage_cls_kwargs", {})
+        self.table = params.get("table", "lichsu12")
+        self._pool = ThreadedConnectionPool(
+            1,
+            params.get("pool_max_size", 10),
+            **{**DEFAULT_CONN_KWARGS, **params.get("conn_kwargs", {})},
+        )
+        self._prepared_conns: set[int] = set()
+        with self._cursor(prepare=False) as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "entity_hash_id TEXT PRIMARY KEY, entity_name VARCHAR(255) NOT NULL, "
+                "entity_time TIMESTAMP, entity_description TEXT)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_entity_time_idx "
+                f"ON {self.table} (entity_time)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_entity_name_idx "
+                f"ON {self.table} (entity_name)"
+            )
+        logger.info(f"Using the table {self.table} for temporal {self.namespace}")
+
+    @contextmanager
+    def _cursor(self, prepare: bool = True):
+        conn = self._pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                if prepare and id(conn) not in self._prepared_conns:
+                    cursor.execute(
+                        f"PREPARE {self.table}_time_range "
+                        "(timestamp, timestamp, timestamp, int) AS "
+                        f"SELECT {_COLUMNS} FROM {self.table} "
+                        "WHERE entity_time BETWEEN $1 AND $2 "
+                        "ORDER BY abs(extract(epoch FROM entity_time - $3)), entity_time "
+                        "LIMIT $4"
+                    )
+                    cursor.execute(
+                        f"PREPARE {self.table}_by_names (text[]) AS "
+                        f"SELECT {_COLUMNS} FROM {self.table} "
+                        "WHERE entity_name = ANY($1)"
+                    )
+                    self._prepared_conns.add(id(conn))
+                yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.putconn(conn)
+
+    def _upsert(self, rows: list[tuple]):
+        from psycopg2.extras import execute_values
+
+        with self._cursor() as cursor:
+            execute_values(
+                cursor,
+                f"INSERT INTO {self.table} ({_COLUMNS}) VALUES %s "
+                "ON CONFLICT (entity_hash_id) DO UPDATE SET "
+                "entity_name = EXCLUDED.entity_name, "
+                "entity_time = EXCLUDED.entity_time, "
+                "entity_description = EXCLUDED.entity_description",
+                rows,
+            )
+
+    def _execute(self, statement: str):
+        with self._cursor(prepare=False) as cursor:
+            cursor.execute(statement)
+
+    def _fetch(self, statement: str, params: tuple) -> list[tuple]:
+        with self._cursor() as cursor:
+            cursor.execute(statement, params)
+            return cursor.fetchall()
+
+    async def upsert(self, data: dict[str, dict]):
+        rows = [
+            (k, v["entity_name"], v["entity_time"], v["entity_description"])
+            for k, v in data.items()
+        ]
+        if rows:
+            await asyncio.to_thread(self._upsert, rows)
+
+    async def query_time_range(
+        self, start_time: datetime, end_time: datetime, top_k: int
+    ) -> list[dict]:
+        rows = await asyncio.to_thread(
+            self._fetch,
+            f"EXECUTE {self.table}_time_range (%s, %s, %s, %s)",
+            (start_time, end_time, start_time + (end_time - start_time) / 2, top_k),
+        )
+        return [_row_to_entity(row) for row in rows]
+
+    async def get_by_entity_names(self, entity_names: list[str]) -> list[dict]:
+        rows = await asyncio.to_thread(
+            self._fetch,
+            f"EXECUTE {self.table}_by_names (%s)",
+            (list(entity_names),),
+        )
+        found = {row[1]: _row_to_entity(row) for row in rows}
+        return [found.get(name) for name in entity_names]
+
+    async def drop(self):
+        await asyncio.to_thread(self._execute, f"TRUNCATE {self.table}")
+
+    async def close(self):
+        self._pool.closeall()
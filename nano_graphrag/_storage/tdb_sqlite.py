@@ -0,0 +1,101 @@
+import json
+import os
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+
+from .._utils import logger
+from ..base import BaseTemporalStorage
+
+_COLUMNS = "entity_hash_id, entity_name, entity_time, entity_description"
+
+
+def _row_to_entity(row) -> dict:
+    return {
+        "id": row[0],
+        "entity_name": row[1],
+        "entity_time": datetime.fromisoformat(row[2]) if row[2] is not None else None,
+        "entity_description": row[3],
+    }
+
+
+@dataclass
+class SQLiteTemporalStorage(BaseTemporalStorage):
+    """Temporal entities in an embedded SQLite database, one file per namespace,
+    or in memory with ``temporal_storage_cls_kwargs={"in_memory": True}``.
+
+    Times are stored as ISO strings, which sort like the datetimes, under an
+    index on ``entity_time``. Upserts are committed on ``index_done_callback``.
+    """
+
+    def __post_init__(self):
+        params = self.global_config.get("temporal_storage_cls_kwargs", {})
+        if params.get("in_memory", False):
+            self._file_name = ":memory:"
+        else:
+            self._file_name = os.path.join(
+                self.global_config["working_dir"], f"temporal_{self.namespace}.sqlite"
+            )
+        self._conn = sqlite3.connect(self._file_name)
+        if self._file_name != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entities ("
+            "entity_hash_id TEXT PRIMARY KEY, entity_name TEXT NOT NULL, "
+            "entity_time TEXT, entity_description TEXT)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entities_time_idx ON entities (entity_time)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entities_name_idx ON entities (entity_name)"
+        )
+        self._conn.commit()
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM entities").fetchone()
+        logger.info(f"Load temporal {self.namespace} with {count} entities")
+
+    async def upsert(self, data: dict[str, dict]):
+        self._conn.executemany(
+            f"INSERT INTO entities ({_COLUMNS}) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(entity_hash_id) DO UPDATE SET "
+            "entity_name = excluded.entity_name, "
+            "entity_time = excluded.entity_time, "
+            "entity_description = excluded.entity_description",
+            [
+                (
+                    k,
+                    v["entity_name"],
+                    v["entity_time"].isoformat() if v["entity_time"] else None,
+                    v["entity_description"],
+                )
+                for k, v in data.items()
+            ],
+        )
+
+    async def query_time_range(
+        self, start_time: datetime, end_time: datetime, top_k: int
+    ) -> list[dict]:
+        center = start_time + (end_time - start_time) / 2
+        rows = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM entities WHERE entity_time BETWEEN ? AND ? "
+            "ORDER BY ABS(julianday(entity_time) - julianday(?)), entity_time LIMIT ?",
+            (start_time.isoformat(), end_time.isoformat(), center.isoformat(), top_k),
+        )
+        return [_row_to_entity(row) for row in rows]
+
+    async def get_by_entity_names(self, entity_names: list[str]) -> list[dict]:
+        rows = self._conn.execute(
+            f"SELECT ids.key, {', '.join('e.' + c for c in _COLUMNS.split(', '))} "
+            "FROM json_each(?) AS ids "
+            "JOIN entities AS e ON e.entity_name = ids.value",
+            (json.dumps(list(entity_names), ensure_ascii=False),),
+        )
+        found = {row[0]: _row_to_entity(row[1:]) for row in rows}
+        return [found.get(i) for i in range(len(entity_names))]
+
+    async def index_done_callback(self):
+        self._conn.commit()
+
+    async def drop(self):
+        self._conn.execute("DELETE FROM entities")
@@ -5,8 +5,11 @@ import logging
 import os
 import re
 import numbers
+import time
+from collections import deque
+from contextvars import ContextVar
 from dataclasses import dataclass
-from functools import wraps
+from functools import partial, wraps
 from hashlib import md5
 from typing import Any, Union
 
@@ -235,28 +238,272 @@ class EmbeddingFunc:
 
 
 # Decorators ------------------------------------------------------------------------
-def limit_async_func_call(max_size: int, waitting_time: float = 0.0001):
-    """Add restriction of maximum async calling times for a async func"""
+# fair queuing key of the LLM/embedding calls made under the current context
+llm_caller: ContextVar[str] = ContextVar("llm_caller", default="default")
+# priority classes of LLM/embedding calls, most urgent first
+LLM_PRIORITIES = ("interactive", "indexing", "report")
+llm_priority: ContextVar[str] = ContextVar("llm_priority", default="interactive")
+
+
+def llm_caller_scope(kind: str):
+    """Run an async method as its own ``llm_caller`` for fair queuing"""
 
     def final_decro(func):
-        """Not using async.Semaphore to aovid use nest-asyncio"""
-        __current_size = 0
+        @wraps(func)
+        async def wrapped(*args, **kwargs):
+            token = llm_caller.set(f"{kind}-{id(asyncio.current_task())}")
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                llm_caller.reset(token)
+
+        return wrapped
+
+    return final_decro
+
 
+def llm_priority_scope(priority: str):
+    """Make the LLM/embedding calls of an async function run in ``priority``"""
+    if priority not in LLM_PRIORITIES:
+        raise ValueError(f"Unknown priority {priority}, expected one of {LLM_PRIORITIES}")
+
+    def final_decro(func):
         @wraps(func)
-        async def wait_func(*args, **kwargs):
-            nonlocal __current_size
-            while __current_size >= max_size:
-                await asyncio.sleep(waitting_time)
-            __current_size += 1
-            result = await func(*args, **kwargs)
-            __current_size -= 1
-            return result
+        async def wrapped(*args, **kwargs):
+            token = llm_priority.set(priority)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                llm_priority.reset(token)
+
+        return wrapped
+
+    return final_decro
+
 
+def estimate_prompt_tokens(*args, **kwargs) -> int:
+    """Token estimate of a completion call (prompt, system prompt, history and
+    ``max_tokens``) or of an embedding call (list of texts)."""
+    texts = []
+    for arg in args:
+        texts.extend(arg if isinstance(arg, list) else [arg])
+    texts.append(kwargs.get("system_prompt"))
+    texts.extend(m.get("content") for m in kwargs.get("history_messages") or [])
+    return (kwargs.get("max_tokens") or 0) + sum(
+        len(encode_string_by_tiktoken(t)) for t in texts if isinstance(t, str)
+    )
+
+
+class TokenBucket:
+    """``per_minute`` units, refilled continuously."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(
+            self.capacity, self.level + (now - self._updated) * self.capacity / 60
+        )
+        self._updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until ``amount`` is available, a request larger than the
+        bucket only waits for a full one."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.capacity)
+
+    def consume(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+
+class AsyncCallScheduler:
+    """Admission control for an async API: at most ``max_concurrency`` calls in
+    flight, within ``requests_per_minute`` and ``tokens_per_minute``.
+
+    Calls are admitted by ``llm_priority``: a free slot always goes to the most
+    urgent class with waiters, and a class can be capped below
+    ``max_concurrency`` with ``priority_max_concurrency``. Within a class,
+    calls are queued per ``llm_caller`` and admitted round-robin across
+    callers, first-in first-out within one caller. Nothing polls: waiters are
+    woken when a call finishes or when a bucket has refilled.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        requests_per_minute: Union[float, None] = None,
+        tokens_per_minute: Union[float, None] = None,
+        priority_max_concurrency: Union[dict[str, int], None] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.priority_max_concurrency = {
+            p: min(max_concurrency, (priority_max_concurrency or {}).get(p) or max_concurrency)
+            for p in LLM_PRIORITIES
+        }
+        self.buckets: list[tuple[TokenBucket, bool]] = []
+        if requests_per_minute:
+            self.buckets.append((TokenBucket(requests_per_minute), False))
+        if tokens_per_minute:
+            self.buckets.append((TokenBucket(tokens_per_minute), True))
+        self.running = 0
+        self.running_by_priority = {p: 0 for p in LLM_PRIORITIES}
+        self._queues: dict[str, dict[str, deque]] = {p: {} for p in LLM_PRIORITIES}
+        self._timer: Union[asyncio.TimerHandle, None] = None
+
+    @property
+    def counts_tokens(self) -> bool:
+        return any(is_tokens for _, is_tokens in self.buckets)
+
+    def waiting(self) -> int:
+        return sum(len(q) for queues in self._queues.values() for q in queues.values())
+
+    def _delay(self, tokens: int) -> float:
+        return max(
+            [b.delay(tokens if is_tokens else 1) for b, is_tokens in self.buckets],
+            default=0.0,
+        )
+
+    def _has_slot(self, priority: str) -> bool:
+        return (
+            self.running < self.max_concurrency
+            and self.running_by_priority[priority]
+            < self.priority_max_concurrency[priority]
+        )
+
+    def _admit(self, tokens: int, priority: str):
+        for bucket, is_tokens in self.buckets:
+            bucket.consume(tokens if is_tokens else 1)
+        self.running += 1
+        self.running_by_priority[priority] += 1
+
+    def _dispatch(self):
+        self._timer = None
+        while True:
+            priority = next(
+                (p for p in LLM_PRIORITIES if self._queues[p] and self._has_slot(p)),
+                None,
+            )
+            if priority is None:
+                return
+            queues = self._queues[priority]
+            caller = next(iter(queues))
+            queue = queues[caller]
+            future, tokens = queue[0]
+            if future.done():  # cancelled while waiting
+                queue.popleft()
+            else:
+                delay = self._delay(tokens)
+                if delay > 0:
+                    self._timer = asyncio.get_running_loop().call_later(
+                        delay, self._dispatch
+                    )
+                    return
+                queue.popleft()
+                self._admit(tokens, priority)
+                future.set_result(None)
+            # round-robin: the caller goes to the back of the line
+            del queues[caller]
+            if queue:
+                queues[caller] = queue
+
+    async def acquire(self, tokens: int = 0, priority: str = "interactive"):
+        # only waiters of the same or a more urgent class are ahead of us
+        ahead = LLM_PRIORITIES[: LLM_PRIORITIES.index(priority) + 1]
+        if not any(self._queues[p] for p in ahead) and self._has_slot(priority):
+            if self._delay(tokens) == 0:
+                self._admit(tokens, priority)
+                return
+        future = asyncio.get_running_loop().create_future()
+        queues = self._queues[priority]
+        queues.setdefault(llm_caller.get(), deque()).append((future, tokens))
+        if self._timer is None:
+            self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(priority)
+            raise
+
+    def release(self, priority: str = "interactive"):
+        self.running -= 1
+        self.running_by_priority[priority] -= 1
+        if self._timer is None:
+            self._dispatch()
+
+
+def limit_async_func_call(
+    max_size: int,
+    requests_per_minute: Union[float, None] = None,
+    tokens_per_minute: Union[float, None] = None,
+    token_estimate_func: callable = estimate_prompt_tokens,
+    priority_max_size: Union[dict[str, int], None] = None,
+):
+    """Add restriction of maximum async calling times for a async func,
+    optionally of its requests and prompt tokens per minute, and of the
+    calling times per ``llm_priority``"""
+
+    def final_decro(func):
+        scheduler = AsyncCallScheduler(
+            max_size, requests_per_minute, tokens_per_minute, priority_max_size
+        )
+
+        @wraps(func)
+        async def wait_func(*args, **kwargs):
+            tokens = (
+                token_estimate_func(*args, **kwargs) if scheduler.counts_tokens else 0
+            )
+            priority = llm_priority.get()
+            await scheduler.acquire(tokens, priority)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                scheduler.release(priority)
+
+        wait_func.scheduler = scheduler
         return wait_func
 
     return final_decro
 
 
+def _forget_call(in_flight: dict, key: str, task: asyncio.Task):
+    in_flight.pop(key, None)
+    if not task.cancelled():
+        task.exception()  # retrieved, even if every caller was cancelled
+
+
+def single_flight_call(func):
+    """Coalesce concurrent calls of an async func with the same arguments:
+    while one is in flight, identical calls await its result instead of
+    calling again. Arguments are keyed with ``compute_args_hash``, except
+    ``hashing_kv`` which doesn't change the answer."""
+    in_flight: dict[str, asyncio.Task] = {}
+
+    @wraps(func)
+    async def coalesced_func(*args, **kwargs):
+        key = compute_args_hash(
+            args, sorted((k, v) for k, v in kwargs.items() if k != "hashing_kv")
+        )
+        task = in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            in_flight[key] = task
+            task.add_done_callback(partial(_forget_call, in_flight, key))
+        else:
+            coalesced_func.coalesced += 1
+        # a cancelled caller must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    coalesced_func.coalesced = 0
+    coalesced_func.in_flight = in_flight
+    return coalesced_func
+
+
 def wrap_embedding_func_with_attrs(**kwargs):
     """Wrap a function with attributes"""
 
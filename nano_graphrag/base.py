@@ -1,4 +1,6 @@
+import asyncio
 from dataclasses import dataclass, field
+from datetime import datetime
 from typing import TypedDict, Union, Literal, Generic, TypeVar
 
 import numpy as np
@@ -20,6 +22,11 @@ class QueryParam:
     local_max_token_for_local_context: int = 4800  # 12000 * 0.4
     local_max_token_for_community_report: int = 3200  # 12000 * 0.27
     local_community_single_one: bool = False
+    # pre-retrieval stages of local search, the answer filter and the time
+    # extraction run concurrently with the entity search
+    local_answer_filter: bool = True
+    local_time_extraction: bool = True
+    local_rerank: bool = True
     # global search
     global_min_community_rating: float = 0
     global_max_consider_community: float = 512
@@ -51,6 +58,7 @@ SingleCommunitySchema = TypedDict(
 class CommunitySchema(SingleCommunitySchema):
     report_string: str
     report_json: dict
+    describe_hash: str
 
 
 T = TypeVar("T")
@@ -109,6 +117,45 @@ class BaseKVStorage(Generic[T], StorageNameSpace):
     async def upsert(self, data: dict[str, T]):
         raise NotImplementedError
 
+    async def delete(self, ids: list[str]):
+        """remove the given keys, missing ones are ignored"""
+        raise NotImplementedError
+
+    async def drop(self):
+        raise NotImplementedError
+
+
+TemporalEntitySchema = TypedDict(
+    "TemporalEntitySchema",
+    {
+        "entity_name": str,
+        "entity_time": Union[datetime, None],
+        "entity_description": str,
+    },
+)
+
+
+@dataclass
+class BaseTemporalStorage(StorageNameSpace):
+    """Entities with the time they happened at, keyed by entity hash id"""
+
+    async def upsert(self, data: dict[str, TemporalEntitySchema]):
+        raise NotImplementedError
+
+    async def query_time_range(
+        self, start_time: datetime, end_time: datetime, top_k: int
+    ) -> list[dict]:
+        """Up to ``top_k`` entities with ``start_time <= entity_time <= end_time``,
+        closest to the middle of the range first, each as a
+        ``TemporalEntitySchema`` plus its ``id``"""
+        raise NotImplementedError
+
+    async def get_by_entity_names(
+        self, entity_names: list[str]
+    ) -> list[Union[dict, None]]:
+        """The entity of each name, in the order of the input"""
+        raise NotImplementedError
+
     async def drop(self):
         raise NotImplementedError
 
@@ -140,6 +187,27 @@ class BaseGraphStorage(StorageNameSpace):
     ) -> Union[list[tuple[str, str]], None]:
         raise NotImplementedError
 
+    # Batched reads, results follow the order of the input. Backends with a
+    # round-trip per call should override these with a single query.
+    async def get_nodes(self, node_ids: list[str]) -> list[Union[dict, None]]:
+        return await asyncio.gather(*[self.get_node(n) for n in node_ids])
+
+    async def node_degrees(self, node_ids: list[str]) -> list[int]:
+        return await asyncio.gather(*[self.node_degree(n) for n in node_ids])
+
+    async def get_edges(
+        self, edge_pairs: list[tuple[str, str]]
+    ) -> list[Union[dict, None]]:
+        return await asyncio.gather(*[self.get_edge(s, t) for s, t in edge_pairs])
+
+    async def edge_degrees(self, edge_pairs: list[tuple[str, str]]) -> list[int]:
+        return await asyncio.gather(*[self.edge_degree(s, t) for s, t in edge_pairs])
+
+    async def get_nodes_edges(
+        self, node_ids: list[str]
+    ) -> list[Union[list[tuple[str, str]], None]]:
+        return await asyncio.gather(*[self.get_node_edges(n) for n in node_ids])
+
     async def upsert_node(self, node_id: str, node_data: dict[str, str]):
         raise NotImplementedError
 
@@ -3,6 +3,7 @@ import os
 from dataclasses import asdict, dataclass, field
 from datetime import datetime
 from functools import partial
+from itertools import islice
 from typing import Callable, Dict, List, Optional, Type, Union, cast
 
 import tiktoken
@@ -24,20 +25,30 @@ from ._op import (
     extract_entities, custom_extract_entities,
     generate_community_report,
     get_chunks,
+    prefetch_extraction,
+    LOCAL_QUERY_STAGES,
+    score_rerank_entities,
     local_query,
     global_query,
     naive_query,
 )
+from ._query_cache import SemanticQueryCache
 from ._storage import (
     JsonKVStorage,
+    LogKVStorage,
     NanoVectorDBStorage,
     NetworkXStorage,
-    Neo4jStorage
+    IntervalTemporalStorage,
+    Neo4jStorage,
+    WriteBehindKVStorage,
 )
 from ._utils import (
     EmbeddingFunc,
     compute_mdhash_id,
     limit_async_func_call,
+    llm_caller_scope,
+    llm_priority_scope,
+    single_flight_call,
     convert_response_to_json,
     always_get_an_event_loop,
     logger,
@@ -45,6 +56,7 @@ from ._utils import (
 from .base import (
     BaseGraphStorage,
     BaseKVStorage,
+    BaseTemporalStorage,
     BaseVectorStorage,
     StorageNameSpace,
     QueryParam,
@@ -60,6 +72,8 @@ class GraphRAG:
     # graph mode
     enable_local: bool = True
     enable_naive_rag: bool = False
+    # re-cluster and regenerate the changed community reports on every insert
+    enable_community_report: bool = False
 
     # text chunking
     chunk_func: Callable[
@@ -108,6 +122,9 @@ class GraphRAG:
     embedding_func: EmbeddingFunc = field(default_factory=lambda: openai_embedding)
     embedding_batch_num: int = 32
     embedding_func_max_async: int = 16
+    # requests and tokens per minute, None for no limit
+    embedding_func_max_rpm: Optional[int] = None
+    embedding_func_max_tpm: Optional[int] = None
     query_better_than_threshold: float = 0.2
 
     # LLM
@@ -118,21 +135,80 @@ class GraphRAG:
     best_model_func: callable = gpt_4o_mini_complete
     best_model_max_token_size: int = 32768
     best_model_max_async: int = 16
+    best_model_max_rpm: Optional[int] = None
+    best_model_max_tpm: Optional[int] = None
     cheap_model_func: callable = gpt_4o_mini_complete
     cheap_model_max_token_size: int = 32768
     cheap_model_max_async: int = 16
+    cheap_model_max_rpm: Optional[int] = None
+    cheap_model_max_tpm: Optional[int] = None
+    # max concurrent LLM/embedding calls per priority ("interactive", "indexing",
+    # "report"), capped by the *_max_async above. Queries always go first.
+    llm_priority_max_async: dict = field(default_factory=dict)
 
     # entity extraction
     entity_extraction_func: callable = custom_extract_entities
+    # save each chunk's extraction result, so a failed insert resumes from it
+    enable_extraction_checkpoint: bool = True
+    # append-only by default, so a flush writes only the new checkpoints
+    extraction_checkpoint_storage_cls: Type[BaseKVStorage] = LogKVStorage
+    # entity resolution of custom_extract_entities: names sharing a word are
+    # compared by "ngram" or "embedding" similarity, pairs above the merge
+    # threshold are merged, pairs above the ambiguous one are asked to the LLM
+    entity_resolution_similarity: str = "ngram"
+    entity_resolution_merge_threshold: float = 0.9
+    entity_resolution_ambiguous_threshold: float = 0.6
+    entity_resolution_llm_confirm: bool = True
+    entity_resolution_max_block_size: int = 256
+
+    # streaming insert: docs are chunked, extracted and committed in windows of
+    # this many docs, with at most insert_max_windows_in_flight windows queued
+    # between two stages. None inserts all docs at once.
+    insert_window_size: Optional[int] = None
+    insert_max_windows_in_flight: int = 1
+
+    # local query rerank of the candidate entities: score_rerank_entities
+    # scores them in-process with these weights, llm_rerank_entities asks the
+    # best LLM to pick the useful ones
+    entity_rerank_func: callable = score_rerank_entities
+    entity_rerank_weights: dict = field(
+        default_factory=lambda: {
+            "similarity": 0.4,
+            "degree": 0.2,
+            "temporal": 0.2,
+            "lexical": 0.2,
+        }
+    )
+
+    # query cache: the context and response are reused for the same query and
+    # QueryParam, or, if a threshold is set, for a query whose embedding is at
+    # least this similar. Keep it None for multiple-choice questions, whose
+    # near-identical variants have other answers. The cache is in memory and
+    # cleared on every insert.
+    enable_query_cache: bool = True
+    query_cache_similarity_threshold: Optional[float] = None
+    query_cache_max_size: int = 1024
+    query_cache_ttl: Optional[float] = 3600.0
 
     # storage
     key_string_value_json_storage_cls: Type[BaseKVStorage] = JsonKVStorage
+    key_string_value_json_storage_cls_kwargs: dict = field(default_factory=dict)
     vector_db_storage_cls: Type[BaseVectorStorage] = NanoVectorDBStorage
     vector_db_storage_cls_kwargs: dict = field(default_factory=dict)
     # graph_storage_cls: Type[BaseGraphStorage] = Neo4jStorage
     graph_storage_cls: Type[BaseGraphStorage] = NetworkXStorage
+    # entity times for time-range retrieval, SQLiteTemporalStorage or
+    # PostgresTemporalStorage to keep them out of memory
+    temporal_storage_cls: Type[BaseTemporalStorage] = IntervalTemporalStorage
+    temporal_storage_cls_kwargs: dict = field(default_factory=dict)
 
     enable_llm_cache: bool = True
+    # cache the output of each local query stage (answer filter, time
+    # extraction, rerank) in its own kv storage
+    enable_query_stage_cache: bool = True
+    # the llm cache is flushed after this many new responses or seconds
+    llm_cache_flush_batch_size: int = 32
+    llm_cache_flush_interval: float = 5.0
 
     # extension
     always_create_working_dir: bool = True
@@ -176,8 +252,12 @@ class GraphRAG:
         )
 
         self.llm_response_cache = (
-            self.key_string_value_json_storage_cls(
-                namespace="llm_response_cache", global_config=asdict(self)
+            WriteBehindKVStorage(
+                namespace="llm_response_cache",
+                global_config=asdict(self),
+                storage=self.key_string_value_json_storage_cls(
+                    namespace="llm_response_cache", global_config=asdict(self)
+                ),
             )
             if self.enable_llm_cache
             else None
@@ -186,12 +266,57 @@ class GraphRAG:
         self.community_reports = self.key_string_value_json_storage_cls(
             namespace="community_reports", global_config=asdict(self)
         )
+        self.query_stage_caches = (
+            {
+                stage: WriteBehindKVStorage(
+                    namespace=f"query_stage_{stage}",
+                    global_config=asdict(self),
+                    storage=self.key_string_value_json_storage_cls(
+                        namespace=f"query_stage_{stage}", global_config=asdict(self)
+                    ),
+                )
+                for stage in LOCAL_QUERY_STAGES
+            }
+            if self.enable_query_stage_cache
+            else {}
+        )
+        self.extraction_checkpoints = (
+            WriteBehindKVStorage(
+                namespace="extraction_checkpoints",
+                global_config=asdict(self),
+                storage=self.extraction_checkpoint_storage_cls(
+                    namespace="extraction_checkpoints", global_config=asdict(self)
+                ),
+            )
+            if self.enable_extraction_checkpoint
+            else None
+        )
         self.chunk_entity_relation_graph = self.graph_storage_cls(
             namespace="chunk_entity_relation", global_config=asdict(self)
         )
 
-        self.embedding_func = limit_async_func_call(self.embedding_func_max_async)(
-            self.embedding_func
+        self.embedding_func = single_flight_call(
+            limit_async_func_call(
+                self.embedding_func_max_async,
+                requests_per_minute=self.embedding_func_max_rpm,
+                tokens_per_minute=self.embedding_func_max_tpm,
+                priority_max_size=self.llm_priority_max_async,
+            )(self.embedding_func)
+        )
+        self.query_cache = (
+            SemanticQueryCache(
+                embedding_func=self.embedding_func,
+                similarity_threshold=self.query_cache_similarity_threshold,
+                max_size=self.query_cache_max_size,
+                ttl=self.query_cache_ttl,
+            )
+            if self.enable_query_cache
+            else None
+        )
+        self.entity_time_db = (
+            self.temporal_storage_cls(namespace="entities", global_config=asdict(self))
+            if self.enable_local
+            else None
         )
         self.entities_vdb = (
             self.vector_db_storage_cls(
@@ -213,11 +338,21 @@ class GraphRAG:
             else None
         )
 
-        self.best_model_func = limit_async_func_call(self.best_model_max_async)(
-            partial(self.best_model_func, hashing_kv=self.llm_response_cache)
+        self.best_model_func = single_flight_call(
+            limit_async_func_call(
+                self.best_model_max_async,
+                requests_per_minute=self.best_model_max_rpm,
+                tokens_per_minute=self.best_model_max_tpm,
+                priority_max_size=self.llm_priority_max_async,
+            )(partial(self.best_model_func, hashing_kv=self.llm_response_cache))
         )
-        self.cheap_model_func = limit_async_func_call(self.cheap_model_max_async)(
-            partial(self.cheap_model_func, hashing_kv=self.llm_response_cache)
+        self.cheap_model_func = single_flight_call(
+            limit_async_func_call(
+                self.cheap_model_max_async,
+                requests_per_minute=self.cheap_model_max_rpm,
+                tokens_per_minute=self.cheap_model_max_tpm,
+                priority_max_size=self.llm_priority_max_async,
+            )(partial(self.cheap_model_func, hashing_kv=self.llm_response_cache))
         )
 
     def insert(self, string_or_strings):
@@ -228,11 +363,18 @@ class GraphRAG:
         loop = always_get_an_event_loop()
         return loop.run_until_complete(self.aquery(query, param))
 
+    @llm_caller_scope("query")
+    @llm_priority_scope("interactive")
     async def aquery(self, query: str, param: QueryParam = QueryParam()):
         if param.mode == "local" and not self.enable_local:
             raise ValueError("enable_local is False, cannot query in local mode")
         if param.mode == "naive" and not self.enable_naive_rag:
             raise ValueError("enable_naive_rag is False, cannot query in naive mode")
+        query_context = {}
+        if self.query_cache is not None:
+            cached, cache_state = await self.query_cache.get(query, param)
+            if cached is not None:
+                return cached["response"]
         if param.mode == "local":
             response = await local_query(
                 query,
@@ -242,6 +384,9 @@ class GraphRAG:
                 self.text_chunks,
                 param,
                 asdict(self),
+                entity_time_db=self.entity_time_db,
+                stage_caches=self.query_stage_caches,
+                query_context=query_context,
             )
         elif param.mode == "global":
             response = await global_query(
@@ -252,6 +397,7 @@ class GraphRAG:
                 self.text_chunks,
                 param,
                 asdict(self),
+                query_context=query_context,
             )
         elif param.mode == "naive":
             response = await naive_query(
@@ -260,17 +406,27 @@ class GraphRAG:
                 self.text_chunks,
                 param,
                 asdict(self),
+                query_context=query_context,
             )
         else:
             raise ValueError(f"Unknown mode {param.mode}")
+        if self.query_cache is not None:
+            self.query_cache.put(
+                query, response, cache_state, context=query_context.get("context")
+            )
         await self._query_done()
         return response
 
+    @llm_caller_scope("insert")
+    @llm_priority_scope("indexing")
     async def ainsert(self, string_or_strings):
         await self._insert_start()
         try:
             if isinstance(string_or_strings, str):
                 string_or_strings = [string_or_strings]
+            if self.insert_window_size:
+                await self._ainsert_streaming(string_or_strings)
+                return
             # ---------- new docs
             new_docs = {
                 compute_mdhash_id(c.strip(), prefix="doc-"): {"content": c.strip()}
@@ -310,8 +466,9 @@ class GraphRAG:
                 logger.info("Insert chunks for naive RAG")
                 await self.chunks_vdb.upsert(inserting_chunks)
 
-            # TODO: no incremental update for communities now, so just drop all
-            await self.community_reports.drop()
+            if not self.enable_community_report:
+                # the reports won't be regenerated, don't leave stale ones around
+                await self.community_reports.drop()
 
             # ---------- extract/summary entity and upsert to graph
             logger.info("[Entity Extraction]...")
@@ -321,26 +478,151 @@ class GraphRAG:
                 entity_vdb=self.entities_vdb,
                 global_config=asdict(self),
                 using_amazon_bedrock=self.using_amazon_bedrock,
+                checkpoint_kv=self.extraction_checkpoints,
+                entity_time_db=self.entity_time_db,
             )
             if maybe_new_kg is None:
                 logger.warning("No new entities found")
                 return
             self.chunk_entity_relation_graph = maybe_new_kg
             # ---------- update clusterings of graph
-            logger.info("[Community Report]...")
-            # await self.chunk_entity_relation_graph.clustering(
-            #     self.graph_cluster_algorithm
-            # )
-            # await generate_community_report(
-            #     self.community_reports, self.chunk_entity_relation_graph, asdict(self)
-            # )
+            if self.enable_community_report:
+                logger.info("[Community Report]...")
+                await self.chunk_entity_relation_graph.clustering(
+                    self.graph_cluster_algorithm
+                )
+                await generate_community_report(
+                    self.community_reports, self.chunk_entity_relation_graph, asdict(self)
+                )
 
             # ---------- commit upsertings and indexing
             await self.full_docs.upsert(new_docs)
             await self.text_chunks.upsert(inserting_chunks)
+            if self.extraction_checkpoints is not None:
+                # the chunks are committed, they won't be extracted again
+                await self.extraction_checkpoints.drop()
         finally:
             await self._insert_done()
 
+    async def _ainsert_streaming(self, string_or_strings):
+        """Insert docs window by window. Chunking, extraction and merging run as
+        concurrent stages connected by bounded queues, so a slow stage holds
+        back the ones before it, and each window is committed once merged."""
+        chunked_windows = asyncio.Queue(maxsize=self.insert_max_windows_in_flight)
+        extracted_windows = asyncio.Queue(maxsize=self.insert_max_windows_in_flight)
+        # the built-in extraction funcs merge from the checkpoints, so the
+        # LLM calls of the next window can run while this one is merged
+        prefetch = self.extraction_checkpoints is not None and (
+            self.entity_extraction_func in (extract_entities, custom_extract_entities)
+        )
+        if not self.enable_community_report:
+            await self.community_reports.drop()
+
+        async def chunk_stage():
+            docs = iter(string_or_strings)
+            while True:
+                window = list(islice(docs, self.insert_window_size))
+                if not window:
+                    break
+                new_docs = {
+                    compute_mdhash_id(c.strip(), prefix="doc-"): {"content": c.strip()}
+                    for c in window
+                }
+                _add_doc_keys = await self.full_docs.filter_keys(list(new_docs.keys()))
+                new_docs = {k: v for k, v in new_docs.items() if k in _add_doc_keys}
+                if not len(new_docs):
+                    continue
+                inserting_chunks = get_chunks(
+                    new_docs=new_docs,
+                    chunk_func=self.chunk_func,
+                    overlap_token_size=self.chunk_overlap_token_size,
+                    max_token_size=self.chunk_token_size,
+                )
+                _add_chunk_keys = await self.text_chunks.filter_keys(
+                    list(inserting_chunks.keys())
+                )
+                inserting_chunks = {
+                    k: v for k, v in inserting_chunks.items() if k in _add_chunk_keys
+                }
+                await chunked_windows.put((new_docs, inserting_chunks))
+            await chunked_windows.put(None)
+
+        async def extract_stage():
+            while True:
+                window = await chunked_windows.get()
+                if window is None:
+                    break
+                _, inserting_chunks = window
+                tasks = []
+                if self.enable_naive_rag and inserting_chunks:
+                    tasks.append(self.chunks_vdb.upsert(inserting_chunks))
+                if prefetch and inserting_chunks:
+                    tasks.append(
+                        prefetch_extraction(
+                            inserting_chunks,
+                            self.extraction_checkpoints,
+                            asdict(self),
+                            using_amazon_bedrock=self.using_amazon_bedrock,
+                        )
+                    )
+                await asyncio.gather(*tasks)
+                await extracted_windows.put(window)
+            await extracted_windows.put(None)
+
+        async def commit_stage():
+            committed_docs = 0
+            while True:
+                window = await extracted_windows.get()
+                if window is None:
+                    break
+                new_docs, inserting_chunks = window
+                if inserting_chunks:
+                    maybe_new_kg = await self.entity_extraction_func(
+                        inserting_chunks,
+                        knwoledge_graph_inst=self.chunk_entity_relation_graph,
+                        entity_vdb=self.entities_vdb,
+                        global_config=asdict(self),
+                        using_amazon_bedrock=self.using_amazon_bedrock,
+                        checkpoint_kv=self.extraction_checkpoints,
+                        entity_time_db=self.entity_time_db,
+                    )
+                    if maybe_new_kg is None:
+                        logger.warning("No new entities found")
+                    else:
+                        self.chunk_entity_relation_graph = maybe_new_kg
+                await self.full_docs.upsert(new_docs)
+                await self.text_chunks.upsert(inserting_chunks)
+                if self.extraction_checkpoints is not None:
+                    # only this window, the next ones may be prefetched already
+                    await self.extraction_checkpoints.delete(list(inserting_chunks))
+                await self._insert_done()
+                committed_docs += len(new_docs)
+                logger.info(
+                    f"[Streaming Insert] committed {len(new_docs)} docs, "
+                    f"{len(inserting_chunks)} chunks ({committed_docs} docs so far)"
+                )
+
+        stages = [
+            asyncio.create_task(stage())
+            for stage in (chunk_stage, extract_stage, commit_stage)
+        ]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for stage in stages:
+                stage.cancel()
+
+        if self.extraction_checkpoints is not None:
+            await self.extraction_checkpoints.drop()
+        if self.enable_community_report:
+            logger.info("[Community Report]...")
+            await self.chunk_entity_relation_graph.clustering(
+                self.graph_cluster_algorithm
+            )
+            await generate_community_report(
+                self.community_reports, self.chunk_entity_relation_graph, asdict(self)
+            )
+
     async def _insert_start(self):
         tasks = []
         for storage_inst in [
@@ -352,13 +634,17 @@ class GraphRAG:
         await asyncio.gather(*tasks)
 
     async def _insert_done(self):
+        if self.query_cache is not None:
+            self.query_cache.invalidate()
         tasks = []
         for storage_inst in [
             self.full_docs,
             self.text_chunks,
             self.llm_response_cache,
             self.community_reports,
+            self.extraction_checkpoints,
             self.entities_vdb,
+            self.entity_time_db,
             self.chunks_vdb,
             self.chunk_entity_relation_graph,
         ]:
@@ -369,7 +655,10 @@ class GraphRAG:
 
     async def _query_done(self):
         tasks = []
-        for storage_inst in [self.llm_response_cache]:
+        for storage_inst in [
+            self.llm_response_cache,
+            *self.query_stage_caches.values(),
+        ]:
             if storage_inst is None:
                 continue
             tasks.append(cast(StorageNameSpace, storage_inst).index_done_callback())
@@ -73,114 +73,114 @@ Text: {input_text}
 Output:
 """
 
-# PROMPTS[
-#     "community_report"
-# ] = """-Hoạt động mục tiêu-
-# Bạn là trợ lý AI giúp người phân tích thực hiện khám phá thông tin tổng quát. Khám phá thông tin là quá trình xác định và đánh giá các thông tin liên quan đến các thực thể nhất định (ví dụ: tổ chức và cá nhân) trong một mạng lưới.
-#
-# -Mục tiêu-
-# Viết một báo cáo toàn diện về một cộng đồng, dựa trên danh sách các thực thể thuộc cộng đồng đó cùng với các mối quan hệ và các tuyên bố liên quan (nếu có). Báo cáo này sẽ được sử dụng để cung cấp thông tin cho các nhà quyết định về cộng đồng và tác động tiềm ẩn của nó. Nội dung của báo cáo bao gồm tổng quan về các thực thể chính trong cộng đồng, sự tuân thủ pháp lý, khả năng kỹ thuật, danh tiếng, ý nghĩa lịch sử, ảnh hưởng và các tuyên bố đáng chú ý.
-#
-# -Cấu trúc báo cáo-
-#
-# Báo cáo sẽ bao gồm các phần sau:
-#
-# - TITLE: Tên cộng đồng đại diện cho các thực thể chính – tiêu đề ngắn gọn nhưng cụ thể. Khi có thể, bao gồm các thực thể đã được đặt tên đại diện trong tiêu đề.
-# - SUMMARY: Tóm tắt tổng quan về cấu trúc cộng đồng, cách các thực thể liên kết với nhau và thông tin đáng chú ý liên quan đến các thực thể.
-# - IMPACT SEVERITY RATING: Điểm số từ 0-10 thể hiện mức độ nghiêm trọng của tác động từ các thực thể trong cộng đồng. IMPACT là mức độ quan trọng của cộng đồng.
-# - RATING EXPLANATION: Giải thích một câu về điểm số mức độ tác động.
-# - DETAILED FINDINGS: Danh sách 5-10 thông tin quan trọng về cộng đồng. Mỗi thông tin có tóm tắt ngắn gọn và theo sau là nhiều đoạn văn giải thích chi tiết căn cứ theo các quy tắc dưới đây.
-#
-# Trả về kết quả dưới dạng chuỗi JSON được định dạng chính xác như sau:
-#
-#     {{
-#         "title": <report_title>,
-#         "summary": <executive_summary>,
-#         "rating": <impact_severity_rating>,
-#         "rating_explanation": <rating_explanation>,
-#         "findings": [
-#             {{
-#                 "summary":<insight_1_summary>,
-#                 "explanation": <insight_1_explanation>
-#             }},
-#             {{
-#                 "summary":<insight_2_summary>,
-#                 "explanation": <insight_2_explanation>
-#             }}
-#             ...
-#         ]
-#     }}
-#
-# -Các quy tắc-
-#
-# Các điểm được hỗ trợ bởi dữ liệu nên liệt kê các tài liệu tham khảo của chúng như sau:
-#
-# "Câu này là ví dụ được hỗ trợ bởi nhiều tài liệu tham khảo dữ liệu [Dữ liệu: <tên bộ dữ liệu> (mã bản ghi); <tên bộ dữ liệu> (mã bản ghi)]."
-#
-# Không liệt kê quá 5 mã bản ghi trong một tài liệu tham khảo. Thay vào đó, liệt kê 5 mã bản ghi có liên quan nhất và thêm "+more" để chỉ rằng còn nhiều hơn.
-#
-# Ví dụ: "Người X là chủ sở hữu của Công ty Y và đối mặt với nhiều tuyên bố sai phạm [Dữ liệu: Báo cáo (1), Thực thể (5, 7); Quan hệ (23); Các tuyên bố (7, 2, 34, 64, 46, +more)]."
-#
-# Trong đó, 1, 5, 7, 23, 2, 34, 46, và 64 là các mã bản ghi (không phải chỉ số).
-#
-# Không bao gồm thông tin nếu không có chứng cứ hỗ trợ.
-#
-# -Ví dụ đầu vào-
-#
-# Văn bản:
-#
-# Thực thể
-#
-# id, entity, description
-# 5, VERDANT OASIS PLAZA, Verdant Oasis Plaza là địa điểm của Unity March
-# 6, HARMONY ASSEMBLY, Harmony Assembly là tổ chức tổ chức cuộc diễu hành tại Verdant Oasis Plaza
-#
-# Quan hệ
-#
-# id, source, target, description
-# 37, VERDANT OASIS PLAZA, UNITY MARCH, Verdant Oasis Plaza là địa điểm của Unity March
-# 38, VERDANT OASIS PLAZA, HARMONY ASSEMBLY, Harmony Assembly tổ chức cuộc diễu hành tại Verdant Oasis Plaza
-# 39, VERDANT OASIS PLAZA, UNITY MARCH, Unity March diễn ra tại Verdant Oasis Plaza
-# 40, VERDANT OASIS PLAZA, TRIBUNE SPOTLIGHT, Tribune Spotlight đang đưa tin về cuộc diễu hành tại Verdant Oasis Plaza
-# 41, VERDANT OASIS PLAZA, BAILEY ASADI, Bailey Asadi đang phát biểu tại Verdant Oasis Plaza về cuộc diễu hành
-# 43, HARMONY ASSEMBLY, UNITY MARCH, Harmony Assembly tổ chức Unity March
-#
-# Đầu ra:
-#
-# {{
-#     "title": "Verdant Oasis Plaza và Unity March",
-#     "summary": "Cộng đồng xoay quanh Verdant Oasis Plaza, nơi diễn ra Unity March. Plaza có các mối quan hệ với Harmony Assembly, Unity March và Tribune Spotlight, tất cả đều liên quan đến sự kiện diễu hành.",
-#     "rating": 5.0,
-#     "rating_explanation": "Mức độ tác động trung bình do tiềm năng gây bất ổn hoặc xung đột trong Unity March.",
-#     "findings": [
-#         {{
-#             "summary": "Verdant Oasis Plaza là địa điểm trung tâm",
-#             "explanation": "Verdant Oasis Plaza là thực thể trung tâm trong cộng đồng này, phục vụ như địa điểm tổ chức Unity March. Plaza là mối liên kết chung giữa các thực thể khác, cho thấy tầm quan trọng của nó trong cộng đồng. Sự kết hợp của plaza với cuộc diễu hành có thể dẫn đến các vấn đề như trật tự công cộng hoặc xung đột, tùy thuộc vào tính chất của cuộc diễu hành và phản ứng của cộng đồng. [Data: Entities (5), Relationships (37, 38, 39, 40, 41, +more)]"
-#         }},
-#         {{
-#             "summary": "Vai trò của Harmony Assembly trong cộng đồng",
-#             "explanation": "Harmony Assembly là thực thể quan trọng trong cộng đồng này, là tổ chức tổ chức Unity March tại Verdant Oasis Plaza. Tính chất của Harmony Assembly và cuộc diễu hành của họ có thể là nguồn nguy cơ, tùy vào mục tiêu của họ và phản ứng mà nó gây ra. Quan hệ giữa Harmony Assembly và plaza là yếu tố quan trọng trong việc hiểu được động lực cộng đồng. [Data: Entities (6), Relationships (38, 43)]"
-#         }},
-#         {{
-#             "summary": "Unity March là sự kiện quan trọng",
-#             "explanation": "Unity March là một sự kiện quan trọng diễn ra tại Verdant Oasis Plaza. Sự kiện này là yếu tố quan trọng trong động lực cộng đồng và có thể là nguồn nguy cơ, tùy thuộc vào tính chất của cuộc diễu hành và phản ứng mà nó gây ra. Quan hệ giữa cuộc diễu hành và plaza là yếu tố quan trọng trong việc hiểu cộng đồng này. [Data: Relationships (39)]"
-#         }},
-#         {{
-#             "summary": "Vai trò của Tribune Spotlight",
-#             "explanation": "Tribune Spotlight đang đưa tin về Unity March diễn ra tại Verdant Oasis Plaza. Điều này cho thấy sự kiện đã thu hút sự chú ý của truyền thông, điều này có thể làm tăng tác động của nó đối với cộng đồng. Vai trò của Tribune Spotlight có thể quan trọng trong việc định hình nhận thức của công chúng về sự kiện và các thực thể liên quan. [Data: Relationships (40)]"
-#         }}
-#     ]
-# }}
-#
-# # Dữ liệu thực
-#
-# Sử dụng văn bản sau cho câu trả lời của bạn. Không bịa ra bất cứ điều gì trong câu trả lời của bạn.
-#
-# Text:
-# {input_text}
-# Output:
-#
-# """
+PROMPTS[
+    "community_report"
+] = """-Hoạt động mục tiêu-
+Bạn là trợ lý AI giúp người phân tích thực hiện khám phá thông tin tổng quát. Khám phá thông tin là quá trình xác định và đánh giá các thông tin liên quan đến các thực thể nhất định (ví dụ: tổ chức và cá nhân) trong một mạng lưới.
+
+-Mục tiêu-
+Viết một báo cáo toàn diện về một cộng đồng, dựa trên danh sách các thực thể thuộc cộng đồng đó cùng với các mối quan hệ và các tuyên bố liên quan (nếu có). Báo cáo này sẽ được sử dụng để cung cấp thông tin cho các nhà quyết định về cộng đồng và tác động tiềm ẩn của nó. Nội dung của báo cáo bao gồm tổng quan về các thực thể chính trong cộng đồng, sự tuân thủ pháp lý, khả năng kỹ thuật, danh tiếng, ý nghĩa lịch sử, ảnh hưởng và các tuyên bố đáng chú ý.
+
+-Cấu trúc báo cáo-
+
+Báo cáo sẽ bao gồm các phần sau:
+
+- TITLE: Tên cộng đồng đại diện cho các thực thể chính – tiêu đề ngắn gọn nhưng cụ thể. Khi có thể, bao gồm các thực thể đã được đặt tên đại diện trong tiêu đề.
+- SUMMARY: Tóm tắt tổng quan về cấu trúc cộng đồng, cách các thực thể liên kết với nhau và thông tin đáng chú ý liên quan đến các thực thể.
+- IMPACT SEVERITY RATING: Điểm số từ 0-10 thể hiện mức độ nghiêm trọng của tác động từ các thực thể trong cộng đồng. IMPACT là mức độ quan trọng của cộng đồng.
+- RATING EXPLANATION: Giải thích một câu về điểm số mức độ tác động.
+- DETAILED FINDINGS: Danh sách 5-10 thông tin quan trọng về cộng đồng. Mỗi thông tin có tóm tắt ngắn gọn và theo sau là nhiều đoạn văn giải thích chi tiết căn cứ theo các quy tắc dưới đây.
+
+Trả về kết quả dưới dạng chuỗi JSON được định dạng chính xác như sau:
+
+    {{
+        "title": <report_title>,
+        "summary": <executive_summary>,
+        "rating": <impact_severity_rating>,
+        "rating_explanation": <rating_explanation>,
+        "findings": [
+            {{
+                "summary":<insight_1_summary>,
+                "explanation": <insight_1_explanation>
+            }},
+            {{
+                "summary":<insight_2_summary>,
+                "explanation": <insight_2_explanation>
+            }}
+            ...
+        ]
+    }}
+
+-Các quy tắc-
+
+Các điểm được hỗ trợ bởi dữ liệu nên liệt kê các tài liệu tham khảo của chúng như sau:
+
+"Câu này là ví dụ được hỗ trợ bởi nhiều tài liệu tham khảo dữ liệu [Dữ liệu: <tên bộ dữ liệu> (mã bản ghi); <tên bộ dữ liệu> (mã bản ghi)]."
+
+Không liệt kê quá 5 mã bản ghi trong một tài liệu tham khảo. Thay vào đó, liệt kê 5 mã bản ghi có liên quan nhất và thêm "+more" để chỉ rằng còn nhiều hơn.
+
+Ví dụ: "Người X là chủ sở hữu của Công ty Y và đối mặt với nhiều tuyên bố sai phạm [Dữ liệu: Báo cáo (1), Thực thể (5, 7); Quan hệ (23); Các tuyên bố (7, 2, 34, 64, 46, +more)]."
+
+Trong đó, 1, 5, 7, 23, 2, 34, 46, và 64 là các mã bản ghi (không phải chỉ số).
+
+Không bao gồm thông tin nếu không có chứng cứ hỗ trợ.
+
+-Ví dụ đầu vào-
+
+Văn bản:
+
+Thực thể
+
+id, entity, description
+5, VERDANT OASIS PLAZA, Verdant Oasis Plaza là địa điểm của Unity March
+6, HARMONY ASSEMBLY, Harmony Assembly là tổ chức tổ chức cuộc diễu hành tại Verdant Oasis Plaza
+
+Quan hệ
+
+id, source, target, description
+37, VERDANT OASIS PLAZA, UNITY MARCH, Verdant Oasis Plaza là địa điểm của Unity March
+38, VERDANT OASIS PLAZA, HARMONY ASSEMBLY, Harmony Assembly tổ chức cuộc diễu hành tại Verdant Oasis Plaza
+39, VERDANT OASIS PLAZA, UNITY MARCH, Unity March diễn ra tại Verdant Oasis Plaza
+40, VERDANT OASIS PLAZA, TRIBUNE SPOTLIGHT, Tribune Spotlight đang đưa tin về cuộc diễu hành tại Verdant Oasis Plaza
+41, VERDANT OASIS PLAZA, BAILEY ASADI, Bailey Asadi đang phát biểu tại Verdant Oasis Plaza về cuộc diễu hành
+43, HARMONY ASSEMBLY, UNITY MARCH, Harmony Assembly tổ chức Unity March
+
+Đầu ra:
+
+{{
+    "title": "Verdant Oasis Plaza và Unity March",
+    "summary": "Cộng đồng xoay quanh Verdant Oasis Plaza, nơi diễn ra Unity March. Plaza có các mối quan hệ với Harmony Assembly, Unity March và Tribune Spotlight, tất cả đều liên quan đến sự kiện diễu hành.",
+    "rating": 5.0,
+    "rating_explanation": "Mức độ tác động trung bình do tiềm năng gây bất ổn hoặc xung đột trong Unity March.",
+    "findings": [
+        {{
+            "summary": "Verdant Oasis Plaza là địa điểm trung tâm",
+            "explanation": "Verdant Oasis Plaza là thực thể trung tâm trong cộng đồng này, phục vụ như địa điểm tổ chức Unity March. Plaza là mối liên kết chung giữa các thực thể khác, cho thấy tầm quan trọng của nó trong cộng đồng. Sự kết hợp của plaza với cuộc diễu hành có thể dẫn đến các vấn đề như trật tự công cộng hoặc xung đột, tùy thuộc vào tính chất của cuộc diễu hành và phản ứng của cộng đồng. [Data: Entities (5), Relationships (37, 38, 39, 40, 41, +more)]"
+        }},
+        {{
+            "summary": "Vai trò của Harmony Assembly trong cộng đồng",
+            "explanation": "Harmony Assembly là thực thể quan trọng trong cộng đồng này, là tổ chức tổ chức Unity March tại Verdant Oasis Plaza. Tính chất của Harmony Assembly và cuộc diễu hành của họ có thể là nguồn nguy cơ, tùy vào mục tiêu của họ và phản ứng mà nó gây ra. Quan hệ giữa Harmony Assembly và plaza là yếu tố quan trọng trong việc hiểu được động lực cộng đồng. [Data: Entities (6), Relationships (38, 43)]"
+        }},
+        {{
+            "summary": "Unity March là sự kiện quan trọng",
+            "explanation": "Unity March là một sự kiện quan trọng diễn ra tại Verdant Oasis Plaza. Sự kiện này là yếu tố quan trọng trong động lực cộng đồng và có thể là nguồn nguy cơ, tùy thuộc vào tính chất của cuộc diễu hành và phản ứng mà nó gây ra. Quan hệ giữa cuộc diễu hành và plaza là yếu tố quan trọng trong việc hiểu cộng đồng này. [Data: Relationships (39)]"
+        }},
+        {{
+            "summary": "Vai trò của Tribune Spotlight",
+            "explanation": "Tribune Spotlight đang đưa tin về Unity March diễn ra tại Verdant Oasis Plaza. Điều này cho thấy sự kiện đã thu hút sự chú ý của truyền thông, điều này có thể làm tăng tác động của nó đối với cộng đồng. Vai trò của Tribune Spotlight có thể quan trọng trong việc định hình nhận thức của công chúng về sự kiện và các thực thể liên quan. [Data: Relationships (40)]"
+        }}
+    ]
+}}
+
+# Dữ liệu thực
+
+Sử dụng văn bản sau cho câu trả lời của bạn. Không bịa ra bất cứ điều gì trong câu trả lời của bạn.
+
+Text:
+{input_text}
+Output:
+
+"""
 
 PROMPTS[
     "entity_extraction"
@@ -278,6 +278,16 @@ Kết quả:
 #######
 Output:
 
+"""
+PROMPTS[
+    "entity_resolution_confirm"
+] = """Bạn là một trợ lý hữu ích có nhiệm vụ gom nhóm các thực thể lịch sử giống nhau.
+Hai thực thể dưới đây có phải là cùng một thực thể nhưng được diễn đạt bằng các cách khác nhau hay không?
+Thực thể 1: {entity_a}
+Mô tả: {description_a}
+Thực thể 2: {entity_b}
+Mô tả: {description_b}
+Chỉ trả lời "yes" hoặc "no".
 """
 PROMPTS[
     "time_extraction"
@@ -0,0 +1,241 @@
+import os
+import shutil
+import pytest
+import numpy as np
+import json
+from nano_graphrag import GraphRAG
+from nano_graphrag._storage import CSRGraphStorage, NetworkXStorage
+from nano_graphrag._utils import wrap_embedding_func_with_attrs
+
+WORKING_DIR = "./tests/nano_graphrag_cache_csr_graph_storage_test"
+
+
+@pytest.fixture(scope="function")
+def setup_teardown():
+    if os.path.exists(WORKING_DIR):
+        shutil.rmtree(WORKING_DIR)
+    os.mkdir(WORKING_DIR)
+
+    yield
+
+    shutil.rmtree(WORKING_DIR)
+
+
+@wrap_embedding_func_with_attrs(embedding_dim=384, max_token_size=8192)
+async def mock_embedding(texts: list[str]) -> np.ndarray:
+    return np.random.rand(len(texts), 384)
+
+
+@pytest.fixture
+def csr_storage(setup_teardown):
+    rag = GraphRAG(working_dir=WORKING_DIR, embedding_func=mock_embedding)
+    return CSRGraphStorage(
+        namespace="test",
+        global_config=rag.__dict__,
+    )
+
+
+async def build_star(storage, merged: bool):
+    await storage.upsert_node("center", {"entity_type": "PERSON"})
+    for i in range(3):
+        await storage.upsert_edge("center", f"neighbor{i}", {"weight": float(i)})
+    await storage.upsert_edge("center", "center", {"weight": 9.0})
+    if merged:
+        await storage.index_done_callback()
+
+
+@pytest.mark.parametrize("merged", [False, True])
+@pytest.mark.asyncio
+async def test_reads_before_and_after_merge(csr_storage, merged):
+    await build_star(csr_storage, merged)
+
+    assert await csr_storage.has_node("neighbor0")
+    assert await csr_storage.get_node("center") == {"entity_type": "PERSON"}
+    assert await csr_storage.get_node("neighbor0") == {}
+    assert await csr_storage.has_edge("neighbor1", "center")
+    assert await csr_storage.get_edge("neighbor2", "center") == {"weight": 2.0}
+    # a self-loop counts twice, same as networkx
+    assert await csr_storage.node_degree("center") == 5
+    assert await csr_storage.edge_degree("center", "neighbor0") == 6
+    assert set(await csr_storage.get_node_edges("center")) == {
+        ("center", "center"),
+        ("center", "neighbor0"),
+        ("center", "neighbor1"),
+        ("center", "neighbor2"),
+    }
+
+
+@pytest.mark.asyncio
+async def test_upsert_over_merged_graph(csr_storage):
+    await build_star(csr_storage, merged=True)
+    await csr_storage.upsert_node("center", {"description": "x"})
+    await csr_storage.upsert_edge("neighbor0", "center", {"description": "y"})
+    await csr_storage.upsert_edge("neighbor0", "neighbor1", {})
+
+    assert await csr_storage.get_node("center") == {
+        "entity_type": "PERSON",
+        "description": "x",
+    }
+    assert await csr_storage.get_edge("center", "neighbor0") == {
+        "weight": 0.0,
+        "description": "y",
+    }
+    assert await csr_storage.node_degree("center") == 5
+    assert await csr_storage.node_degree("neighbor0") == 2
+
+    await csr_storage.index_done_callback()
+    assert await csr_storage.node_degree("neighbor0") == 2
+    assert await csr_storage.get_edge("neighbor1", "neighbor0") == {}
+
+
+@pytest.mark.asyncio
+async def test_nonexistent_node_and_edge(csr_storage):
+    assert await csr_storage.has_node("nonexistent") is False
+    assert await csr_storage.has_edge("node1", "node2") is False
+    assert await csr_storage.get_node("nonexistent") is None
+    assert await csr_storage.get_edge("node1", "node2") is None
+    assert await csr_storage.get_node_edges("nonexistent") is None
+    assert await csr_storage.node_degree("nonexistent") == 0
+    assert await csr_storage.edge_degree("node1", "node2") == 0
+
+
+@pytest.mark.asyncio
+async def test_snapshot_interop_with_networkx(csr_storage):
+    nx_storage = NetworkXStorage(
+        namespace="test", global_config=csr_storage.global_config
+    )
+    await nx_storage.upsert_node("NĂM 1945", {"entity_type": "SỰ KIỆN"})
+    await nx_storage.upsert_node("HỒ CHÍ MINH", {"entity_type": "NGƯỜI", "flag": True})
+    await nx_storage.upsert_edge("NĂM 1945", "HỒ CHÍ MINH", {"weight": 2.5, "order": 1})
+    await nx_storage.index_done_callback()
+
+    storage = CSRGraphStorage(namespace="test", global_config=csr_storage.global_config)
+    assert await storage.get_node("HỒ CHÍ MINH") == {"entity_type": "NGƯỜI", "flag": True}
+    assert await storage.get_edge("HỒ CHÍ MINH", "NĂM 1945") == {"weight": 2.5, "order": 1}
+
+    await storage.upsert_edge("HỒ CHÍ MINH", "VIỆT MINH", {"weight": 1.0})
+    await storage.index_done_callback()
+    reloaded = NetworkXStorage(namespace="test", global_config=csr_storage.global_config)
+    assert await reloaded.get_edge("VIỆT MINH", "HỒ CHÍ MINH") == {"weight": 1.0}
+    assert await reloaded.node_degree("HỒ CHÍ MINH") == 2
+
+
+@pytest.mark.asyncio
+async def test_community_schema_matches_networkx(csr_storage):
+    nx_storage = NetworkXStorage(
+        namespace="test_nx", global_config=csr_storage.global_config
+    )
+    for storage in (csr_storage, nx_storage):
+        await storage.upsert_node("node1", {"source_id": "chunk1", "clusters": json.dumps([{"level": 0, "cluster": "0"}, {"level": 1, "cluster": "1"}])})
+        await storage.upsert_node("node2", {"source_id": "chunk2", "clusters": json.dumps([{"level": 0, "cluster": "0"}, {"level": 1, "cluster": "2"}])})
+        await storage.upsert_node("node3", {"source_id": "chunk3"})
+        await storage.upsert_edge("node1", "node2", {})
+        await storage.upsert_edge("node2", "node3", {})
+
+    def normalize(schema):
+        return {
+            k: {**v, "edges": sorted(map(tuple, v["edges"])), "nodes": sorted(v["nodes"]),
+                "chunk_ids": sorted(v["chunk_ids"]), "sub_communities": sorted(v["sub_communities"])}
+            for k, v in schema.items()
+        }
+
+    assert normalize(await csr_storage.community_schema()) == normalize(
+        await nx_storage.community_schema()
+    )
+
+
+@pytest.mark.asyncio
+async def test_clustering(csr_storage):
+    for i in range(10):
+        await csr_storage.upsert_node(f"NODE{i}", {"source_id": f"chunk{i}"})
+    for i in range(9):
+        await csr_storage.upsert_edge(f"NODE{i}", f"NODE{i+1}", {})
+
+    await csr_storage.clustering(algorithm="leiden")
+    community_schema = await csr_storage.community_schema()
+    assert len(community_schema) > 0
+    assert sum(len(c["nodes"]) for c in community_schema.values() if c["level"] == 0) == 10
+
+    with pytest.raises(ValueError, match="Clustering algorithm invalid_algo not supported"):
+        await csr_storage.clustering("invalid_algo")
+
+
+@pytest.mark.parametrize("merged", [False, True])
+@pytest.mark.asyncio
+async def test_batch_reads_match_single_reads(csr_storage, merged):
+    await build_star(csr_storage, merged)
+    node_ids = ["neighbor1", "missing", "center"]
+    edge_pairs = [("neighbor0", "center"), ("center", "missing")]
+
+    assert await csr_storage.get_nodes(node_ids) == [
+        await csr_storage.get_node(n) for n in node_ids
+    ]
+    assert await csr_storage.node_degrees(node_ids) == [1, 0, 5]
+    assert await csr_storage.get_edges(edge_pairs) == [{"weight": 0.0}, None]
+    assert await csr_storage.edge_degrees(edge_pairs) == [6, 5]
+    assert await csr_storage.get_nodes_edges(node_ids) == [
+        await csr_storage.get_node_edges(n) for n in node_ids
+    ]
+
+
+@pytest.mark.asyncio
+async def test_community_schema_is_cached_per_graph_version(csr_storage):
+    await csr_storage.upsert_node("node1", {"source_id": "chunk1", "clusters": json.dumps([{"level": 0, "cluster": "0"}])})
+    schema = await csr_storage.community_schema()
+    assert csr_storage._community_schema is not None
+
+    await csr_storage.upsert_edge("node1", "node2", {})
+    assert csr_storage._community_schema is None
+    # nothing asked for the new schema, it isn't built for the snapshot
+    await csr_storage.index_done_callback()
+    assert csr_storage._community_schema is None
+    reloaded = CSRGraphStorage(namespace="test", global_config=csr_storage.global_config)
+    assert reloaded._community_schema is None
+
+    await csr_storage.community_schema()
+    await csr_storage.index_done_callback()
+    reloaded = CSRGraphStorage(namespace="test", global_config=csr_storage.global_config)
+    assert reloaded._community_schema == await csr_storage.community_schema()
+    assert schema["0"]["edges"] == []
+    assert reloaded._community_schema["0"]["edges"] == [["node1", "node2"]]
+
+
+@pytest.mark.asyncio
+async def test_community_schema_skips_missing_source_ids(csr_storage):
+    clusters = json.dumps([{"level": 0, "cluster": "0"}])
+    await csr_storage.upsert_node("node1", {"clusters": clusters})
+    schema = await csr_storage.community_schema()
+    assert schema["0"]["nodes"] == ["node1"]
+    assert schema["0"]["chunk_ids"] == []
+
+    await csr_storage.upsert_node("node2", {"source_id": "chunk2", "clusters": clusters})
+    schema = await csr_storage.community_schema()
+    assert schema["0"]["chunk_ids"] == ["chunk2"]
+    assert schema["0"]["occurrence"] == 1.0
+
+
+@pytest.mark.asyncio
+async def test_float_attributes_are_arrays(csr_storage):
+    await build_star(csr_storage, merged=True)
+    weights = csr_storage._edge_columns["weight"]
+    assert isinstance(weights, np.ndarray) and weights.dtype == np.float64
+    assert isinstance(csr_storage._node_columns["entity_type"], list)
+
+    await csr_storage.upsert_edge("neighbor0", "neighbor1", {"description": "x"})
+    await csr_storage.index_done_callback()
+    assert isinstance(csr_storage._edge_columns["weight"], np.ndarray)
+    assert await csr_storage.get_edge("neighbor1", "neighbor0") == {"description": "x"}
+    assert await csr_storage.get_edge("neighbor0", "center") == {"weight": 0.0}
+
+    # a value that isn't a float turns the column back into a list
+    await csr_storage.upsert_edge("neighbor0", "neighbor1", {"weight": "heavy"})
+    await csr_storage.index_done_callback()
+    assert isinstance(csr_storage._edge_columns["weight"], list)
+    assert await csr_storage.get_edge("neighbor1", "neighbor0") == {
+        "description": "x",
+        "weight": "heavy",
+    }
+
+    reloaded = CSRGraphStorage(namespace="test", global_config=csr_storage.global_config)
+    assert await reloaded.get_edge("neighbor2", "center") == {"weight": 2.0}
+    assert await reloaded.get_edge("center", "center") == {"weight": 9.0}
@@ -0,0 +1,150 @@
+import numpy as np
+import pytest
+from nano_graphrag._entity_resolution import (
+    UnionFind,
+    block_entity_names,
+    normalize_entity_names,
+    resolve_entities,
+)
+from nano_graphrag._utils import wrap_embedding_func_with_attrs
+
+NAMES = {
+    "HỒ CHÍ MINH": "Lãnh tụ",
+    "CHỦ TỊCH HỒ CHÍ MINH": "Chủ tịch nước Việt Nam Dân chủ Cộng hòa",
+    "HỘI NGHỊ I-AN-TA": "Hội nghị năm 1945",
+    "Hội nghị I an ta": "Hội nghị năm 1945",
+    "NAM TRIỀU TIÊN": "Phía nam bán đảo Triều Tiên",
+    "BẮC TRIỀU TIÊN": "Phía bắc bán đảo Triều Tiên",
+    "LIÊN XÔ": "Liên bang Xô viết",
+}
+
+
+def make_config(**kwargs):
+    return {
+        "entity_resolution_similarity": "ngram",
+        "entity_resolution_merge_threshold": 0.9,
+        "entity_resolution_ambiguous_threshold": 0.6,
+        "entity_resolution_llm_confirm": True,
+        "entity_resolution_max_block_size": 256,
+        **kwargs,
+    }
+
+
+def test_normalize_and_block():
+    normalized = normalize_entity_names(["Hội nghị I-an-ta", "  (ASEAN) "])
+    assert normalized == ["HỘI NGHỊ I AN TA", "ASEAN"]
+
+    blocks = block_entity_names(
+        normalize_entity_names(["HỒ CHÍ MINH", "CHỦ TỊCH HỒ CHÍ MINH", "LIÊN XÔ"]),
+        max_block_size=256,
+    )
+    assert blocks == [[0, 1]]
+    assert block_entity_names(["A B", "A C", "A D"], max_block_size=2) == []
+
+
+def test_union_find():
+    union_find = UnionFind(4)
+    union_find.union(0, 1)
+    union_find.union(2, 1)
+    assert union_find.find(0) == union_find.find(2) != union_find.find(3)
+
+
+@pytest.mark.asyncio
+async def test_llm_confirms_only_ambiguous_pairs():
+    asked = []
+
+    async def judge(prompt, **kwargs):
+        asked.append(prompt)
+        return "yes" if "CHỦ TỊCH HỒ CHÍ MINH" in prompt else "no"
+
+    groups = await resolve_entities(NAMES, make_config(cheap_model_func=judge))
+    assert groups == {
+        "CHỦ TỊCH HỒ CHÍ MINH": ["HỒ CHÍ MINH"],
+        "Hội nghị I an ta": ["HỘI NGHỊ I-AN-TA"],
+    }
+    # the equal names are merged without asking, the unrelated ones never asked
+    assert len(asked) == 2
+    assert not any("LIÊN XÔ" in prompt for prompt in asked)
+
+    asked.clear()
+    groups = await resolve_entities(
+        NAMES, make_config(cheap_model_func=judge, entity_resolution_llm_confirm=False)
+    )
+    assert groups == {"Hội nghị I an ta": ["HỘI NGHỊ I-AN-TA"]}
+    assert asked == []
+
+
+@pytest.mark.asyncio
+async def test_embedding_similarity():
+    @wrap_embedding_func_with_attrs(embedding_dim=2, max_token_size=8192)
+    async def embed(texts):
+        return np.array([[1.0, 0.0] if "MINH" in t else [0.0, 1.0] for t in texts])
+
+    groups = await resolve_entities(
+        NAMES,
+        make_config(
+            entity_resolution_similarity="embedding",
+            entity_resolution_llm_confirm=False,
+            embedding_func=embed,
+            embedding_batch_num=2,
+        ),
+    )
+    # the Triều Tiên pair shares a block and a vector too
+    assert groups["CHỦ TỊCH HỒ CHÍ MINH"] == ["HỒ CHÍ MINH"]
+    assert sorted(map(len, groups.values())) == [1, 1, 1]
+
+    with pytest.raises(ValueError):
+        await resolve_entities(NAMES, make_config(entity_resolution_similarity="bm25"))
+
+
+@pytest.mark.asyncio
+async def test_names_with_other_numbers_are_not_merged():
+    asked = []
+
+    async def judge(prompt, **kwargs):
+        asked.append(prompt)
+        return "yes"
+
+    names = {
+        "ĐẠI HỘI ĐẢNG LẦN THỨ II": "Đại hội năm 1951",
+        "ĐẠI HỘI ĐẢNG LẦN THỨ III": "Đại hội năm 1960",
+        "HỘI NGHỊ TRUNG ƯƠNG THÁNG 7 - 1936": "Hội nghị năm 1936",
+        "HỘI NGHỊ TRUNG ƯƠNG THÁNG 11 - 1939": "Hội nghị năm 1939",
+        "NĂM 1930": "Năm thành lập Đảng",
+        "NĂM 1931": "Năm cao trào Xô viết Nghệ - Tĩnh",
+    }
+    for llm_confirm in (True, False):
+        assert (
+            await resolve_entities(
+                names,
+                make_config(
+                    cheap_model_func=judge, entity_resolution_llm_confirm=llm_confirm
+                ),
+            )
+            == {}
+        )
+    assert asked == []
+
+
+@pytest.mark.asyncio
+async def test_number_on_one_side_is_left_to_the_llm():
+    asked = []
+
+    async def judge(prompt, **kwargs):
+        asked.append(prompt)
+        return "yes"
+
+    names = {
+        "ĐẢNG CỘNG SẢN VIỆT NAM": "Đảng cầm quyền",
+        "ĐẢNG CỘNG SẢN VIỆT NAM 1930": "Đảng thành lập năm 1930",
+    }
+    groups = await resolve_entities(names, make_config(cheap_model_func=judge))
+    assert len(asked) == 1
+    assert groups == {"ĐẢNG CỘNG SẢN VIỆT NAM 1930": ["ĐẢNG CỘNG SẢN VIỆT NAM"]}
+    assert (
+        await resolve_entities(
+            names,
+            make_config(cheap_model_func=judge, entity_resolution_llm_confirm=False),
+        )
+        == {}
+    )
@@ -0,0 +1,108 @@
+import os
+import json
+import shutil
+import pytest
+from nano_graphrag._storage import JsonKVStorage
+from nano_graphrag._utils import load_json, write_json
+
+WORKING_DIR = "./tests/nano_graphrag_cache_json_kv_storage_test"
+
+
+@pytest.fixture(scope="function")
+def setup_teardown():
+    if os.path.exists(WORKING_DIR):
+        shutil.rmtree(WORKING_DIR)
+    os.mkdir(WORKING_DIR)
+
+    yield
+
+    shutil.rmtree(WORKING_DIR)
+
+
+def make_storage(lazy=False):
+    return JsonKVStorage(
+        namespace="test",
+        global_config={
+            "working_dir": WORKING_DIR,
+            "key_string_value_json_storage_cls_kwargs": {"lazy": lazy},
+        },
+    )
+
+
+DATA = {
+    "chunk-1": {"content": "Năm 1936,\n\"ủy ban hành động\"", "tokens": 12},
+    "chunk-2": {"content": "Xuân 1975", "nested": {"a": [1, 2, {}], "b": []}},
+    "chunk-3": {},
+}
+
+
+@pytest.mark.asyncio
+async def test_file_format_is_unchanged(setup_teardown):
+    storage = make_storage()
+    await storage.upsert(DATA)
+    await storage.index_done_callback()
+
+    with open(storage._file_name, encoding="utf-8") as f:
+        written = f.read()
+    assert written == json.dumps(DATA, indent=2, ensure_ascii=False)
+
+
+@pytest.mark.asyncio
+async def test_lazy_reads_values_on_demand(setup_teardown):
+    storage = make_storage()
+    await storage.upsert(DATA)
+    await storage.index_done_callback()
+
+    lazy = make_storage(lazy=True)
+    assert lazy._data == {}
+    assert sorted(await lazy.all_keys()) == sorted(DATA)
+    assert await lazy.filter_keys(["chunk-1", "chunk-4"]) == {"chunk-4"}
+    assert await lazy.get_by_id("chunk-2") == DATA["chunk-2"]
+    assert list(lazy._data) == ["chunk-2"]
+    assert await lazy.get_by_ids(["chunk-1", "chunk-4"], fields={"tokens"}) == [
+        {"tokens": 12},
+        None,
+    ]
+
+
+@pytest.mark.asyncio
+async def test_lazy_rebuilds_stale_index(setup_teardown):
+    write_json(DATA, os.path.join(WORKING_DIR, "kv_store_test.json"))
+
+    lazy = make_storage(lazy=True)
+    assert await lazy.get_by_ids(list(DATA)) == list(DATA.values())
+    assert os.path.exists(lazy._index_file_name)
+
+
+@pytest.mark.asyncio
+async def test_lazy_upsert_keeps_untouched_values(setup_teardown):
+    storage = make_storage()
+    await storage.upsert(DATA)
+    await storage.index_done_callback()
+
+    lazy = make_storage(lazy=True)
+    await lazy.upsert({"chunk-1": {"content": "1930-1931"}, "chunk-4": {"v": 4}})
+    await lazy.index_done_callback()
+
+    expected = {**DATA, "chunk-1": {"content": "1930-1931"}, "chunk-4": {"v": 4}}
+    assert load_json(lazy._file_name) == expected
+    reloaded = make_storage(lazy=True)
+    assert await reloaded.get_by_ids(list(expected)) == list(expected.values())
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+@pytest.mark.asyncio
+async def test_delete(setup_teardown, lazy):
+    storage = make_storage()
+    await storage.upsert(DATA)
+    await storage.index_done_callback()
+
+    storage = make_storage(lazy=lazy)
+    await storage.delete(["chunk-1", "missing"])
+    assert await storage.get_by_id("chunk-1") is None
+    assert await storage.filter_keys(["chunk-1", "chunk-2"]) == {"chunk-1"}
+    await storage.index_done_callback()
+
+    assert load_json(storage._file_name) == {
+        k: v for k, v in DATA.items() if k != "chunk-1"
+    }
@@ -0,0 +1,149 @@
+import asyncio
+import time
+import pytest
+from nano_graphrag._utils import (
+    limit_async_func_call,
+    llm_caller,
+    llm_caller_scope,
+    llm_priority,
+    llm_priority_scope,
+)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    running, peak = 0, 0
+
+    @limit_async_func_call(3)
+    async def call(i):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return i
+
+    assert await asyncio.gather(*[call(i) for i in range(20)]) == list(range(20))
+    assert peak == 3
+    assert call.scheduler.running == 0 and call.scheduler.waiting() == 0
+
+
+@pytest.mark.asyncio
+async def test_callers_are_served_round_robin():
+    order = []
+
+    @limit_async_func_call(1)
+    async def call(name):
+        order.append(name)
+        await asyncio.sleep(0.001)
+
+    async def as_caller(caller, names):
+        llm_caller.set(caller)
+        await asyncio.gather(*[call(n) for n in names])
+
+    bulk = asyncio.create_task(as_caller("indexing", [f"i{k}" for k in range(6)]))
+    await asyncio.sleep(0)
+    await asyncio.create_task(as_caller("query", ["q0", "q1"]))
+    await bulk
+
+    # the query calls don't wait behind the whole indexing batch
+    assert order.index("q1") <= 4
+
+
+@pytest.mark.asyncio
+async def test_tokens_per_minute_delays_calls():
+    @limit_async_func_call(
+        4,
+        tokens_per_minute=6000,
+        token_estimate_func=lambda tokens: tokens,
+    )
+    async def call(tokens):
+        return time.monotonic()
+
+    start = time.monotonic()
+    await call(6000)
+    finished = await call(50)
+    # 50 tokens refill in 0.5s at 100 tokens per second
+    assert finished - start >= 0.45
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_releases_nothing():
+    release = asyncio.Event()
+
+    @limit_async_func_call(1)
+    async def call():
+        await release.wait()
+
+    first = asyncio.create_task(call())
+    await asyncio.sleep(0)
+    second = asyncio.create_task(call())
+    await asyncio.sleep(0)
+    second.cancel()
+    release.set()
+    await first
+    with pytest.raises(asyncio.CancelledError):
+        await second
+    await asyncio.wait_for(call(), timeout=1)
+    assert call.scheduler.running == 0
+
+
+@pytest.mark.asyncio
+async def test_llm_caller_scope_is_reset():
+    @llm_caller_scope("query")
+    async def scoped():
+        return llm_caller.get()
+
+    assert (await scoped()).startswith("query-")
+    assert llm_caller.get() == "default"
+
+
+@pytest.mark.asyncio
+async def test_interactive_calls_jump_queued_indexing_calls():
+    order = []
+
+    @limit_async_func_call(1)
+    async def call(name):
+        order.append(name)
+        await asyncio.sleep(0.001)
+
+    @llm_priority_scope("indexing")
+    async def index(names):
+        await asyncio.gather(*[call(n) for n in names])
+
+    bulk = asyncio.create_task(index([f"i{k}" for k in range(6)]))
+    while call.scheduler.waiting() < 5:
+        await asyncio.sleep(0)
+    await call("q0")
+    await bulk
+
+    # only the indexing call already in flight finishes before the query
+    assert order.index("q0") == 1
+
+
+@pytest.mark.asyncio
+async def test_priority_caps_leave_room_for_queries():
+    running, peak = {}, {}
+
+    @limit_async_func_call(4, priority_max_size={"indexing": 2, "report": 1})
+    async def call():
+        priority = llm_priority.get()
+        running[priority] = running.get(priority, 0) + 1
+        peak[priority] = max(peak.get(priority, 0), running[priority])
+        await asyncio.sleep(0.01)
+        running[priority] -= 1
+
+    @llm_priority_scope("indexing")
+    async def index():
+        await asyncio.gather(*[call() for _ in range(8)])
+
+    @llm_priority_scope("report")
+    async def report():
+        await asyncio.gather(*[call() for _ in range(4)])
+
+    await asyncio.gather(index(), report(), *[call() for _ in range(4)])
+    assert peak == {"indexing": 2, "report": 1, "interactive": 4}
+    assert call.scheduler.running == 0 and call.scheduler.waiting() == 0
+
+    with pytest.raises(ValueError):
+        llm_priority_scope("urgent")
@@ -0,0 +1,120 @@
+import os
+import shutil
+import pytest
+from nano_graphrag._storage import LogKVStorage
+
+WORKING_DIR = "./tests/nano_graphrag_cache_log_kv_storage_test"
+
+
+@pytest.fixture(scope="function")
+def setup_teardown():
+    if os.path.exists(WORKING_DIR):
+        shutil.rmtree(WORKING_DIR)
+    os.mkdir(WORKING_DIR)
+
+    yield
+
+    shutil.rmtree(WORKING_DIR)
+
+
+def make_storage(**kv_params):
+    return LogKVStorage(
+        namespace="test",
+        global_config={
+            "working_dir": WORKING_DIR,
+            "key_string_value_json_storage_cls_kwargs": kv_params,
+        },
+    )
+
+
+@pytest.mark.asyncio
+async def test_upsert_and_get(setup_teardown):
+    storage = make_storage()
+    await storage.upsert({"a": {"content": "xin chào\tthế giới\n", "tokens": 3}})
+
+    assert await storage.get_by_id("a") == {"content": "xin chào\tthế giới\n", "tokens": 3}
+    assert await storage.get_by_ids(["a", "b"], fields={"tokens"}) == [{"tokens": 3}, None]
+    assert await storage.filter_keys(["a", "b"]) == {"b"}
+
+    await storage.index_done_callback()
+    assert await storage.get_by_id("a") == {"content": "xin chào\tthế giới\n", "tokens": 3}
+
+
+@pytest.mark.asyncio
+async def test_flush_appends_only_delta(setup_teardown):
+    storage = make_storage()
+    await storage.upsert({"a": {"v": 1}, "b": {"v": 2}})
+    await storage.index_done_callback()
+    size = os.path.getsize(storage._file_name)
+
+    await storage.upsert({"a": {"v": 3}})
+    await storage.index_done_callback()
+    assert os.path.getsize(storage._file_name) > size
+
+    reloaded = make_storage()
+    assert sorted(await reloaded.all_keys()) == ["a", "b"]
+    assert await reloaded.get_by_id("a") == {"v": 3}
+    assert await reloaded.get_by_id("b") == {"v": 2}
+
+
+@pytest.mark.asyncio
+async def test_torn_tail_is_ignored(setup_teardown):
+    storage = make_storage()
+    await storage.upsert({"a": {"v": 1}})
+    await storage.index_done_callback()
+    with open(storage._file_name, "ab") as f:
+        f.write(b'"b"\t{"v": ')
+
+    reloaded = make_storage()
+    assert await reloaded.all_keys() == ["a"]
+    await reloaded.upsert({"c": {"v": 2}})
+    await reloaded.index_done_callback()
+    assert await make_storage().get_by_id("c") == {"v": 2}
+
+
+@pytest.mark.asyncio
+async def test_compaction(setup_teardown):
+    storage = make_storage(compaction_min_bytes=0, compaction_ratio=0.5)
+    for i in range(5):
+        await storage.upsert({"a": {"v": i}, "b": {"v": -i}})
+        await storage.index_done_callback()
+        if storage._compaction_task is not None:
+            await storage._compaction_task
+
+    assert storage._dead_bytes <= storage._size * 0.5
+    reloaded = make_storage()
+    assert await reloaded.get_by_id("a") == {"v": 4}
+    assert await reloaded.get_by_id("b") == {"v": -4}
+
+
+@pytest.mark.asyncio
+async def test_drop(setup_teardown):
+    storage = make_storage()
+    await storage.upsert({"a": {"v": 1}})
+    await storage.index_done_callback()
+    await storage.drop()
+
+    assert await storage.all_keys() == []
+    assert await make_storage().all_keys() == []
+
+
+@pytest.mark.asyncio
+async def test_delete(setup_teardown):
+    storage = make_storage()
+    await storage.upsert({"a": {"v": 1}, "b": {"v": 2}})
+    await storage.index_done_callback()
+
+    await storage.upsert({"c": {"v": 3}})
+    await storage.delete(["a", "c", "missing"])
+    assert await storage.get_by_id("a") is None
+    assert await storage.filter_keys(["a", "b", "c"]) == {"a", "c"}
+    assert await storage.all_keys() == ["b"]
+    await storage.index_done_callback()
+
+    reloaded = make_storage()
+    assert await reloaded.all_keys() == ["b"]
+    assert reloaded._dead_bytes == storage._dead_bytes > 0
+
+    await reloaded.upsert({"a": {"v": 4}})
+    await reloaded.index_done_callback()
+    assert await make_storage().get_by_id("a") == {"v": 4}
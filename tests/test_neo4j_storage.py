@@ -208,3 +208,22 @@ async def test_cluster_error_handling(neo4j_storage):
 @reset_graph
 async def test_index_done(neo4j_storage):
     await neo4j_storage.index_done_callback()
+
+
+@pytest.mark.asyncio
+@reset_graph
+async def test_batch_reads(neo4j_storage):
+    await neo4j_storage.upsert_node("node1", {"entity_type": "PERSON"})
+    await neo4j_storage.upsert_node("node2", {"entity_type": "PERSON"})
+    await neo4j_storage.upsert_edge("node1", "node2", {"weight": 1.0})
+
+    nodes = await neo4j_storage.get_nodes(["node2", "missing", "node1"])
+    assert [n["id"] if n else None for n in nodes] == ["node2", None, "node1"]
+    assert await neo4j_storage.node_degrees(["node1", "missing"]) == [1, 0]
+    edges = await neo4j_storage.get_edges([("node1", "node2"), ("node2", "missing")])
+    assert edges[0]["weight"] == 1.0 and edges[1] is None
+    assert await neo4j_storage.edge_degrees([("node1", "node2")]) == [2]
+    assert await neo4j_storage.get_nodes_edges(["node1", "missing"]) == [
+        [("node1", "node2")],
+        [],
+    ]
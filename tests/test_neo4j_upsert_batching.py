@@ -0,0 +1,189 @@
+import pytest
+from nano_graphrag._storage import gdb_neo4j
+from nano_graphrag._storage import Neo4jStorage
+
+
+class FakeResult:
+    def __init__(self, records):
+        self._records = records
+
+    async def single(self):
+        return self._records[0] if self._records else None
+
+    def __aiter__(self):
+        self._iter = iter(self._records)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        self.driver.sessions += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def run(self, query, **params):
+        if self.driver.failures:
+            self.driver.failures -= 1
+            raise ConnectionError("connection reset")
+        self.driver.queries.append((query, params))
+        if "communityIds" in query:
+            return FakeResult(self.driver.community_records)
+        return FakeResult([])
+
+
+class FakeAsyncDriver:
+    def __init__(self, url, auth=None, **config):
+        self.config = config
+        self.queries = []
+        self.sessions = 0
+        self.closed = False
+        # number of upcoming queries that fail
+        self.failures = 0
+        # rows of the community schema query
+        self.community_records = []
+
+    def session(self):
+        return FakeSession(self)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def make_storage(monkeypatch):
+    monkeypatch.setattr(gdb_neo4j.AsyncGraphDatabase, "driver", FakeAsyncDriver)
+
+    def _make(**addon_params):
+        return Neo4jStorage(
+            namespace="test",
+            global_config={
+                "working_dir": "./tests/neo4j_test",
+                "addon_params": {
+                    "neo4j_url": "bolt://fake",
+                    "neo4j_auth": ("neo4j", "neo4j"),
+                    **addon_params,
+                },
+            },
+        )
+
+    return _make
+
+
+def unwind_batches(driver, keyword):
+    return [
+        params["rows"]
+        for query, params in driver.queries
+        if query.startswith("UNWIND $rows") and keyword in query
+    ]
+
+
+@pytest.mark.asyncio
+async def test_upserts_are_buffered_and_batched(make_storage):
+    storage = make_storage(neo4j_upsert_batch_size=2)
+    driver = storage.async_driver
+    await storage.upsert_node("A", {"entity_type": '"PERSON"', "description": "a"})
+    assert driver.queries == []
+
+    await storage.upsert_node("B", {"entity_type": '"PERSON"'})
+    node_batches = unwind_batches(driver, "MERGE (n:")
+    assert [[row["id"] for row in batch] for batch in node_batches] == [["A", "B"]]
+    assert "`PERSON`" in driver.queries[0][0]
+
+    await storage.upsert_edge("A", "B", {"description": "x"})
+    await storage.upsert_edge("A", "B", {"weight": 2.0})
+    await storage.upsert_node("C", {"entity_type": '"EVENT"'})
+    assert len(driver.queries) == 1
+
+    await storage.index_done_callback()
+    assert [row["id"] for row in unwind_batches(driver, "MERGE (n:")[-1]] == ["C"]
+    (edge_batch,) = unwind_batches(driver, "MERGE (s)-[r:RELATED]->(t)")
+    assert edge_batch == [
+        {"source": "A", "target": "B", "data": {"description": "x", "weight": 2.0}}
+    ]
+    # nodes of a flush are written before the edges that MATCH them
+    assert "RELATED" in driver.queries[-1][0]
+    assert not driver.closed
+
+
+@pytest.mark.asyncio
+async def test_reads_flush_pending_upserts(make_storage):
+    storage = make_storage()
+    driver = storage.async_driver
+    await storage.upsert_node("A", {"entity_type": "PERSON"})
+    assert await storage.get_node("A") is None
+
+    assert len(driver.queries) == 2
+    assert driver.queries[0][0].startswith("UNWIND $rows")
+    assert "RETURN properties(n)" in driver.queries[1][0]
+
+    await storage.has_node("A")
+    assert len(driver.queries) == 3
+
+
+@pytest.mark.asyncio
+async def test_driver_outlives_index_done(make_storage):
+    storage = make_storage(neo4j_max_connection_pool_size=8)
+    driver = storage.async_driver
+    assert driver.config["max_connection_pool_size"] == 8
+
+    await storage.index_done_callback()
+    await storage.upsert_node("A", {})
+    await storage.index_done_callback()
+    assert storage.async_driver is driver and not driver.closed
+
+    await storage.close()
+    assert driver.closed
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_the_rows(make_storage):
+    storage = make_storage()
+    driver = storage.async_driver
+    await storage.upsert_node("A", {"entity_type": "PERSON", "description": "a"})
+    await storage.upsert_node("B", {"entity_type": "PERSON"})
+    await storage.upsert_edge("A", "B", {"description": "x"})
+
+    driver.failures = 1
+    with pytest.raises(ConnectionError):
+        await storage.index_done_callback()
+    assert driver.queries == []
+
+    await storage.upsert_node("A", {"description": "a, updated"})
+    await storage.index_done_callback()
+    (node_batch,) = unwind_batches(driver, "MERGE (n:")
+    assert node_batch == [
+        {"id": "A", "data": {"entity_type": "PERSON", "description": "a, updated"}},
+        {"id": "B", "data": {"entity_type": "PERSON"}},
+    ]
+    (edge_batch,) = unwind_batches(driver, "MERGE (s)-[r:RELATED]->(t)")
+    assert edge_batch == [
+        {"source": "A", "target": "B", "data": {"description": "x", "weight": 0.0}}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_community_schema_links_next_level_sub_communities(make_storage):
+    storage = make_storage()
+    storage.async_driver.community_records = [
+        {"node_id": "A", "source_id": "c1", "cluster_key": [0, 1, 3], "connected_nodes": ["B"]},
+        {"node_id": "B", "source_id": "c2", "cluster_key": [0, 1, 3], "connected_nodes": ["A"]},
+        {"node_id": "C", "source_id": "c1", "cluster_key": [0, 2], "connected_nodes": []},
+    ]
+    schema = await storage.community_schema()
+
+    assert sorted(schema["0"]["sub_communities"]) == ["1", "2"]
+    # only the next level, same as the in-process graph storages
+    assert schema["1"]["sub_communities"] == ["3"]
+    assert schema["3"]["sub_communities"] == []
+    assert sorted(schema["0"]["chunk_ids"]) == ["c1", "c2"]
@@ -375,3 +375,162 @@ async def test_error_handling(networkx_storage):
 
     with pytest.raises(ValueError, match="Node embedding algorithm invalid_algo not supported"):
         await networkx_storage.embed_nodes("invalid_algo")
+
+
+@pytest.mark.asyncio
+async def test_snapshot_roundtrip_keeps_types(networkx_storage):
+    await networkx_storage.upsert_node(
+        "NĂM 1945", {"entity_type": "SỰ KIỆN", "source_id": "chunk-1<SEP>chunk-2"}
+    )
+    await networkx_storage.upsert_node("HỒ CHÍ MINH", {"entity_type": "NGƯỜI", "flag": True})
+    await networkx_storage.upsert_edge(
+        "NĂM 1945", "HỒ CHÍ MINH", {"weight": 2.5, "order": 1, "description": ""}
+    )
+    await networkx_storage.index_done_callback()
+
+    new_storage = NetworkXStorage(
+        namespace="test", global_config=networkx_storage.global_config
+    )
+    assert list(new_storage._graph.nodes(data=True)) == list(
+        networkx_storage._graph.nodes(data=True)
+    )
+    edge_data = await new_storage.get_edge("HỒ CHÍ MINH", "NĂM 1945")
+    assert edge_data == {"weight": 2.5, "order": 1, "description": ""}
+    assert type(edge_data["order"]) is int
+
+
+@pytest.mark.asyncio
+async def test_graphml_import_and_export(setup_teardown):
+    rag = GraphRAG(working_dir=WORKING_DIR, embedding_func=mock_embedding)
+    graph = nx.Graph()
+    graph.add_edge("A", "B", weight=1.0)
+    NetworkXStorage.write_nx_graph(graph, os.path.join(WORKING_DIR, "graph_legacy.graphml"))
+
+    storage = NetworkXStorage(namespace="legacy", global_config=rag.__dict__)
+    assert await storage.get_edge("A", "B") == {"weight": 1.0}
+
+    await storage.upsert_edge("B", "C", {"weight": 2.0})
+    await storage.index_done_callback()
+    assert os.path.exists(os.path.join(WORKING_DIR, "graph_legacy.snapshot"))
+
+    storage.export_graphml()
+    exported = NetworkXStorage.load_nx_graph(os.path.join(WORKING_DIR, "graph_legacy.graphml"))
+    assert exported.has_edge("B", "C")
+
+
+@pytest.mark.asyncio
+async def test_batch_reads_match_single_reads(networkx_storage):
+    await networkx_storage.upsert_node("center", {"entity_type": "PERSON"})
+    for i in range(3):
+        await networkx_storage.upsert_edge("center", f"neighbor{i}", {"weight": float(i)})
+    node_ids = ["neighbor1", "missing", "center"]
+    edge_pairs = [("neighbor0", "center"), ("center", "missing")]
+
+    assert await networkx_storage.get_nodes(node_ids) == [
+        await networkx_storage.get_node(n) for n in node_ids
+    ]
+    assert await networkx_storage.node_degrees(node_ids) == [1, 0, 3]
+    assert await networkx_storage.get_edges(edge_pairs) == [{"weight": 0.0}, None]
+    assert await networkx_storage.edge_degrees(edge_pairs) == [4, 3]
+    assert await networkx_storage.get_nodes_edges(node_ids) == [
+        await networkx_storage.get_node_edges(n) for n in node_ids
+    ]
+
+
+@pytest.mark.asyncio
+async def test_incremental_clustering_keeps_untouched_communities(networkx_storage):
+    for group in "ABC":
+        for i in range(12):
+            await networkx_storage.upsert_node(f"{group}{i}", {"source_id": f"chunk{group}{i}"})
+        for i in range(11):
+            await networkx_storage.upsert_edge(f"{group}{i}", f"{group}{i+1}", {"weight": 1.0})
+    await networkx_storage.upsert_edge("A11", "B0", {"weight": 0.1})
+    await networkx_storage.upsert_edge("B11", "C0", {"weight": 0.1})
+    await networkx_storage.clustering("leiden")
+    before = {
+        n: d["clusters"] for n, d in networkx_storage._graph.nodes(data=True)
+    }
+    max_before = max(
+        c["cluster"] for v in before.values() for c in json.loads(v)
+    )
+
+    await networkx_storage.upsert_node("NEW", {"source_id": "chunkNEW"})
+    await networkx_storage.upsert_edge("NEW", "C5", {"weight": 1.0})
+    reclustered = NetworkXStorage.nodes_to_recluster(
+        NetworkXStorage.stable_largest_connected_component(networkx_storage._graph),
+        networkx_storage._changed_nodes,
+    )
+    await networkx_storage.clustering("leiden")
+    after = {
+        n: d["clusters"] for n, d in networkx_storage._graph.nodes(data=True)
+    }
+
+    assert reclustered is not None and "NEW" in reclustered and "A0" not in reclustered
+    assert all(after[n] == before[n] for n in before if n not in reclustered)
+    assert all(
+        c["cluster"] > max_before for n in reclustered for c in json.loads(after[n])
+    )
+    assert networkx_storage._changed_nodes == set()
+
+
+@pytest.mark.asyncio
+async def test_community_schema_is_cached_per_graph_version(networkx_storage):
+    await networkx_storage.upsert_node("node1", {"source_id": "chunk1", "clusters": json.dumps([{"level": 0, "cluster": "0"}])})
+    await networkx_storage.upsert_node("node2", {"source_id": "chunk2", "clusters": json.dumps([{"level": 0, "cluster": "0"}])})
+    await networkx_storage.upsert_edge("node1", "node2", {})
+    schema = await networkx_storage.community_schema()
+    assert await networkx_storage.community_schema() is not schema
+    assert networkx_storage._community_schema is not None
+
+    await networkx_storage.upsert_node("node3", {"source_id": "chunk3", "clusters": json.dumps([{"level": 0, "cluster": "1"}])})
+    assert networkx_storage._community_schema is None
+    schema = await networkx_storage.community_schema()
+    assert set(schema) == {"0", "1"}
+    await networkx_storage.index_done_callback()
+
+    reloaded = NetworkXStorage(namespace="test", global_config=networkx_storage.global_config)
+    assert reloaded._community_schema == schema
+
+    # a snapshot written without the schema makes the cached one stale
+    NetworkXStorage.write_nx_snapshot(reloaded._graph, reloaded._snapshot_file)
+    os.utime(reloaded._snapshot_file, ns=(0, 0))
+    stale = NetworkXStorage(namespace="test", global_config=networkx_storage.global_config)
+    assert stale._community_schema is None
+    assert await stale.community_schema() == schema
+
+
+@pytest.mark.asyncio
+async def test_index_done_only_writes_what_changed(networkx_storage, monkeypatch):
+    from nano_graphrag._storage import gdb_networkx
+
+    builds, writes = [], []
+    build = NetworkXStorage._build_community_schema
+    write = gdb_networkx.write_community_schema
+    monkeypatch.setattr(
+        NetworkXStorage,
+        "_build_community_schema",
+        lambda self: builds.append(1) or build(self),
+    )
+    monkeypatch.setattr(
+        gdb_networkx,
+        "write_community_schema",
+        lambda *args: writes.append(1) or write(*args),
+    )
+    clusters = json.dumps([{"level": 0, "cluster": "0"}])
+
+    # an insert window without clustering doesn't build the schema
+    await networkx_storage.upsert_node("node1", {"source_id": "chunk1", "clusters": clusters})
+    await networkx_storage.index_done_callback()
+    assert builds == [] and writes == []
+
+    await networkx_storage.community_schema()
+    await networkx_storage.index_done_callback()
+    assert builds == [1] and writes == [1]
+    mtime = os.stat(networkx_storage._snapshot_file).st_mtime_ns
+
+    # nothing changed since, nothing is rebuilt nor written
+    await networkx_storage.index_done_callback()
+    assert builds == [1] and writes == [1]
+    assert os.stat(networkx_storage._snapshot_file).st_mtime_ns == mtime
+    reloaded = NetworkXStorage(namespace="test", global_config=networkx_storage.global_config)
+    assert set(reloaded._community_schema) == {"0"}
@@ -0,0 +1,96 @@
+import asyncio
+import numpy as np
+import pytest
+from nano_graphrag import QueryParam
+from nano_graphrag._query_cache import SemanticQueryCache
+from nano_graphrag._utils import wrap_embedding_func_with_attrs
+
+VECTORS = {
+    "Năm 1936 có sự kiện gì?": [1.0, 0.0, 0.0],
+    "Năm 1936 đã có sự kiện gì?": [0.99, 0.1, 0.0],
+    "Ai sáng lập Đảng?": [0.0, 1.0, 0.0],
+}
+
+
+@wrap_embedding_func_with_attrs(embedding_dim=3, max_token_size=8192)
+async def fake_embedding(texts: list[str]) -> np.ndarray:
+    fake_embedding.calls += 1
+    return np.array([VECTORS[t] for t in texts])
+
+
+@pytest.fixture
+def cache():
+    fake_embedding.calls = 0
+    return SemanticQueryCache(embedding_func=fake_embedding, similarity_threshold=0.95)
+
+
+async def cached_query(cache, query, param=QueryParam(mode="local")):
+    cached, state = await cache.get(query, param)
+    if cached is None:
+        cache.put(query, f"answer to {query}", state, context=f"context of {query}")
+        return None
+    assert cached["context"] == cached["response"].replace("answer to", "context of")
+    return cached["response"]
+
+
+@pytest.mark.asyncio
+async def test_exact_only_by_default():
+    fake_embedding.calls = 0
+    cache = SemanticQueryCache(embedding_func=fake_embedding)
+    await cached_query(cache, "Năm 1936 có sự kiện gì?")
+    assert await cached_query(cache, "Năm 1936 đã có sự kiện gì?") is None
+    assert await cached_query(cache, "Năm 1936 có sự kiện gì?") is not None
+    assert fake_embedding.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_exact_then_similar_hits(cache):
+    assert await cached_query(cache, "Năm 1936 có sự kiện gì?") is None
+    assert fake_embedding.calls == 1
+    # exact hits don't embed the query
+    assert (
+        await cached_query(cache, "Năm 1936 có sự kiện gì?")
+        == "answer to Năm 1936 có sự kiện gì?"
+    )
+    assert fake_embedding.calls == 1
+    assert (
+        await cached_query(cache, "Năm 1936 đã có sự kiện gì?")
+        == "answer to Năm 1936 có sự kiện gì?"
+    )
+    assert await cached_query(cache, "Ai sáng lập Đảng?") is None
+    # entries are per QueryParam
+    assert await cached_query(cache, "Năm 1936 có sự kiện gì?", QueryParam()) is None
+
+
+@pytest.mark.asyncio
+async def test_exact_only(cache):
+    cache.similarity_threshold = None
+    await cached_query(cache, "Năm 1936 có sự kiện gì?")
+    assert await cached_query(cache, "Năm 1936 đã có sự kiện gì?") is None
+    assert fake_embedding.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_lru_and_ttl_eviction(cache):
+    cache.max_size = 2
+    cache.similarity_threshold = None
+    for query in VECTORS:
+        await cached_query(cache, query)
+    assert len(cache) == 2
+    # the least recently used one was evicted
+    assert await cached_query(cache, "Ai sáng lập Đảng?") is not None
+    assert await cached_query(cache, "Năm 1936 có sự kiện gì?") is None
+
+    cache.ttl = 0.01
+    await asyncio.sleep(0.02)
+    assert await cached_query(cache, "Ai sáng lập Đảng?") is None
+
+
+@pytest.mark.asyncio
+async def test_invalidate_drops_entries_and_stale_puts(cache):
+    await cached_query(cache, "Năm 1936 có sự kiện gì?")
+    _, state = await cache.get("Ai sáng lập Đảng?", QueryParam())
+    cache.invalidate()
+    cache.put("Ai sáng lập Đảng?", "stale answer", state)
+    assert len(cache) == 0
+    assert await cached_query(cache, "Năm 1936 có sự kiện gì?") is None
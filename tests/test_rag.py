@@ -1,8 +1,13 @@
 import os
 import json
 import shutil
+import asyncio
+import pytest
 import numpy as np
+from functools import partial
 from nano_graphrag import GraphRAG, QueryParam
+from nano_graphrag._op import _extract_chunks_with_checkpoint
+from nano_graphrag._storage import JsonKVStorage, LogKVStorage
 from nano_graphrag._utils import wrap_embedding_func_with_attrs
 
 os.environ["OPENAI_API_KEY"] = "FAKE"
@@ -92,6 +97,7 @@ def test_subcommunity_insert():
     remove_if_exist(f"{WORKING_DIR}/kv_store_text_chunks.json")
     remove_if_exist(f"{WORKING_DIR}/kv_store_community_reports.json")
     remove_if_exist(f"{WORKING_DIR}/graph_chunk_entity_relation.graphml")
+    remove_if_exist(f"{WORKING_DIR}/graph_chunk_entity_relation.snapshot")
     rag = GraphRAG(
         working_dir=WORKING_DIR,
         embedding_func=local_embedding,
@@ -99,3 +105,470 @@ def test_subcommunity_insert():
         addon_params={"force_to_use_sub_communities": True},
     )
     rag.insert(FAKE_TEXT)
+
+
+def test_community_report_reuse():
+    import asyncio
+    from nano_graphrag._op import generate_community_report
+    from nano_graphrag._storage import JsonKVStorage, NetworkXStorage
+
+    calls = []
+
+    async def counting_json_model(prompt, **kwargs) -> str:
+        calls.append(prompt)
+        return FAKE_JSON
+
+    rag = GraphRAG(
+        working_dir=WORKING_DIR,
+        best_model_func=counting_json_model,
+        embedding_func=local_embedding,
+    )
+    config = rag.__dict__
+    graph = NetworkXStorage(namespace="report_reuse", global_config=config)
+    reports = JsonKVStorage(namespace="report_reuse", global_config=config)
+
+    async def run():
+        for node_id, cluster in [("A", 0), ("B", 0), ("C", 1), ("D", 1)]:
+            await graph.upsert_node(
+                node_id,
+                {
+                    "source_id": f"chunk-{node_id}",
+                    "description": node_id,
+                    "clusters": json.dumps([{"level": 0, "cluster": cluster}]),
+                },
+            )
+        await graph.upsert_edge("A", "B", {"weight": 1.0, "description": "AB"})
+        await graph.upsert_edge("C", "D", {"weight": 1.0, "description": "CD"})
+        await generate_community_report(reports, graph, config)
+        assert len(calls) == 2
+
+        await graph.upsert_node("C", {"description": "C, updated"})
+        await generate_community_report(reports, graph, config)
+        assert len(calls) == 3
+        assert sorted(await reports.all_keys()) == ["0", "1"]
+
+    asyncio.run(run())
+
+
+@pytest.mark.asyncio
+async def test_extraction_resumes_from_checkpoint():
+    global_config = {"working_dir": WORKING_DIR}
+    remove_if_exist(f"{WORKING_DIR}/kv_log_extraction_checkpoints.log")
+    checkpoints = LogKVStorage(
+        namespace="extraction_checkpoints", global_config=global_config
+    )
+    chunks = [("chunk-1", {"content": "a"}), ("chunk-2", {"content": "b"})]
+    processed = []
+
+    async def process(chunk_key_dp, fail=False):
+        processed.append(chunk_key_dp[0])
+        if chunk_key_dp[0] == "chunk-2":
+            await asyncio.sleep(0.01)
+            if fail:
+                raise RuntimeError("rate limited")
+        return {"A": [{"entity_name": "A"}]}, {("A", "B"): [{"weight": 1.0}]}
+
+    with pytest.raises(RuntimeError):
+        await _extract_chunks_with_checkpoint(
+            chunks, partial(process, fail=True), checkpoints
+        )
+    await checkpoints.index_done_callback()
+
+    processed.clear()
+    reloaded = LogKVStorage(namespace="extraction_checkpoints", global_config=global_config)
+    results = await _extract_chunks_with_checkpoint(chunks, process, reloaded)
+    assert processed == ["chunk-2"]
+    assert results == [
+        ({"A": [{"entity_name": "A"}]}, {("A", "B"): [{"weight": 1.0}]})
+    ] * 2
+
+
+def test_streaming_insert_commits_each_window():
+    working_dir = f"{WORKING_DIR}/streaming"
+    if os.path.exists(working_dir):
+        shutil.rmtree(working_dir)
+    windows = []
+
+    async def recording_extraction(chunks, knwoledge_graph_inst, checkpoint_kv, **kwargs):
+        # the docs of the previous windows are committed already, and their
+        # checkpoints deleted
+        windows.append((len(chunks), len(await rag.full_docs.all_keys())))
+        assert await checkpoint_kv.all_keys() == []
+        await checkpoint_kv.upsert({k: {"nodes": {}, "edges": []} for k in chunks})
+        return knwoledge_graph_inst
+
+    rag = GraphRAG(
+        working_dir=working_dir,
+        embedding_func=local_embedding,
+        entity_extraction_func=recording_extraction,
+        insert_window_size=2,
+    )
+    rag.insert(f"document number {i}" for i in range(5))
+    assert windows == [(2, 0), (2, 2), (1, 4)]
+    with open(f"{working_dir}/kv_store_full_docs.json") as f:
+        assert len(json.load(f)) == 5
+
+    rag.insert(["document number 4", "document number 5"])
+    assert windows[-1] == (1, 5)
+
+
+def test_merge_entity_aliases():
+    from nano_graphrag._op import _merge_entity_aliases
+
+    def edge(src, tgt, description):
+        return {"src_id": src, "tgt_id": tgt, "description": description, "weight": 1.0}
+
+    maybe_nodes = {
+        "HCM": [{"entity_name": "HCM"}],
+        "HỒ CHÍ MINH": [{"entity_name": "HỒ CHÍ MINH"}],
+        "VIỆT MINH": [{"entity_name": "VIỆT MINH"}],
+    }
+    maybe_edges = {
+        ("HCM", "VIỆT MINH"): [edge("HCM", "VIỆT MINH", "a")],
+        ("HỒ CHÍ MINH", "VIỆT MINH"): [edge("VIỆT MINH", "HỒ CHÍ MINH", "b")],
+        ("HCM", "HỒ CHÍ MINH"): [edge("HCM", "HỒ CHÍ MINH", "alias")],
+        ("PHÁP", "VIỆT MINH"): [edge("PHÁP", "VIỆT MINH", "c")],
+    }
+    _merge_entity_aliases(maybe_nodes, maybe_edges, {"HỒ CHÍ MINH": ["HCM"]})
+
+    assert maybe_nodes["HỒ CHÍ MINH"] == [{"entity_name": "HỒ CHÍ MINH"}] * 2
+    assert "HCM" not in maybe_nodes
+    assert set(maybe_edges) == {("HỒ CHÍ MINH", "VIỆT MINH"), ("PHÁP", "VIỆT MINH")}
+    merged = maybe_edges[("HỒ CHÍ MINH", "VIỆT MINH")]
+    assert sorted(dp["description"] for dp in merged) == ["a", "b"]
+    assert all("HCM" not in (dp["src_id"], dp["tgt_id"]) for dp in merged)
+
+
+def test_fuse_ranked_entities():
+    from nano_graphrag._op import _fuse_ranked_entities
+
+    vector_hits = [
+        {"entity_name": "A", "distance": 0.9},
+        {"entity_name": "B", "distance": 0.8},
+        {"entity_name": "C", "distance": 0.7},
+    ]
+    time_hits = [
+        {"entity_name": "C", "entity_time": 1945},
+        {"entity_name": "D", "entity_time": 1946},
+    ]
+    fused = _fuse_ranked_entities(vector_hits, time_hits)
+    assert [e["entity_name"] for e in fused] == ["C", "A", "B", "D"]
+    assert fused[0] == {"entity_name": "C", "distance": 0.7, "entity_time": 1945}
+
+
+def test_local_query_stages_run_concurrently_and_are_cached():
+    working_dir = f"{WORKING_DIR}/query_stages"
+    if os.path.exists(working_dir):
+        shutil.rmtree(working_dir)
+    filter_calls = []
+    searching = asyncio.Event()
+
+    async def filter_model(prompt, system_prompt=None, history_messages=[], **kwargs):
+        filter_calls.append(prompt)
+        # returns only once the entity search has started
+        await asyncio.wait_for(searching.wait(), timeout=5)
+        return "filtered question"
+
+    @wrap_embedding_func_with_attrs(embedding_dim=384, max_token_size=8192)
+    async def signalling_embedding(texts: list[str]) -> np.ndarray:
+        searching.set()
+        return np.random.rand(len(texts), 384)
+
+    rag = GraphRAG(
+        working_dir=working_dir,
+        cheap_model_func=filter_model,
+        embedding_func=signalling_embedding,
+        enable_llm_cache=False,
+        enable_query_cache=False,
+    )
+    param = QueryParam(mode="local", local_time_extraction=False, local_rerank=False)
+    for _ in range(2):
+        searching.clear()
+        assert rag.query("Năm 1936 có sự kiện gì?", param=param)
+    assert len(filter_calls) == 1
+    with open(f"{working_dir}/kv_store_query_stage_answer_filter.json") as f:
+        assert list(json.load(f).values()) == [{"return": "filtered question"}]
+
+
+@pytest.mark.asyncio
+async def test_score_rerank_entities():
+    from nano_graphrag._op import score_rerank_entities
+
+    query = "Năm 1936, các ủy ban hành động được thành lập nhằm mục đích gì?\nA. Lập hội ái hữu.\nB. Thu thập dân nguyện."
+    entities = [
+        {"entity_name": "A", "distance": 0.9, "rank": 1, "entity_time": "1975",
+         "entity_description": "Chiến dịch"},
+        {"entity_name": "B", "distance": 0.5, "rank": 9, "entity_time": None,
+         "entity_description": "Đại hội"},
+        {"entity_name": "C", "entity_time": "1936 1939", "rank": 0,
+         "entity_description": "Phong trào thu thập dân nguyện"},
+    ]
+    period = ["1936-01-01T00:00:00", "1936-12-31T00:00:00"]
+
+    def config(**weights):
+        return {"entity_rerank_weights": weights}
+
+    async def order(param=QueryParam(top_k=3), **weights):
+        ranked = await score_rerank_entities(
+            query, entities, period, param, config(**weights)
+        )
+        return [e["entity_name"] for e in ranked]
+
+    assert await order(similarity=1.0) == ["A", "B", "C"]
+    assert await order(degree=1.0) == ["B", "A", "C"]
+    assert await order(temporal=1.0) == ["C", "A", "B"]
+    assert (await order(lexical=1.0))[0] == "C"
+    assert await order(QueryParam(top_k=1), similarity=1.0) == ["A"]
+
+    # hnswlib results: a cosine distance, lower is nearer, and a similarity
+    hnsw_entities = [
+        {"entity_name": name, "distance": d, "similarity": 1 - d, "rank": 1}
+        for name, d in [("near", 0.1), ("mid", 0.4), ("far", 0.8)]
+    ]
+    ranked = await score_rerank_entities(
+        query, hnsw_entities, None, QueryParam(top_k=3), config(similarity=1.0)
+    )
+    assert [e["entity_name"] for e in ranked] == ["near", "mid", "far"]
+
+
+@pytest.mark.parametrize(
+    "query, period",
+    [
+        ("Năm 1936, các ủy ban hành động được thành lập nhằm mục đích gì?", ("1936", "1936")),
+        ("chiến lược “Chiến tranh đặc biệt” (1961-1965) của Mỹ?", ("1961", "1965")),
+        ("Phong trào 1930 – 1931 và Xuân 1975", ("1930", "1975")),
+        ("Cách mạng tháng 8 năm 1945", ("8/1945", "8/1945")),
+        ("Đường lối đổi mới (từ tháng 12-1986)", ("12/1986", "12/1986")),
+        ("ngày 19 tháng 8 năm 1945 đến ngày 2/9/1945", ("19/8/1945", "2/9/1945")),
+        ("Việt Nam cuối thế kỷ XIX", ("1800", "1899")),
+        ("Từ năm 1930 đến 1931", ("1930", "1931")),
+        ("Ai là người sáng lập Đảng?", None),
+        # the answer options are left out
+        ("Năm 1936, mục đích gì? A. 1930 B. 1975", ("1936", "1936")),
+        ("Sự kiện nào diễn ra năm 1954?\nA. Năm 1945.\nB. Năm 1975.", ("1954", "1954")),
+        ("Sự kiện nào?\nA. 1945\nB. 1975", None),
+        # counts aren't years
+        ("Quân đội 3000 người", None),
+        ("Từ 3000-4000 người tham gia năm 1930", ("1930", "1930")),
+    ],
+)
+def test_extract_period_by_rules(query, period):
+    from nano_graphrag._op import _date_span, extract_period_by_rules
+
+    expected = (
+        (_date_span(period[0])[0], _date_span(period[1])[1])
+        if period is not None
+        else None
+    )
+    assert extract_period_by_rules(query) == expected
+
+
+def test_period_ends_with_the_last_year():
+    from datetime import datetime
+    from nano_graphrag._op import extract_period_by_rules
+
+    assert extract_period_by_rules("1930 đến 1931") == (
+        datetime(1930, 1, 1),
+        datetime(1931, 12, 31, 23, 59, 59),
+    )
+    assert extract_period_by_rules("thế kỷ XX")[1] == datetime(1999, 12, 31, 23, 59, 59)
+
+
+@pytest.mark.asyncio
+async def test_only_the_llm_period_is_cached():
+    from nano_graphrag._op import _extract_query_period
+
+    remove_if_exist(f"{WORKING_DIR}/kv_store_query_stage_time_extraction.json")
+    stage_caches = {
+        "time_extraction": JsonKVStorage(
+            namespace="query_stage_time_extraction",
+            global_config={"working_dir": WORKING_DIR},
+        )
+    }
+    asked = []
+
+    async def fake_time_extraction(prompt, **kwargs):
+        asked.append(prompt)
+        return "12/1986-12/1986"
+
+    global_config = {"cheap_model_func": fake_time_extraction}
+
+    # the rules answer, nothing is asked nor cached
+    assert await _extract_query_period("Năm 1936 có gì?", global_config, stage_caches) == [
+        "1936-01-01T00:00:00",
+        "1936-12-31T23:59:59",
+    ]
+    assert asked == [] and await stage_caches["time_extraction"].all_keys() == []
+
+    # a month is widened to the year around it, the LLM reply is cached
+    for _ in range(2):
+        assert await _extract_query_period(
+            "Đổi mới có gì?", global_config, stage_caches
+        ) == [
+            "1986-06-16T12:00:00",
+            "1987-06-16T12:00:00",
+        ]
+    assert len(asked) == 1
+    assert len(await stage_caches["time_extraction"].all_keys()) == 1
+
+
+def test_query_cache_is_cleared_on_insert():
+    working_dir = f"{WORKING_DIR}/query_cache"
+    if os.path.exists(working_dir):
+        shutil.rmtree(working_dir)
+    calls = []
+
+    async def counting_model(prompt, system_prompt=None, history_messages=[], **kwargs):
+        calls.append(prompt)
+        return FAKE_RESPONSE
+
+    rag = GraphRAG(
+        working_dir=working_dir,
+        cheap_model_func=counting_model,
+        embedding_func=local_embedding,
+        enable_llm_cache=False,
+        enable_query_stage_cache=False,
+    )
+    param = QueryParam(mode="local", local_time_extraction=False, local_rerank=False)
+    rag.query("Năm 1936 có sự kiện gì?", param=param)
+    rag.query("Năm 1936 có sự kiện gì?", param=param)
+    assert len(calls) == 1
+    asyncio.run(rag._insert_done())
+    rag.query("Năm 1936 có sự kiện gì?", param=param)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_find_most_related_text_units():
+    from nano_graphrag._op import _find_most_related_text_unit_from_entities
+    from nano_graphrag._storage import NetworkXStorage
+    from nano_graphrag.prompt import GRAPH_FIELD_SEP
+
+    global_config = {"working_dir": WORKING_DIR, "addon_params": {}}
+    remove_if_exist(f"{WORKING_DIR}/graph_text_units_test.graphml")
+    remove_if_exist(f"{WORKING_DIR}/kv_store_text_units_test.json")
+    graph = NetworkXStorage(namespace="text_units_test", global_config=global_config)
+    chunks = JsonKVStorage(namespace="text_units_test", global_config=global_config)
+    sources = {
+        "E1": ["c1", "c2"],
+        "E2": ["c2", "c3", "c4"],
+        "N1": ["c2"],
+        "N2": ["c1", "c2"],
+    }
+    for name, chunk_ids in sources.items():
+        await graph.upsert_node(name, {"source_id": GRAPH_FIELD_SEP.join(chunk_ids)})
+    for src, tgt in [("E1", "N1"), ("E1", "N2"), ("E2", "N1")]:
+        await graph.upsert_edge(src, tgt, {"weight": 1.0})
+    # c4 is missing from the storage
+    await chunks.upsert({c: {"content": f"chunk {c}"} for c in ["c1", "c2", "c3"]})
+
+    node_datas = [
+        {"entity_name": name, **await graph.get_node(name)} for name in ["E1", "E2"]
+    ]
+    text_units = await _find_most_related_text_unit_from_entities(
+        node_datas, QueryParam(), chunks, graph
+    )
+    # chunks of E1 first, the ones shared with more of its neighbors first
+    assert [t["content"] for t in text_units] == ["chunk c2", "chunk c1", "chunk c3"]
+
+
+
+@pytest.mark.asyncio
+async def test_local_context_reads_the_candidate_nodes_once():
+    from nano_graphrag._op import _build_local_query_context
+    from nano_graphrag._storage import NetworkXStorage
+    from nano_graphrag.base import BaseTemporalStorage
+
+    global_config = {"working_dir": WORKING_DIR, "addon_params": {}}
+    remove_if_exist(f"{WORKING_DIR}/graph_local_context_test.graphml")
+    remove_if_exist(f"{WORKING_DIR}/kv_store_local_context_test.json")
+    graph = NetworkXStorage(namespace="local_context_test", global_config=global_config)
+    chunks = JsonKVStorage(namespace="local_context_test", global_config=global_config)
+    for name in ["A", "B"]:
+        await graph.upsert_node(
+            name, {"description": f"about {name}", "source_id": "c1", "entity_type": "EVENT"}
+        )
+    await graph.upsert_node("N", {"description": "neighbor", "source_id": "c1"})
+    await graph.upsert_edge("A", "N", {"description": "A-N", "weight": 1.0})
+    await graph.upsert_edge("B", "N", {"description": "B-N", "weight": 1.0})
+    await chunks.upsert({"c1": {"content": "chunk c1"}})
+
+    get_nodes_calls = []
+    get_nodes = graph.get_nodes
+
+    async def counting_get_nodes(node_ids):
+        get_nodes_calls.append(list(node_ids))
+        return await get_nodes(node_ids)
+
+    async def no_get_node(node_id):
+        raise AssertionError("single node lookup")
+
+    graph.get_nodes = counting_get_nodes
+    graph.get_node = no_get_node
+
+    class TimeIndex(BaseTemporalStorage):
+        async def query_time_range(self, start, end, top_k=None):
+            return [{"entity_name": "B", "entity_time": "1945"}]
+
+        async def get_by_entity_names(self, entity_names):
+            raise AssertionError("descriptions come from the graph")
+
+    reranked = []
+
+    async def recording_rerank(query, results, query_period, query_param, global_config, **kwargs):
+        reranked.extend(results)
+        return results
+
+    context = await _build_local_query_context(
+        "Năm 1945",
+        [{"entity_name": "A", "distance": 0.9}],
+        ["1945-01-01T00:00:00", "1945-12-31T23:59:59"],
+        graph,
+        None,
+        chunks,
+        QueryParam(),
+        {**global_config, "entity_rerank_func": recording_rerank},
+        entity_time_db=TimeIndex(namespace="entities", global_config=global_config),
+    )
+
+    assert get_nodes_calls == [["A", "B"], ["N"]]
+    assert {r["entity_name"]: r["entity_description"] for r in reranked} == {
+        "A": "about A",
+        "B": "about B",
+    }
+    assert "about A" in context and "about B" in context and "chunk c1" in context
+
+
+def test_query_cache_stores_local_context():
+    working_dir = f"{WORKING_DIR}/query_cache_context"
+    if os.path.exists(working_dir):
+        shutil.rmtree(working_dir)
+
+    async def answer_model(prompt, system_prompt=None, history_messages=[], **kwargs):
+        return "A"
+
+    rag = GraphRAG(
+        working_dir=working_dir,
+        cheap_model_func=answer_model,
+        embedding_func=local_embedding,
+        enable_llm_cache=False,
+        enable_query_stage_cache=False,
+    )
+
+    async def index():
+        await rag.chunk_entity_relation_graph.upsert_node(
+            "CÁCH MẠNG THÁNG TÁM",
+            {"source_id": "chunk-1", "description": "Tổng khởi nghĩa", "entity_type": "EVENT"},
+        )
+        await rag.entities_vdb.upsert(
+            {"ent-1": {"content": "CÁCH MẠNG THÁNG TÁM", "entity_name": "CÁCH MẠNG THÁNG TÁM"}}
+        )
+        await rag.text_chunks.upsert({"chunk-1": {"content": "Tháng 8 năm 1945"}})
+
+    asyncio.run(index())
+    param = QueryParam(mode="local", local_time_extraction=False, local_rerank=False)
+    assert rag.query("Cách mạng tháng Tám?", param=param) == "A"
+    cached, _ = asyncio.run(rag.query_cache.get("Cách mạng tháng Tám?", param))
+    assert cached["response"] == "A"
+    assert "CÁCH MẠNG THÁNG TÁM" in cached["context"]
+    assert "Tháng 8 năm 1945" in cached["context"]
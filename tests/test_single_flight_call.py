@@ -0,0 +1,71 @@
+import asyncio
+import numpy as np
+import pytest
+from nano_graphrag._utils import (
+    limit_async_func_call,
+    single_flight_call,
+    wrap_embedding_func_with_attrs,
+)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_share_one_call():
+    calls = []
+
+    @single_flight_call
+    async def complete(prompt, **kwargs):
+        calls.append(prompt)
+        await asyncio.sleep(0.01)
+        return prompt.upper()
+
+    results = await asyncio.gather(
+        complete("a", hashing_kv=object()),
+        complete("a", hashing_kv=object()),
+        complete("b"),
+        complete("a", max_tokens=10),
+    )
+    assert results == ["A", "A", "B", "A"]
+    assert sorted(calls) == ["a", "a", "b"]
+    assert complete.coalesced == 1 and complete.in_flight == {}
+
+    # finished calls are not reused, that's the LLM cache's job
+    await complete("a")
+    assert len(calls) == 4
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller_and_cancel_is_isolated():
+    release = asyncio.Event()
+
+    @single_flight_call
+    async def complete(prompt):
+        await release.wait()
+        raise RuntimeError(prompt)
+
+    first = asyncio.create_task(complete("x"))
+    second = asyncio.create_task(complete("x"))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    with pytest.raises(RuntimeError, match="x"):
+        await second
+
+
+@pytest.mark.asyncio
+async def test_embedding_attrs_survive_wrapping():
+    calls = 0
+
+    @wrap_embedding_func_with_attrs(embedding_dim=4, max_token_size=8192)
+    async def embed(texts):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return np.ones((len(texts), 4))
+
+    wrapped = single_flight_call(limit_async_func_call(2)(embed))
+    assert wrapped.embedding_dim == 4
+    first, second = await asyncio.gather(wrapped(["q"]), wrapped(["q"]))
+    assert calls == 1 and first.shape == (1, 4)
+    assert wrapped.scheduler.running == 0
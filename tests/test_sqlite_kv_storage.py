@@ -0,0 +1,107 @@
+import os
+import shutil
+import pytest
+from nano_graphrag import GraphRAG
+from nano_graphrag._storage import SQLiteKVStorage
+
+WORKING_DIR = "./tests/nano_graphrag_cache_sqlite_kv_storage_test"
+
+
+@pytest.fixture(scope="function")
+def setup_teardown():
+    if os.path.exists(WORKING_DIR):
+        shutil.rmtree(WORKING_DIR)
+    os.mkdir(WORKING_DIR)
+
+    yield
+
+    shutil.rmtree(WORKING_DIR)
+
+
+def make_storage():
+    return SQLiteKVStorage(namespace="test", global_config={"working_dir": WORKING_DIR})
+
+
+@pytest.mark.asyncio
+async def test_upsert_and_get(setup_teardown):
+    storage = make_storage()
+    await storage.upsert(
+        {
+            "a": {"content": "Năm 1945", "tokens": 3, "meta": {"order": [1, 2]}},
+            "b": {"content": "1930-1931"},
+        }
+    )
+
+    assert await storage.get_by_id("a") == {
+        "content": "Năm 1945",
+        "tokens": 3,
+        "meta": {"order": [1, 2]},
+    }
+    assert await storage.get_by_id("missing") is None
+    assert await storage.get_by_ids(["b", "missing", "a"]) == [
+        {"content": "1930-1931"},
+        None,
+        {"content": "Năm 1945", "tokens": 3, "meta": {"order": [1, 2]}},
+    ]
+    assert await storage.get_by_ids(["a", "b"], fields={"tokens", "meta"}) == [
+        {"tokens": 3, "meta": {"order": [1, 2]}},
+        {},
+    ]
+    assert sorted(await storage.all_keys()) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_projection_keeps_json_types(setup_teardown):
+    storage = make_storage()
+    value = {
+        "t": True,
+        "f": False,
+        "n": None,
+        "x": 1.5,
+        "s": "Năm \"1945\"",
+        "nested": {"a": [1, False, None, {"b": True}]},
+        "empty": [],
+    }
+    await storage.upsert({"a": value})
+
+    (full,) = await storage.get_by_ids(["a"])
+    (projected,) = await storage.get_by_ids(["a"], fields=set(value))
+    assert projected == full == value
+    assert type(projected["t"]) is bool and type(projected["f"]) is bool
+@pytest.mark.asyncio
+async def test_filter_keys_large_id_list(setup_teardown):
+    storage = make_storage()
+    await storage.upsert({f"chunk-{i}": {"v": i} for i in range(0, 50000, 2)})
+
+    missing = await storage.filter_keys([f"chunk-{i}" for i in range(50000)])
+    assert missing == {f"chunk-{i}" for i in range(1, 50000, 2)}
+
+
+@pytest.mark.asyncio
+async def test_persistence_and_drop(setup_teardown):
+    storage = make_storage()
+    await storage.upsert({"a": {"v": 1}})
+    await storage.index_done_callback()
+    assert await make_storage().get_by_id("a") == {"v": 1}
+
+    await storage.drop()
+    await storage.index_done_callback()
+    assert await make_storage().all_keys() == []
+
+
+@pytest.mark.asyncio
+async def test_delete(setup_teardown):
+    storage = make_storage()
+    await storage.upsert({"a": {"v": 1}, "b": {"v": 2}})
+    await storage.delete(["a", "missing"])
+    await storage.index_done_callback()
+
+    assert await make_storage().all_keys() == ["b"]
+
+
+def test_graphrag_with_sqlite_kv(setup_teardown):
+    rag = GraphRAG(
+        working_dir=WORKING_DIR, key_string_value_json_storage_cls=SQLiteKVStorage
+    )
+    assert isinstance(rag.full_docs, SQLiteKVStorage)
+    assert os.path.exists(os.path.join(WORKING_DIR, "kv_store_full_docs.sqlite"))
@@ -0,0 +1,121 @@
+import os
+import shutil
+import subprocess
+import sys
+from datetime import datetime
+import pytest
+from nano_graphrag._storage import (
+    IntervalTemporalStorage,
+    PostgresTemporalStorage,
+    SQLiteTemporalStorage,
+)
+
+WORKING_DIR = "./tests/nano_graphrag_cache_temporal_storage_test"
+
+ENTITIES = {
+    "ent-1": {
+        "entity_name": "CÁCH MẠNG THÁNG TÁM",
+        "entity_time": datetime(1945, 8, 19),
+        "entity_description": "Tổng khởi nghĩa giành chính quyền",
+    },
+    "ent-2": {
+        "entity_name": "HIỆP ĐỊNH GIƠNEVƠ",
+        "entity_time": datetime(1954, 7, 21),
+        "entity_description": "Hiệp định chấm dứt chiến tranh ở Đông Dương",
+    },
+    "ent-3": {
+        "entity_name": "TUYÊN NGÔN ĐỘC LẬP",
+        "entity_time": datetime(1945, 9, 2),
+        "entity_description": "Khai sinh nước Việt Nam Dân chủ Cộng hòa",
+    },
+    "ent-4": {
+        "entity_name": "VIỆT MINH",
+        "entity_time": None,
+        "entity_description": "Mặt trận Việt Nam độc lập đồng minh",
+    },
+}
+
+
+@pytest.fixture(params=["interval", "sqlite", "in_memory", "postgres"])
+def make_storage(request):
+    if os.path.exists(WORKING_DIR):
+        shutil.rmtree(WORKING_DIR)
+    os.mkdir(WORKING_DIR)
+    global_config = {"working_dir": WORKING_DIR}
+    if request.param == "postgres":
+        if not os.environ.get("NANO_GRAPHRAG_TEST_POSTGRES", False):
+            pytest.skip("skipping postgres tests")
+        storage_cls = PostgresTemporalStorage
+        global_config["temporal_storage_cls_kwargs"] = {"table": "nano_graphrag_test"}
+    elif request.param == "interval":
+        storage_cls = IntervalTemporalStorage
+    else:
+        storage_cls = SQLiteTemporalStorage
+        global_config["temporal_storage_cls_kwargs"] = {
+            "in_memory": request.param == "in_memory"
+        }
+
+    def _make():
+        return storage_cls(namespace="entities", global_config=global_config)
+
+    yield _make
+
+    shutil.rmtree(WORKING_DIR)
+
+
+@pytest.mark.asyncio
+async def test_time_range_and_name_lookups(make_storage):
+    storage = make_storage()
+    await storage.drop()
+    await storage.upsert(ENTITIES)
+
+    in_1945 = await storage.query_time_range(
+        datetime(1945, 1, 1), datetime(1945, 12, 31), top_k=10
+    )
+    assert [e["id"] for e in in_1945] == ["ent-1", "ent-3"]
+    assert in_1945[0] == {"id": "ent-1", **ENTITIES["ent-1"]}
+    # closest to the middle of the range first
+    around_1953 = await storage.query_time_range(
+        datetime(1940, 1, 1), datetime(1966, 1, 1), top_k=2
+    )
+    assert [e["id"] for e in around_1953] == ["ent-2", "ent-3"]
+    assert await storage.query_time_range(
+        datetime(1800, 1, 1), datetime(1900, 1, 1), top_k=2
+    ) == []
+
+    found = await storage.get_by_entity_names(["VIỆT MINH", "PHÁP", "HIỆP ĐỊNH GIƠNEVƠ"])
+    assert [e["id"] if e else None for e in found] == ["ent-4", None, "ent-2"]
+    assert found[0]["entity_time"] is None
+
+    await storage.upsert(
+        {"ent-2": {**ENTITIES["ent-2"], "entity_time": datetime(1954, 5, 7)}}
+    )
+    (updated,) = await storage.get_by_entity_names(["HIỆP ĐỊNH GIƠNEVƠ"])
+    assert updated["entity_time"] == datetime(1954, 5, 7)
+    await storage.drop()
+
+
+@pytest.mark.asyncio
+async def test_persists_on_index_done(make_storage):
+    storage = make_storage()
+    if isinstance(storage, PostgresTemporalStorage) or storage._file_name == ":memory:":
+        pytest.skip("only the local files persist")
+    await storage.upsert(ENTITIES)
+    await storage.index_done_callback()
+
+    reloaded = make_storage()
+    assert len(await reloaded.query_time_range(datetime(1, 1, 1), datetime(9999, 1, 1), 10)) == 3
+
+
+def test_import_does_not_need_psycopg2():
+    code = (
+        "import sys\n"
+        "class Block:\n"
+        "    def find_spec(self, name, path, target=None):\n"
+        "        if name.split('.')[0] == 'psycopg2':\n"
+        "            raise ImportError(name)\n"
+        "sys.meta_path.insert(0, Block())\n"
+        "import nano_graphrag\n"
+        "from nano_graphrag._storage import PostgresTemporalStorage\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,113 @@
+import os
+import shutil
+import asyncio
+import pytest
+from nano_graphrag._storage import JsonKVStorage, WriteBehindKVStorage
+from nano_graphrag._utils import load_json
+
+WORKING_DIR = "./tests/nano_graphrag_cache_write_behind_storage_test"
+
+
+@pytest.fixture(scope="function")
+def setup_teardown():
+    if os.path.exists(WORKING_DIR):
+        shutil.rmtree(WORKING_DIR)
+    os.mkdir(WORKING_DIR)
+
+    yield
+
+    shutil.rmtree(WORKING_DIR)
+
+
+def make_storage(**kwargs):
+    global_config = {"working_dir": WORKING_DIR, **kwargs}
+    return WriteBehindKVStorage(
+        namespace="llm_response_cache",
+        global_config=global_config,
+        storage=JsonKVStorage(namespace="llm_response_cache", global_config=global_config),
+    )
+
+
+def cache_file():
+    return os.path.join(WORKING_DIR, "kv_store_llm_response_cache.json")
+
+
+@pytest.mark.asyncio
+async def test_reads_see_pending_writes(setup_teardown):
+    storage = make_storage()
+    await storage.upsert({"a": {"return": "1"}})
+
+    assert await storage.get_by_id("a") == {"return": "1"}
+    assert await storage.filter_keys(["a", "b"]) == {"b"}
+    assert not os.path.exists(cache_file())
+
+
+@pytest.mark.asyncio
+async def test_flush_on_batch_size(setup_teardown):
+    storage = make_storage(llm_cache_flush_batch_size=3)
+    await storage.upsert({"a": {"return": "1"}})
+    await storage.upsert({"b": {"return": "2"}})
+    assert not os.path.exists(cache_file())
+
+    await storage.upsert({"c": {"return": "3"}})
+    assert set(load_json(cache_file())) == {"a", "b", "c"}
+
+
+@pytest.mark.asyncio
+async def test_flush_on_interval(setup_teardown):
+    storage = make_storage(llm_cache_flush_interval=0.05)
+    await storage.upsert({"a": {"return": "1"}})
+    assert not os.path.exists(cache_file())
+
+    await asyncio.sleep(0.2)
+    assert set(load_json(cache_file())) == {"a"}
+
+
+@pytest.mark.asyncio
+async def test_index_done_callback_flushes(setup_teardown):
+    storage = make_storage()
+    await storage.upsert({"a": {"return": "1"}})
+    await storage.index_done_callback()
+    assert set(load_json(cache_file())) == {"a"}
+
+    reloaded = make_storage()
+    assert await reloaded.get_by_id("a") == {"return": "1"}
+
+
+@pytest.mark.asyncio
+async def test_delete_is_flushed(setup_teardown):
+    storage = make_storage(llm_cache_flush_batch_size=3)
+    await storage.upsert({"a": {"return": "1"}, "b": {"return": "2"}})
+    await storage.delete(["a"])
+    assert await storage.get_by_id("a") is None
+    assert set(load_json(cache_file())) == {"b"}
+
+
+@pytest.mark.asyncio
+async def test_idle_time_does_not_count_towards_the_interval(setup_teardown):
+    storage = make_storage(llm_cache_flush_interval=0.05)
+    await asyncio.sleep(0.1)
+    await storage.upsert({"a": {"return": "1"}})
+    assert not os.path.exists(cache_file())
+
+    await asyncio.sleep(0.2)
+    assert set(load_json(cache_file())) == {"a"}
+
+
+@pytest.mark.asyncio
+async def test_failed_background_flush_is_logged_and_retried(setup_teardown, caplog):
+    storage = make_storage(llm_cache_flush_interval=0.05)
+    flush = storage.storage.index_done_callback
+
+    async def failing_flush():
+        raise OSError("disk full")
+
+    storage.storage.index_done_callback = failing_flush
+    await storage.upsert({"a": {"return": "1"}})
+    await asyncio.sleep(0.2)
+    assert "disk full" in caplog.text
+    assert not storage._flush_tasks
+
+    storage.storage.index_done_callback = flush
+    await storage.index_done_callback()
+    assert set(load_json(cache_file())) == {"a"}